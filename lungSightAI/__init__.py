@@ -1 +1,9 @@
-from . import agent
+import importlib
+
+
+def __getattr__(name):
+    # `agent` (which ADK looks up) is imported on first access, so running a
+    # CLI such as `python -m lungSightAI.batchPredict` does not build the agents.
+    if name == "agent":
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
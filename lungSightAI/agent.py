@@ -1,13 +1,23 @@
-from .customTools import load_classification_model_tool, predict_from_image_tool, save_to_csv_tool, generate_cxr_pdf_report
-from .authTools import signup_tool, login_tool, check_login_status
 import os
+
+# Async tools (default) keep model loads, image decodes and database calls off
+# ADK's event loop; LUNGSIGHT_ASYNC_TOOLS=0 falls back to the sync scan and
+# report tools. Signup and login are always async, since password hashing
+# runs on the HASH executor either way.
+if os.environ.get("LUNGSIGHT_ASYNC_TOOLS", "1") == "1":
+    from .asyncTools import load_classification_model_tool, predict_from_image_tool, save_to_csv_tool, scan_history_tool, population_analytics_tool, analyze_scan_tool, generate_cxr_pdf_report
+    from .asyncTools import signup_tool, login_tool, check_login_status
+else:
+    from .customTools import load_classification_model_tool, predict_from_image_tool, save_to_csv_tool, scan_history_tool, population_analytics_tool, analyze_scan_tool, generate_cxr_pdf_report
+    from .authTools import signup_tool, login_tool, check_login_status
+from .coldStart import start_prewarm
+from .tokenAccounting import record_token_usage
+from .telemetry import AGENT_TIMING, METRICS_ENABLED, start_metrics_server
 import warnings 
 from google.genai import types
 from google.adk.agents import LlmAgent, Agent
 from google.adk.models.google_llm import Gemini
 from google.adk.tools import google_search, AgentTool
-# Import DatabaseSessionService
-from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 
 warnings.filterwarnings("ignore")
@@ -24,6 +34,8 @@ auth_agent = LlmAgent(
     - Confirm success to the user when done.
     """,
     tools=[signup_tool, login_tool],
+    after_model_callback=record_token_usage,
+    **AGENT_TIMING,
     output_key="auth_results"
 )
 
@@ -35,16 +47,33 @@ cxr_inference_agent = LlmAgent(
     
     1. Call load_classification_model_tool()
     2. Call predict_from_image_tool(image_path)
+       (high_accuracy=True only if the user asks for a more thorough / high-accuracy analysis;
+        profile="<name>" only if they ask for a named threshold profile, e.g. "sensitivity")
     3. Call save_to_csv_tool(results) -> This will auto-fetch the user UUID.
 
     4. FINAL SUMMARY:
-       - Review the JSON data yourself.
+       - The results are compact: "p" lists all 13 probabilities in a fixed order,
+         "pos" lists only the findings at or above the threshold "t" (one per label when a profile is used).
        - Provide a short, bulleted summary of findings.
-       - Say "Normal" if all labels are "N".
-       - Highlight "High Probability" if any labels are "Y".
+       - Say "Normal" if "pos" is empty.
+       - Highlight "High Probability" for every finding in "pos".
+       - If the result has a "note" (e.g. the requested profile is not available), tell the user.
        - DO NOT show the raw JSON to the user.
+
+    If a tool returns status "busy", call it once more; if it is still busy, tell the user the
+    service is under heavy load and to try again in a moment.
+
+    If the user asks about their PREVIOUS scans, call scan_history_tool(limit) instead
+    and summarise the returned scans (date and any probabilities >= 0.3).
+
+    If the user asks for statistics across all patients (prevalence, distributions, trends)
+    or for the trend of a finding in their own scans, call population_analytics_tool and
+    summarise the numbers in plain words.
     """,
-    tools=[load_classification_model_tool, predict_from_image_tool, save_to_csv_tool],
+    tools=[load_classification_model_tool, predict_from_image_tool, save_to_csv_tool, scan_history_tool,
+           population_analytics_tool],
+    after_model_callback=record_token_usage,
+    **AGENT_TIMING,
     output_key="cxr_output"   
 )
 
@@ -54,6 +83,8 @@ user_search_agent = Agent(
     description="Medical Q&A Assistant.",
     instruction="Answer in 3-5 bullet points. Be concise.",
     tools=[google_search],
+    after_model_callback=record_token_usage,
+    **AGENT_TIMING,
     output_key="search_results"
 )
 
@@ -68,7 +99,8 @@ pdf_report_agent = LlmAgent(
     Take raw Chest X-Ray inference data and generate a professional PDF report file.
 
     INPUT DATA:
-    You will receive {cxr_output} containing inference probabilities.
+    Latest scan (file, encoding version, threshold, verdict and positive findings with probabilities):
+    {cxr_result?}
 
     PROCESS:
     1. *Synthesize Content*:
@@ -87,6 +119,8 @@ pdf_report_agent = LlmAgent(
        - Return a confirmation message to the user that the PDF has been created, including the filename.
     """,
     tools=[generate_cxr_pdf_report],
+    after_model_callback=record_token_usage,
+    **AGENT_TIMING,
     output_key="pdf_confirmation"
 )
 # --- ORCHESTRATOR ---
@@ -111,31 +145,65 @@ instruction="""
     
     2. CHECK STATUS:
        - If "logged_out": Route to `auth_agent`.
-       - If "logged_in": Route to `cxr_agent`, `helpful_assistant`, or `pdf_report_agent`.
+       - If "logged_in": Use `analyze_scan_tool`, or route to `cxr_agent`, `helpful_assistant`, or `pdf_report_agent`.
 
     3. ROUTING GUIDE:
        - "login", "signup", "password" -> auth_agent
-       - "upload", "xray", "scan" -> cxr_agent
+       - "analyse image 8", "upload", "xray", "scan" -> call `analyze_scan_tool(image_path)` YOURSELF.
+         Add high_accuracy=True only if the user asks for a more thorough / high-accuracy scan,
+         and profile="<name>" only if they ask for a named threshold profile (e.g. "sensitivity").
+         It loads the model, predicts and saves in one step. Reply with a short bulleted summary:
+         the file, "Normal" or the positive findings with their probabilities, and any "note". Never show raw JSON.
+         If it returns status "busy", call it once more; if still busy, ask the user to retry shortly.
+       - "my previous scans", "statistics", "prevalence", "trend", or if analyze_scan_tool reports an error you cannot explain -> cxr_agent
        - "report", "pdf" -> pdf_report_agent
        - "what is pneumonia?" -> helpful_assistant
 
-    Remember: You don't solve the problem yourself, but you MUST communicate the sub-agent's solution to the user.
+    Remember: Apart from analyze_scan_tool you don't solve the problem yourself, but you MUST communicate the sub-agent's solution to the user.
     """,
     tools=[
         AgentTool(auth_agent),
         AgentTool(cxr_inference_agent),
         AgentTool(user_search_agent),
         AgentTool(pdf_report_agent),
-        check_login_status
-    ]
+        check_login_status,
+        analyze_scan_tool
+    ],
+    after_model_callback=record_token_usage,
+    **AGENT_TIMING,
 )
 
 APP_NAME = "LungSight_AI"
-print("DEBUG: Initializing In-Memory Session Service for Cloud Run...")
-session_service = InMemorySessionService()
-
-runner = Runner(
-    agent=root_agent,
-    session_service=session_service,
-    app_name=APP_NAME,
-)
\ No newline at end of file
+
+# Optional: import the deferred tool dependencies (and build the model) in the
+# background right after start-up, instead of on the first request that needs them.
+if os.environ.get("LUNGSIGHT_PREWARM", "0") == "1" or os.environ.get("LUNGSIGHT_WARMUP_MODEL", "0") == "1":
+    start_prewarm(load_model=os.environ.get("LUNGSIGHT_WARMUP_MODEL", "0") == "1")
+
+# LUNGSIGHT_METRICS=1: tool/agent latency, errors and payload sizes on a Prometheus endpoint
+if METRICS_ENABLED:
+    start_metrics_server()
+
+_lazy_globals = {}
+
+
+def _build_runner():
+    # LUNGSIGHT_SESSION_BACKEND picks memory, tiered or database (see sessionStore.py)
+    from .sessionStore import build_session_service
+    session_service = build_session_service()
+    runner = Runner(
+        agent=root_agent,
+        session_service=session_service,
+        app_name=APP_NAME,
+    )
+    return {"session_service": session_service, "runner": runner}
+
+
+def __getattr__(name):
+    # `adk web` brings its own runner, so ours is only built when something asks for it
+    # (adk web gets the same session service through services.py)
+    if name in ("session_service", "runner"):
+        if not _lazy_globals:
+            _lazy_globals.update(_build_runner())
+        return _lazy_globals[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+Async variants of every tool, for the agents (LUNGSIGHT_ASYNC_TOOLS=1, the default).
+
+ADK calls a sync tool directly on its event loop, so one session's model load,
+image decode or SQLite write used to stall every other session. These variants
+keep the names, parameters and docstrings ADK builds the tool declarations
+from, but hand each blocking step to the executor for its workload (see
+toolExecutors.py) and only await on the loop:
+
+    resolve + read image  -> io       sha256 of the bytes -> hash
+    cache lookup / store  -> io       decode + preprocess -> decode
+    forward pass          -> model (micro-batched, so concurrent sessions share batches)
+
+A workload at its pending limit makes the tool return {"status": "busy",
+"retry_after_ms": ...} instead of queueing without bound. The concurrency load
+test reports per-call latency and event-loop stalls for N simultaneous sessions,
+async tools against the sync ones:
+
+    python -m lungSightAI.asyncTools --sessions 1 4 16 --requests 8
+"""
+import sys
+import json
+import time
+import asyncio
+import inspect
+import argparse
+
+from . import customTools as tools
+from .authTools import signup_tool, login_tool, check_login_status as _check_login_status
+from .customTools import generate_cxr_pdf_report
+from .telemetry import instrumented, span
+from .toolExecutors import IO, DECODE, MODEL, HASH, Busy, busy_status, workload_stats
+
+__all__ = [
+    "load_classification_model_tool", "predict_from_image_tool", "save_to_csv_tool", "scan_history_tool",
+    "population_analytics_tool", "analyze_scan_tool", "generate_cxr_pdf_report",
+    "signup_tool", "login_tool", "check_login_status",
+]
+
+
+def _sync(tool):
+    """The undecorated sync tool (so a call is not counted twice in the metrics)."""
+    return inspect.unwrap(tool)
+
+
+def _async_variant(sync_tool):
+    """Same description as the sync tool; Busy becomes a "busy" result; instrumented under the same name."""
+    def decorate(func):
+        func.__doc__ = _sync(sync_tool).__doc__
+        return instrumented(busy_status(func))
+    return decorate
+
+
+@_async_variant(tools.load_classification_model_tool)
+async def load_classification_model_tool() -> dict:
+    return await MODEL.run(_sync(tools.load_classification_model_tool))
+
+
+@_async_variant(tools.predict_from_image_tool)
+async def predict_from_image_tool(image_path: str, threshold: float = 0.3, high_accuracy: bool = False,
+                                  tool_context: tools.ToolContext = None, profile: str = "") -> dict:
+    try:
+        from .thresholdProfiles import tool_thresholds
+        from .resultCache import INFERENCE_CACHE, image_digest
+
+        thresholds, profile, note = await IO.run(tool_thresholds, profile, threshold)
+        if "model" not in vars(tools):
+            return dict(tools.MODEL_NOT_LOADED)
+
+        resolved_path, error = await IO.run(tools._locate_image, image_path)
+        if error:
+            return error
+
+        image_bytes = await IO.run(tools._read_image, resolved_path)
+        image_hash = await HASH.run(image_digest, image_bytes)
+        cache_key, preds = await IO.run(tools._cached_prediction, resolved_path, image_bytes, image_hash, high_accuracy)
+        cached = preds is not None
+
+        if not cached:
+            model_input = await DECODE.run(tools._preprocess_prediction, image_bytes, high_accuracy)
+            if model_input is None:
+                return dict(tools.INVALID_IMAGE)
+            if high_accuracy:
+                preds = await MODEL.run(tools._predict_views, model_input)
+            else:
+                with span("predict.inference"):
+                    preds = await MODEL.wait(tools._inference_batcher().submit, model_input)
+            await IO.run(INFERENCE_CACHE.put, cache_key, image_hash, preds)
+
+        return tools._prediction_result(resolved_path, preds, cached, thresholds, profile, high_accuracy, tool_context,
+                                        image_hash, note)
+
+    except Busy:
+        raise
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+
+@_async_variant(tools.save_to_csv_tool)
+async def save_to_csv_tool(results: dict, tool_context: tools.ToolContext) -> dict:
+    return await IO.run(_sync(tools.save_to_csv_tool), results, tool_context)
+
+
+@_async_variant(tools.scan_history_tool)
+async def scan_history_tool(limit: int, tool_context: tools.ToolContext) -> dict:
+    return await IO.run(_sync(tools.scan_history_tool), limit, tool_context)
+
+
+@_async_variant(tools.population_analytics_tool)
+async def population_analytics_tool(query: str, label: str = "", threshold: float = 0.3, days: int = 30,
+                                    window: int = 7, tool_context: tools.ToolContext = None) -> dict:
+    return await IO.run(_sync(tools.population_analytics_tool), query, label, threshold, days, window, tool_context)
+
+
+@_async_variant(tools.analyze_scan_tool)
+async def analyze_scan_tool(image_path: str, tool_context: tools.ToolContext, threshold: float = 0.3,
+                            high_accuracy: bool = False, profile: str = "") -> dict:
+    if not tool_context.state.get("uuid"):
+        return {"status": "error", "message": "User not logged in. Cannot analyse scans."}
+
+    timings = {}
+    started = time.perf_counter()
+
+    stage = time.perf_counter()
+    loaded = await load_classification_model_tool()
+    timings["load_model_ms"] = round((time.perf_counter() - stage) * 1000, 1)
+    if loaded["status"] != "success":
+        return loaded
+
+    stage = time.perf_counter()
+    prediction = await predict_from_image_tool(image_path, threshold, high_accuracy, tool_context, profile)
+    timings["predict_ms"] = round((time.perf_counter() - stage) * 1000, 1)
+    if prediction["status"] != "success":
+        return prediction
+
+    stage = time.perf_counter()
+    saved = await save_to_csv_tool(prediction["results"], tool_context)
+    timings["save_ms"] = round((time.perf_counter() - stage) * 1000, 1)
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    return tools._scan_summary(prediction, saved, timings, tool_context)
+
+
+@_async_variant(_check_login_status)
+async def check_login_status(tool_context: tools.ToolContext) -> dict:
+    # Session state only, nothing to offload
+    return _sync(_check_login_status)(tool_context)
+
+
+# --- concurrency load test ----------------------------------------------------
+
+async def _watch_loop(stop: asyncio.Event, stalls: list, interval: float = 0.01):
+    """Records how late the event loop wakes a 10 ms sleeper: the stall other sessions would see."""
+    while not stop.is_set():
+        began = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append((time.perf_counter() - began - interval) * 1000.0)
+
+
+async def _sessions(call, paths: list, sessions: int, requests: int) -> dict:
+    import numpy as np
+
+    latencies, busy = [], [0]
+    start = time.perf_counter()
+
+    async def session(n: int):
+        # Latency is counted from when the session issued the call, so time spent
+        # waiting for a blocked event loop is included
+        began = start
+        for i in range(requests):
+            path = paths[(n * requests + i) % len(paths)]
+            while True:
+                result = await call(path)
+                if result["status"] != "busy":
+                    break
+                busy[0] += 1
+                await asyncio.sleep(result["retry_after_ms"] / 1000.0)
+            if result["status"] != "success":
+                raise RuntimeError(f"{path}: {result.get('error_message')}")
+            latencies.append((time.perf_counter() - began) * 1000.0)
+            began = time.perf_counter()   # the next call is issued now...
+            await asyncio.sleep(0)        # ...but only runs once the loop gets back to this session
+
+    stop, stalls = asyncio.Event(), []
+    watcher = asyncio.create_task(_watch_loop(stop, stalls))
+    await asyncio.gather(*(session(n) for n in range(sessions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await watcher
+
+    values, stalls = np.asarray(latencies), np.asarray(stalls or [0.0])
+    return {
+        "sessions": sessions,
+        "calls": len(latencies),
+        "calls_per_sec": round(len(latencies) / elapsed, 2),
+        "latency_ms_p50": round(float(np.percentile(values, 50)), 1),
+        "latency_ms_p95": round(float(np.percentile(values, 95)), 1),
+        "busy_retries": busy[0],
+        "loop_stall_ms_p95": round(float(np.percentile(stalls, 95)), 1),
+        "loop_stall_ms_max": round(float(stalls.max()), 1),
+    }
+
+
+def load_test(session_counts=(1, 4, 16), requests: int = 8, modes=("sync", "async"), synthetic: int = 24) -> list:
+    """predict_from_image_tool under N concurrent sessions, with the inference cache disabled."""
+    import shutil
+    import tempfile
+    from .batchPredict import expand_inputs
+    from .imageCatalogue import IMAGE_DIR
+    from .inferenceBenchmark import prepared_model, synthesize_images
+    from .resultCache import INFERENCE_CACHE
+
+    async def sync_call(path):
+        # What ADK does with a sync tool: call it on the event loop
+        return tools.predict_from_image_tool(path)
+
+    calls = {"sync": sync_call, "async": predict_from_image_tool}
+    workdir = tempfile.mkdtemp(prefix="lungsight-async-")
+    cache_entries = INFERENCE_CACHE.max_entries
+    try:
+        with prepared_model(workdir):
+            samples = expand_inputs(IMAGE_DIR)
+            paths = samples + synthesize_images(samples, workdir, synthetic)
+            loaded = tools.load_classification_model_tool()
+            if loaded["status"] != "success":
+                raise RuntimeError(loaded.get("error_message"))
+
+            INFERENCE_CACHE.clear()
+            INFERENCE_CACHE.max_entries = 0
+            tools.predict_from_image_tool(paths[0])  # warm-up / graph tracing
+
+            rows = []
+            for sessions in session_counts:
+                for mode in modes:
+                    print(f"{sessions} sessions, {mode} tools...", file=sys.stderr)
+                    rows.append({"mode": mode, **asyncio.run(_sessions(calls[mode], paths, sessions, requests))})
+            return rows
+    finally:
+        INFERENCE_CACHE.max_entries = cache_entries
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrency load test: sync vs async tools under N sessions.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=8, help="Scans per session.")
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=("sync", "async"))
+    parser.add_argument("--json", help="Also write the rows (and executor stats) to this file.")
+    args = parser.parse_args(argv)
+
+    rows = load_test(args.sessions, args.requests, args.modes)
+    print(f"{'mode':<6} {'sessions':>8} {'calls/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'busy':>5} "
+          f"{'stall p95':>9} {'stall max':>9}")
+    for r in rows:
+        print(f"{r['mode']:<6} {r['sessions']:>8} {r['calls_per_sec']:>8} {r['latency_ms_p50']:>8} "
+              f"{r['latency_ms_p95']:>8} {r['busy_retries']:>5} {r['loop_stall_ms_p95']:>9} {r['loop_stall_ms_max']:>9}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "executors": workload_stats()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
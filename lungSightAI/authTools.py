@@ -2,15 +2,14 @@ import sqlite3
 import uuid
 import csv
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
 from google.adk.tools.tool_context import ToolContext
+from .userStore import ASYNC_USER_STORE, DATA_DIR
+from .passwordSecurity import hash_password, verify_password, needs_rehash, LOGIN_THROTTLE
+from .telemetry import instrumented
+from .toolExecutors import IO, busy_status
 
-
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(CURRENT_DIR, "Data", "CSV files")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-DB_NAME = os.path.join(DATA_DIR, "users.db")
 CSV_FILE = os.path.join(DATA_DIR, "user_details.csv")
 
 def save_to_csv(full_name, gender, age, username, user_uuid):
@@ -21,24 +20,8 @@ def save_to_csv(full_name, gender, age, username, user_uuid):
             writer.writerow(["full_name", "gender", "age", "username", "user_uuid"])
         writer.writerow([full_name, gender, age, username, user_uuid])
 
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            full_name TEXT,
-            gender TEXT,
-            age INTEGER,
-            username TEXT UNIQUE,
-            password TEXT,
-            user_uuid TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
 # ⬇⬇ NEW TOOL FOR THE ORCHESTRATOR ⬇⬇
+@instrumented
 def check_login_status(tool_context: ToolContext) -> dict:
     """Checks if the user is currently logged in."""
     is_logged_in = tool_context.state.get("logged_in", False)
@@ -50,20 +33,16 @@ def check_login_status(tool_context: ToolContext) -> dict:
         return {"status": "logged_out", "message": "User is NOT logged in."}
 
 
-def signup_tool(full_name, gender, age, username, password, tool_context: ToolContext) -> dict:
-    init_db()
-    hashed_pw = generate_password_hash(password)
+@instrumented
+@busy_status
+async def signup_tool(full_name, gender, age, username, password, tool_context: ToolContext) -> dict:
+    hashed_pw = await hash_password(password)
     user_uuid = str(uuid.uuid4())
 
     try:
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute("INSERT INTO users (full_name, gender, age, username, password, user_uuid) VALUES (?, ?, ?, ?, ?, ?)", 
-                  (full_name, gender, age, username, hashed_pw, user_uuid))
-        conn.commit()
-        conn.close()
+        await ASYNC_USER_STORE.create_user(full_name, gender, age, username, hashed_pw, user_uuid)
 
-        save_to_csv(full_name, gender, age, username, user_uuid)
+        await IO.run(save_to_csv, full_name, gender, age, username, user_uuid)
 
         # 🔥 Set Session State
         tool_context.state["logged_in"] = True
@@ -75,24 +54,34 @@ def signup_tool(full_name, gender, age, username, password, tool_context: ToolCo
         return {"status": "error", "message": "Username already exists."}
 
 
-def login_tool(username, password, tool_context: ToolContext) -> dict:
-    init_db()
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT password, user_uuid FROM users WHERE username=?", (username,))
-    user = c.fetchone()
-    conn.close()
+@instrumented
+@busy_status
+async def login_tool(username, password, tool_context: ToolContext) -> dict:
+    # Locked-out usernames are rejected before any database or KDF work
+    retry_after = LOGIN_THROTTLE.retry_after(username)
+    if retry_after:
+        return {"status": "error", "message": f"Too many failed attempts. Try again in {int(retry_after) + 1} seconds."}
+
+    user = await ASYNC_USER_STORE.get_credentials(username)
 
     if not user:
+        LOGIN_THROTTLE.record_failure(username)
         return {"status": "error", "message": "Username not found."}
 
     stored_hash, user_uuid = user
 
-    if check_password_hash(stored_hash, password):
+    if not LOGIN_THROTTLE.is_known_bad(stored_hash, password) and await verify_password(stored_hash, password):
+        LOGIN_THROTTLE.record_success(username)
+
+        # Upgrade hashes made with older / weaker parameters while we have the password
+        if needs_rehash(stored_hash):
+            await ASYNC_USER_STORE.update_password_hash(username, await hash_password(password))
+
         # 🔥 Set Session State
         tool_context.state["logged_in"] = True
         tool_context.state["uuid"] = user_uuid
 
         return {"status": "success", "message": "Login successful.", "uuid": user_uuid}
 
+    LOGIN_THROTTLE.record_failure(username, stored_hash, password)
     return {"status": "error", "message": "Incorrect password."}
\ No newline at end of file
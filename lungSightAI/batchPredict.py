@@ -0,0 +1,106 @@
+"""
+Bulk CXR inference over a directory, glob pattern or list of files.
+
+    python -m lungSightAI.batchPredict "lungSightAI/Data/CXR Images" --output scores.jsonl
+
+Images are decoded and preprocessed by a worker pool while the model scores
+fixed-size batches; results stream out (one JSON object per line) as each
+batch finishes, and throughput is reported at the end.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import numpy as np
+
+from .preprocessing import PreprocessPipeline, PREPROCESS_WORKERS
+from .inferenceBackend import load_backend
+from .customTools import WEIGHTS_PATH, _format_results
+from .imageCatalogue import IMAGE_EXTENSIONS
+from .thresholdProfiles import apply_thresholds, resolve_thresholds
+
+
+def expand_inputs(inputs) -> list:
+    """Turns a directory, glob pattern, file path or list of those into a sorted file list."""
+    if isinstance(inputs, (str, os.PathLike)):
+        inputs = [inputs]
+
+    paths = []
+    for item in inputs:
+        item = os.fspath(item)
+        if os.path.isdir(item):
+            paths.extend(
+                os.path.join(item, name) for name in sorted(os.listdir(item))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    return paths
+
+
+def predict_batch(inputs, batch_size: int = 16, workers: int = PREPROCESS_WORKERS, threshold: float = 0.3, model=None,
+                  profile: str = ""):
+    """
+    Generator yielding one result dict per image, in input order, as batches complete.
+    `profile` names per-label thresholds (see thresholdProfiles) and overrides `threshold`.
+
+    Each result is {"file", "status", "results"} on success or
+    {"file", "status": "error", "error_message"} for unreadable images.
+    """
+    paths = expand_inputs(inputs)
+    thresholds, _ = resolve_thresholds(profile, threshold)
+    if model is None:
+        model = load_backend(WEIGHTS_PATH)[0]["model"]
+
+    started = time.perf_counter()
+    scored = 0
+    pipeline = PreprocessPipeline(batch_size, workers)
+    for batch_paths, batch, ok in pipeline.batches(paths):
+        valid = [i for i, decoded in enumerate(ok) if decoded]
+        preds = {}
+        if valid:
+            rows = batch if len(valid) == len(batch_paths) else batch[valid]
+            scores = np.asarray(model.predict_on_batch(rows))
+            positive = apply_thresholds(scores, thresholds)   # whole batch, one comparison
+            for i, row, flags in zip(valid, scores, positive):
+                preds[i] = (row, flags)
+
+        for i, path in enumerate(batch_paths):
+            if i in preds:
+                scored += 1
+                row, flags = preds[i]
+                yield {"file": path, "status": "success", "results": _format_results(row, thresholds, flags)}
+            else:
+                yield {"file": path, "status": "error", "error_message": "Invalid image format or corrupted file."}
+
+    elapsed = time.perf_counter() - started
+    rate = scored / elapsed if elapsed > 0 else 0.0
+    print(f"Scored {scored}/{len(paths)} images in {elapsed:.2f}s ({rate:.2f} images/sec).", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score chest X-rays in bulk and stream JSONL results.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns or image files.")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=PREPROCESS_WORKERS, help="Decode/preprocess threads.")
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--profile", default="", help="Per-label threshold profile (e.g. sensitivity, balanced).")
+    parser.add_argument("--output", help="JSONL file to write (default: stdout).")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for result in predict_batch(args.inputs, args.batch_size, args.workers, args.threshold, profile=args.profile):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future
+
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("LUNGSIGHT_MAX_BATCH_SIZE", "8"))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("LUNGSIGHT_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """
+    Background engine that groups concurrent single-image requests into one
+    forward pass.
+
+    Callers `submit()` a preprocessed (224, 224, 3) image and get a Future for
+    their own probability row. A worker thread flushes the queue as one batch
+    when it holds `max_batch_size` images or the oldest image has waited
+    `max_wait_ms`, whichever comes first. `max_batch_size=1` disables waiting.
+    With `workers` > 1 that many batches can be in flight at once (one per model
+    replica, see inferenceExecution.py).
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, workers: int = 1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.workers = max(1, int(workers))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopped = False
+        self._local = threading.local()  # per worker: reused (max_batch_size, *image_shape) float32 batch
+
+        # Metrics
+        self._batches = 0
+        self._images = 0
+        self._last_batch_size = 0
+        self._max_queue_depth = 0
+        self._total_wait_ms = 0.0
+        self._batch_size_counts = {}
+
+    def _ensure_worker(self):
+        # Called with self._lock held
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"cxr-micro-batcher-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, image: np.ndarray) -> Future:
+        """Queues one preprocessed image; the Future resolves to its 13-probability row."""
+        future = Future()
+        # Checked and queued under the lock close() takes, so nothing lands behind the stop sentinel
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("MicroBatcher is closed.")
+            self._ensure_worker()
+            self._queue.put((image, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self._max_queue_depth:
+            self._max_queue_depth = depth
+        return future
+
+    def predict(self, image: np.ndarray, timeout: float = None) -> np.ndarray:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(image).result(timeout=timeout)
+
+    def _collect(self, first) -> list:
+        items = [first]
+        deadline = first[2] + self.max_wait_ms / 1000.0
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            items.append(item)
+        return items
+
+    def _fill_buffer(self, items) -> np.ndarray:
+        shape = items[0][0].shape
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[1:] != shape:
+            buffer = self._local.buffer = np.empty((self.max_batch_size,) + shape, dtype=np.float32)
+        batch = buffer[:len(items)]
+        for slot, (image, _, _) in enumerate(items):
+            batch[slot] = image
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.put(None)  # let the other workers see it too
+                return
+            items = self._collect(first)
+            flushed_at = time.perf_counter()
+
+            try:
+                batch = self._fill_buffer(items)
+                preds = np.asarray(self.predict_fn(batch)).reshape(len(items), -1)
+                for (_, future, _), row in zip(items, preds):
+                    future.set_result(row)
+            except Exception as e:
+                for _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+            with self._lock:
+                size = len(items)
+                self._batches += 1
+                self._images += size
+                self._last_batch_size = size
+                self._total_wait_ms += sum((flushed_at - queued_at) * 1000.0 for _, _, queued_at in items)
+                self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+
+    def metrics(self) -> dict:
+        """Queue depth and batch-size statistics since start-up."""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "images": self._images,
+                "last_batch_size": self._last_batch_size,
+                "mean_batch_size": round(self._images / self._batches, 2) if self._batches else 0.0,
+                "mean_queue_wait_ms": round(self._total_wait_ms / self._images, 3) if self._images else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "workers": self.workers,
+            }
+
+    def close(self):
+        """Stops the workers after the queued images have been served."""
+        with self._lock:
+            self._stopped = True
+            threads, self._threads = self._threads, []
+            if threads:
+                self._queue.put(None)
+        for thread in threads:
+            thread.join()
+        # Anything still queued will never be served: fail it rather than leave its caller waiting
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and not item[1].done():
+                item[1].set_exception(RuntimeError("MicroBatcher is closed."))
@@ -0,0 +1,167 @@
+"""
+Cold-start helpers: background prewarm of deferred imports and a per-tool
+import-time report.
+
+    python -m lungSightAI.coldStart                       # table of import cost per tool
+    python -m lungSightAI.coldStart --json report.json    # machine-readable, for tracking regressions
+    python -m lungSightAI.coldStart --baseline report.json --max-regression-pct 20
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Modules each tool imports on its first call. Keep in sync with the
+# function-level imports in customTools.py / authTools.py.
+TOOL_IMPORTS = {
+    "load_classification_model_tool": ["lungSightAI.inferenceBackend", "lungSightAI.inferenceExecution", "tensorflow", "tensorflow.keras.applications"],
+    "predict_from_image_tool": ["lungSightAI.thresholdProfiles", "lungSightAI.imageCatalogue", "lungSightAI.preprocessing",
+                                "lungSightAI.resultCache", "lungSightAI.batchingEngine"],
+    "save_to_csv_tool": ["lungSightAI.historyStore", "lungSightAI.inferenceRecords"],
+    "scan_history_tool": ["lungSightAI.historyStore"],
+    "population_analytics_tool": ["lungSightAI.historyStore", "lungSightAI.populationAnalytics"],
+    "analyze_scan_tool": ["lungSightAI.inferenceBackend", "lungSightAI.inferenceExecution", "tensorflow", "tensorflow.keras.applications",
+                          "lungSightAI.thresholdProfiles", "lungSightAI.imageCatalogue", "lungSightAI.preprocessing", "lungSightAI.resultCache",
+                          "lungSightAI.batchingEngine", "lungSightAI.historyStore", "lungSightAI.inferenceRecords"],
+    "generate_cxr_pdf_report": ["lungSightAI.reportRenderer", "reportlab.pdfgen.canvas", "reportlab.lib.pagesizes"],
+    "signup_tool": ["werkzeug.security"],
+    "login_tool": ["werkzeug.security"],
+}
+
+# What the server imports before any tool runs
+BASE_IMPORT = "lungSightAI.agent"
+
+_prewarm_thread = None
+
+
+def _prewarm(load_model: bool):
+    import importlib
+
+    for tool, modules in TOOL_IMPORTS.items():
+        for module in modules:
+            if module.startswith("tensorflow") and not load_model:
+                continue  # only worth paying for when the model is built too
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                logger.warning("Prewarm import of %s for %s failed (%s)", module, tool, e)
+
+    from .reportRenderer import start_render_workers
+    start_render_workers()
+
+    if load_model:
+        from .customTools import load_classification_model_tool
+        result = load_classification_model_tool()
+        logger.info("Prewarm model load: %s", result.get("status"))
+
+
+def start_prewarm(load_model: bool = False):
+    """Imports the deferred tool dependencies (and optionally loads the model) in a daemon thread."""
+    global _prewarm_thread
+    if _prewarm_thread is None:
+        _prewarm_thread = threading.Thread(target=_prewarm, args=(load_model,), name="lungsight-prewarm", daemon=True)
+        _prewarm_thread.start()
+    return _prewarm_thread
+
+
+def _parse_importtime(stderr: str) -> list:
+    """Parses `-X importtime` output into (self_us, cumulative_us, depth, module) tuples."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name[1:]  # one separator space, then two spaces per nesting level
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return entries
+
+
+def _import_cost(statements: list) -> list:
+    code = "; ".join(f"import {module}" for module in statements)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=dict(os.environ, LUNGSIGHT_PREWARM="0", LUNGSIGHT_WARMUP_MODEL="0"),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    return _parse_importtime(proc.stderr)
+
+
+def import_time_report(tools=None, top: int = 5) -> dict:
+    """
+    Measures, in fresh interpreters, the cold-start import cost of the server and
+    the extra import cost each tool pays on its first call.
+    """
+    base_entries = _import_cost([BASE_IMPORT])
+    # Interpreter start-up imports are listed too; only count our package's top-level entries
+    base_ms = sum(cum for _, cum, depth, name in base_entries
+                  if depth == 0 and name.split(".")[0] == "lungSightAI") / 1000.0
+
+    report = {"python": sys.version.split()[0], "cold_start_ms": round(base_ms, 1), "tools": {}}
+    for tool in tools or TOOL_IMPORTS:
+        try:
+            entries = _import_cost([BASE_IMPORT] + TOOL_IMPORTS[tool])
+        except RuntimeError as e:
+            report["tools"][tool] = {"error": str(e)}
+            continue
+        # Top-level entries after the base import are what the tool adds
+        base_index = next(i for i, e in enumerate(entries) if e[2] == 0 and e[3] == BASE_IMPORT)
+        added = entries[base_index + 1:]
+        heaviest = sorted(added, key=lambda e: e[0], reverse=True)[:top]
+        report["tools"][tool] = {
+            "first_call_import_ms": round(sum(cum for _, cum, depth, _ in added if depth == 0) / 1000.0, 1),
+            "modules_loaded": len(added),
+            "heaviest_modules_ms": {name: round(self_us / 1000.0, 1) for self_us, _, _, name in heaviest},
+        }
+    return report
+
+
+def _regressions(report: dict, baseline: dict, max_pct: float) -> list:
+    found = []
+    pairs = [("cold_start", report["cold_start_ms"], baseline.get("cold_start_ms"))]
+    for tool, stats in report["tools"].items():
+        old = baseline.get("tools", {}).get(tool, {}).get("first_call_import_ms")
+        pairs.append((tool, stats.get("first_call_import_ms"), old))
+    for name, new, old in pairs:
+        if new is not None and old and new > old * (1 + max_pct / 100.0):
+            found.append(f"{name}: {old} ms -> {new} ms")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-tool import-time report for LungSight AI.")
+    parser.add_argument("--tool", action="append", choices=sorted(TOOL_IMPORTS), help="Limit to these tools.")
+    parser.add_argument("--json", help="Write the report to this file.")
+    parser.add_argument("--baseline", help="Previous --json report to compare against.")
+    parser.add_argument("--max-regression-pct", type=float, default=20.0)
+    args = parser.parse_args(argv)
+
+    report = import_time_report(args.tool)
+    print(f"Server cold start (import {BASE_IMPORT}): {report['cold_start_ms']} ms")
+    for tool, stats in report["tools"].items():
+        if "error" in stats:
+            print(f"  {tool:<32} error: {stats['error']}")
+            continue
+        heaviest = ", ".join(f"{name} {ms}" for name, ms in stats["heaviest_modules_ms"].items())
+        print(f"  {tool:<32} +{stats['first_call_import_ms']:>8} ms  ({heaviest})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = _regressions(report, json.load(f), args.max_regression_pct)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
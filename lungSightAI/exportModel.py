@@ -0,0 +1,118 @@
+"""
+Exports the Keras classifier to lightweight inference artefacts.
+
+    python -m lungSightAI.exportModel --format tflite --int8
+    python -m lungSightAI.exportModel --format onnx --int8      # needs tf2onnx + onnxruntime
+
+Artefacts land next to VGG.weights.h5 (see inferenceBackend.EXPORT_PATHS) and are
+selected at runtime with LUNGSIGHT_BACKEND. Every export ends with a parity check
+of the artefact against the Keras model on the calibration images.
+"""
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+from .preprocessing import preprocess_image
+from .inferenceBackend import EXPORT_PATHS, EXPORTED_REGISTRY, parity_check
+from .modelRegistry import MODEL_REGISTRY, INPUT_SHAPE
+from .batchPredict import expand_inputs
+from .customTools import WEIGHTS_PATH, CURRENT_DIR
+
+DEFAULT_CALIBRATION_DIR = os.path.join(CURRENT_DIR, "Data", "CXR Images")
+
+
+def load_calibration_images(inputs=DEFAULT_CALIBRATION_DIR, limit: int = 100) -> np.ndarray:
+    """Preprocessed sample CXRs used for int8 calibration and parity checks."""
+    arrays = [preprocess_image(path) for path in expand_inputs(inputs)[:limit]]
+    arrays = [arr for arr in arrays if arr is not None]
+    if not arrays:
+        raise RuntimeError(f"No readable calibration images found in: {inputs}")
+    return np.stack(arrays)
+
+
+def export_tflite(model, output_path: str, calibration: np.ndarray = None) -> str:
+    """Converts to TFLite; with calibration images, applies post-training int8 quantization."""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if calibration is not None:
+        def representative_dataset():
+            for image in calibration:
+                yield [image[np.newaxis].astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        # int8 kernels throughout; float32 in/out keeps the backend interface unchanged
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    return output_path
+
+
+def export_onnx(model, output_path: str, calibration: np.ndarray = None, opset: int = 17) -> str:
+    """Converts to ONNX; with calibration images, writes a statically int8-quantized copy."""
+    try:
+        import tensorflow as tf
+        import tf2onnx
+    except ImportError:
+        raise RuntimeError("ONNX export needs tf2onnx (pip install tf2onnx onnxruntime).")
+
+    spec = (tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name="input"),)
+    float_path = output_path if calibration is None else output_path.replace(".int8.onnx", ".onnx")
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=float_path)
+    if calibration is None:
+        return output_path
+
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._images = iter(calibration)
+
+        def get_next(self):
+            image = next(self._images, None)
+            return None if image is None else {"input": image[np.newaxis].astype(np.float32)}
+
+    quantize_static(float_path, output_path, _Reader(),
+                    activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the CXR classifier to TFLite / ONNX.")
+    parser.add_argument("--format", choices=["tflite", "onnx", "all"], default="tflite")
+    parser.add_argument("--int8", action="store_true", help="Post-training int8 quantization.")
+    parser.add_argument("--calibration", default=DEFAULT_CALIBRATION_DIR,
+                        help="Directory / glob of sample CXRs for calibration and parity.")
+    parser.add_argument("--limit", type=int, default=100, help="Max calibration images.")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="Max allowed |prob diff| (default 0.01 float, 0.05 int8).")
+    args = parser.parse_args(argv)
+
+    model = MODEL_REGISTRY.load(WEIGHTS_PATH)[0]["model"]
+    images = load_calibration_images(args.calibration, args.limit)
+    tolerance = args.tolerance if args.tolerance is not None else (0.05 if args.int8 else 0.01)
+
+    formats = ["tflite", "onnx"] if args.format == "all" else [args.format]
+    failed = False
+    for fmt in formats:
+        name = f"{fmt}-int8" if args.int8 else fmt
+        path = EXPORT_PATHS[name]
+        exporter = export_tflite if fmt == "tflite" else export_onnx
+        exporter(model, path, images if args.int8 else None)
+
+        backend = EXPORTED_REGISTRY.load(path)[0]["model"]
+        report = parity_check(model, backend, images)
+        report.update({"backend": name, "path": path, "size_mb": round(os.path.getsize(path) / 1e6, 2),
+                       "tolerance": tolerance, "passed": report["max_abs_diff"] <= tolerance})
+        print(json.dumps(report, indent=2))
+        failed = failed or not report["passed"]
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import os
+import csv
+import atexit
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import Future
+
+from .labels import DISEASES
+from .telemetry import record_event
+
+logger = logging.getLogger(__name__)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(CURRENT_DIR, "Data", "CSV files")
+HISTORY_DB_PATH = os.path.join(DATA_DIR, "inference_history.db")
+LEGACY_CSV_PATH = os.path.join(DATA_DIR, "user_inferences.csv")
+
+# Rows are buffered and written in one transaction when the buffer fills or the
+# oldest row has waited this long (rows appended with wait=True are written at
+# once, together with whatever else is buffered). 0 writes every row immediately.
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("LUNGSIGHT_HISTORY_FLUSH_INTERVAL", "1.0"))
+FLUSH_BATCH_SIZE = int(os.environ.get("LUNGSIGHT_HISTORY_BATCH_SIZE", "64"))
+
+# SQL column per disease label, in model output order
+DISEASE_COLUMNS = [d.lower().replace(" ", "_") for d in DISEASES]
+
+_SCHEMA = (
+    f"""
+    CREATE TABLE IF NOT EXISTS inferences (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        uuid TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        {", ".join(f"{col} REAL NOT NULL DEFAULT 0.0" for col in DISEASE_COLUMNS)}
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inferences_uuid_ts ON inferences (uuid, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_inferences_ts ON inferences (timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS migrations (
+        source TEXT PRIMARY KEY,
+        rows INTEGER NOT NULL,
+        migrated_at TEXT NOT NULL
+    )
+    """,
+)
+_INSERT = (
+    f"INSERT INTO inferences (uuid, timestamp, {', '.join(DISEASE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(DISEASE_COLUMNS) + 2))})"
+)
+_SELECT_RECENT = (
+    f"SELECT uuid, timestamp, {', '.join(DISEASE_COLUMNS)} FROM inferences "
+    f"WHERE uuid=? ORDER BY timestamp DESC, id DESC LIMIT ?"
+)
+
+
+def _row_dict(row) -> dict:
+    return {"uuid": row[0], "timestamp": row[1], **dict(zip(DISEASES, row[2:]))}
+
+
+class HistoryStore:
+    """
+    Indexed SQLite log of inference results, one row per scan.
+
+    append() buffers the row; a background thread writes buffered rows with a
+    single executemany() per transaction. append(wait=True) returns only once its
+    row is committed, and rows from concurrent waiting callers share that commit.
+    SQLite serialises the writes, so concurrent appends can never interleave
+    partial rows the way CSV appends can.
+    """
+
+    def __init__(self, db_path: str = HISTORY_DB_PATH, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 batch_size: int = FLUSH_BATCH_SIZE):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()          # guards the connection
+        self._buffer_lock = threading.Lock()
+        self._buffer = []
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._listeners = []
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        atexit.register(self.flush)
+
+    def add_listener(self, callback):
+        """
+        Calls callback(rows, last_id) with every batch of (uuid, timestamp, *probs)
+        tuples once written; the batch holds ids last_id - len(rows) + 1 .. last_id.
+        Batches are delivered one at a time, in id order.
+        """
+        self._listeners.append(callback)
+
+    def append(self, user_uuid: str, probabilities, timestamp: str = None, wait: bool = False):
+        """
+        Queues one scan. `probabilities` is a sequence in DISEASES order or a
+        {disease: probability} mapping (missing labels are stored as 0.0).
+        wait=True blocks until the row is committed and raises if the write fails;
+        use it whenever a caller reports the row as saved.
+        """
+        if isinstance(probabilities, dict):
+            probs = [float(probabilities.get(d, 0.0)) for d in DISEASES]
+        else:
+            probs = [float(p) for p in probabilities]
+        row = (user_uuid, timestamp or datetime.now().isoformat(), *probs)
+
+        if self.flush_interval <= 0:
+            self._write([row])
+            return
+
+        written = Future() if wait else None
+        with self._buffer_lock:
+            self._buffer.append((row, written))
+            full = len(self._buffer) >= self.batch_size
+        self._ensure_flusher()
+        if full or wait:
+            self._wakeup.set()
+        if written is not None:
+            written.result()
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            with self._buffer_lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="history-flusher", daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                record_event("lungsight_history_failures_total", stage="flush")
+                logger.warning("History flush failed (%s)", e)
+
+    def _write(self, rows: list):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(_INSERT, rows)
+                last_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self._notify(rows, last_id)
+
+    def _notify(self, rows: list, last_id: int):
+        """Hands a committed batch to the listeners. Called with self._lock held, so batches stay in id order."""
+        for callback in self._listeners:
+            try:
+                callback(rows, last_id)
+            except Exception as e:
+                record_event("lungsight_history_failures_total", stage="listener")
+                logger.warning("History listener %r failed (%s)", callback, e)
+
+    def flush(self):
+        """Writes all buffered rows now."""
+        with self._buffer_lock:
+            items, self._buffer = self._buffer, []
+        if not items:
+            return
+        try:
+            self._write([row for row, _ in items])
+        except Exception as e:
+            for _, written in items:
+                if written is not None:
+                    written.set_exception(e)
+            raise
+        for _, written in items:
+            if written is not None:
+                written.set_result(None)
+
+    def recent_scans(self, user_uuid: str, limit: int = 10) -> list:
+        """The user's last `limit` scans, newest first."""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(_SELECT_RECENT, (user_uuid, int(limit))).fetchall()
+        return [_row_dict(row) for row in rows]
+
+    def iter_rows(self, since: str = None, batch: int = 10000, after_id: int = 0, with_ids: bool = False):
+        """
+        Yields (uuid, timestamp, *probs) tuples in insertion order, optionally from a
+        timestamp or a row id on. with_ids=True yields (id, uuid, timestamp, *probs).
+        """
+        self.flush()
+        last_id = after_id
+        where = "AND timestamp >= ?" if since else ""
+        while True:
+            params = (last_id, since, batch) if since else (last_id, batch)
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, uuid, timestamp, {', '.join(DISEASE_COLUMNS)} FROM inferences "
+                    f"WHERE id > ? {where} ORDER BY id LIMIT ?", params
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for row in rows:
+                yield row if with_ids else row[1:]
+
+    def migrate_from_csv(self, csv_path: str = LEGACY_CSV_PATH) -> int:
+        """
+        One-time import of a legacy user_inferences.csv. Returns the number of rows
+        imported (0 if this file was already migrated or does not exist).
+        The check and the import are one BEGIN IMMEDIATE transaction, so of two
+        processes starting together only one imports the file.
+        """
+        source = os.path.abspath(csv_path)
+        if not os.path.exists(source):
+            return 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM migrations WHERE source=?", (source,)).fetchone():
+                return 0
+
+        rows = []
+        with open(source, newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                if not record.get("uuid"):
+                    continue
+                probs = [float(record.get(d) or 0.0) for d in DISEASES]
+                rows.append((record["uuid"], record.get("timestamp") or datetime.now().isoformat(), *probs))
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-checked under the write lock: another process may have imported it meanwhile
+                if self._conn.execute("SELECT 1 FROM migrations WHERE source=?", (source,)).fetchone():
+                    self._conn.rollback()
+                    return 0
+                self._conn.executemany(_INSERT, rows)
+                last_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO migrations (source, rows, migrated_at) VALUES (?, ?, ?)",
+                    (source, len(rows), datetime.now().isoformat()),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            if rows:
+                self._notify(rows, last_id)
+        logger.info("Migrated %d rows from %s into the inference history", len(rows), source)
+        return len(rows)
+
+    def export_csv(self, csv_path: str) -> int:
+        """Writes the whole history in the legacy user_inferences.csv layout."""
+        count = 0
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["uuid"] + DISEASES + ["timestamp"])
+            for row in self.iter_rows():
+                writer.writerow([row[0], *row[2:], row[1]])
+                count += 1
+        return count
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Process-wide store; migrates the legacy CSV the first time it is opened."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = HistoryStore()
+                store.migrate_from_csv(LEGACY_CSV_PATH)
+                _store = store
+    return _store
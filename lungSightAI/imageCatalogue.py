@@ -0,0 +1,210 @@
+"""
+In-memory catalogue of the CXR image store, used to resolve vague references
+("image 1", "1st xray", "img10") to files without probing the filesystem.
+
+The catalogue is rebuilt incrementally: at most once per REFRESH_SECONDS a
+lookup stats the image directories, and only when a directory's mtime changed
+is it listed again. Files whose (size, mtime) are unchanged keep their cached
+metadata. Dimensions and content hash are filled in when predict_from_image_tool
+reads an image anyway, or on the first metadata() call, and are then served from
+memory until the file changes.
+
+Image numbers match as written first ("image 01" -> img01.jpg, as the old
+resolver's file-name patterns did) and only then by value ("image 01" ->
+img1.jpg when there is no img01.jpg).
+"""
+import os
+import re
+import time
+import difflib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.join(CURRENT_DIR, "Data", "CXR Images")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+REFRESH_SECONDS = float(os.environ.get("LUNGSIGHT_CATALOGUE_REFRESH_SECONDS", "2.0"))
+
+# When several files share a number, the names the old resolver tried, in its order
+_NUMBER_PRIORITY = ("img{n}.jpg", "image{n}.jpg", "{n}.jpg", "img{n}.png")
+_NUMBER = re.compile(r"\d+")
+
+
+def _normalize(text: str) -> str:
+    return text.strip().strip('"').strip("'").lower()
+
+
+class ImageCatalogue:
+    """Maps file names, stems, relative paths and image numbers to paths in O(1)."""
+
+    def __init__(self, root: str = IMAGE_DIR, refresh_seconds: float = REFRESH_SECONDS):
+        self.root = root
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._entries = {}        # path -> {"name", "size", "mtime_ns", "width", "height", "sha256"}
+        self._keys = {}           # normalised name / stem / relative path -> path
+        self._numbers = {}        # "012" -> [paths, best first], digits as written in the file name
+        self._values = {}         # "12" -> [paths, best first], by numeric value
+        self._dir_mtimes = {}     # directory -> mtime_ns at the last listing
+        self._checked_at = 0.0
+        self.scans = 0
+
+    # --- refresh ------------------------------------------------------------
+
+    def _directories_changed(self) -> bool:
+        if not self._dir_mtimes:
+            return True
+        for directory, mtime_ns in self._dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def refresh(self, force: bool = False):
+        """Re-lists the image store if a directory changed (or `force`)."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not force and not self._directories_changed():
+                return
+            entries, dir_mtimes = {}, {}
+            pending = [self.root]
+            while pending:
+                directory = pending.pop()
+                try:
+                    dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                    listing = list(os.scandir(directory))
+                except OSError:
+                    continue
+                for item in listing:
+                    if item.is_dir():
+                        pending.append(item.path)
+                        continue
+                    if not item.name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    stat = item.stat()
+                    old = self._entries.get(item.path)
+                    if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                        entries[item.path] = old
+                    else:
+                        entries[item.path] = {"name": item.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                              "width": None, "height": None, "sha256": None}
+            self._entries = entries
+            self._dir_mtimes = dir_mtimes
+            self._rebuild_index()
+            self.scans += 1
+
+    def _rebuild_index(self):
+        keys, numbers, values = {}, {}, {}
+        for path, entry in sorted(self._entries.items()):
+            name = entry["name"].lower()
+            stem = os.path.splitext(name)[0]
+            relative = os.path.relpath(path, self.root).lower()
+            for key in (relative, name, stem):
+                keys.setdefault(key, path)
+            match = _NUMBER.search(stem)
+            if match:
+                numbers.setdefault(match.group(), []).append(path)
+                values.setdefault(str(int(match.group())), []).append(path)
+
+        for index in (numbers, values):
+            for number, paths in index.items():
+                priority = [p.format(n=number) for p in _NUMBER_PRIORITY]
+                paths.sort(key=lambda p: (priority.index(self._entries[p]["name"].lower())
+                                          if self._entries[p]["name"].lower() in priority else len(priority), p))
+        self._keys, self._numbers, self._values = keys, numbers, values
+
+    def _numbered(self, digits: str) -> list:
+        """Paths for an image number: as written, else by value."""
+        return self._numbers.get(digits) or self._values.get(str(int(digits)), [])
+
+    def _maybe_refresh(self):
+        if time.monotonic() - self._checked_at >= self.refresh_seconds:
+            self.refresh()
+
+    # --- lookups ------------------------------------------------------------
+
+    def resolve(self, user_input: str):
+        """The catalogued path for a name, stem or image number, or None."""
+        self._maybe_refresh()
+        text = _normalize(user_input)
+        keys = self._keys
+        path = keys.get(text) or keys.get(os.path.splitext(text)[0])
+        if path:
+            return path
+
+        match = _NUMBER.search(text)
+        if match:
+            paths = self._numbered(match.group())
+            if paths:
+                if len(paths) > 1:
+                    logger.debug("'%s' matches %d images, using %s", user_input, len(paths), os.path.basename(paths[0]))
+                return paths[0]
+        return None
+
+    def candidates(self, user_input: str, limit: int = 5) -> list:
+        """Closest catalogued file names to `user_input`, best first, as (name, score) pairs."""
+        self._maybe_refresh()
+        text = _normalize(user_input)
+        scored = {}
+        matcher = difflib.SequenceMatcher(b=text, autojunk=False)
+        for path, entry in self._entries.items():
+            name = entry["name"]
+            score = 0.0
+            for key in (name.lower(), os.path.splitext(name.lower())[0]):
+                matcher.set_seq1(key)
+                if matcher.real_quick_ratio() > score and matcher.quick_ratio() > score:
+                    score = max(score, matcher.ratio())
+            scored[name] = score
+        match = _NUMBER.search(text)
+        for path in self._numbered(match.group()) if match else []:
+            scored[self._entries[path]["name"]] = 1.0   # same image number
+        ranked = sorted(scored.items(), key=lambda item: (-item[1], item[0]))
+        return [(name, round(score, 3)) for name, score in ranked[:limit] if score > 0.3]
+
+    def record_contents(self, path: str, data: bytes, sha256: str = None):
+        """Stores dimensions and hash for a catalogued file whose bytes the caller already read."""
+        entry = self._entries.get(path)
+        if entry is None or entry["size"] != len(data):
+            return
+        from .preprocessing import image_dimensions
+        from .resultCache import image_digest
+
+        dims = image_dimensions(data)
+        entry["width"], entry["height"] = dims if dims else (None, None)
+        entry["sha256"] = sha256 or image_digest(data)
+
+    def metadata(self, user_input: str) -> dict:
+        """{"path", "name", "size", "width", "height", "sha256"} for an image, or None."""
+        path = self.resolve(user_input)
+        if path is None:
+            return None
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        if entry["sha256"] is None:
+            with open(path, "rb") as f:
+                self.record_contents(path, f.read())
+        return {"path": path, "name": entry["name"], "size": entry["size"],
+                "width": entry["width"], "height": entry["height"], "sha256": entry["sha256"]}
+
+    def __len__(self):
+        self._maybe_refresh()
+        return len(self._entries)
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def get_image_catalogue() -> ImageCatalogue:
+    """Process-wide catalogue of Data/CXR Images."""
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = ImageCatalogue()
+    return _catalogue
@@ -0,0 +1,155 @@
+import os
+import threading
+import numpy as np
+
+from .modelRegistry import ModelRegistry, MODEL_REGISTRY, NUM_CLASSES
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.path.join(CURRENT_DIR, "Data", "Model Weight")
+
+# Artefacts written by `python -m lungSightAI.exportModel`
+EXPORT_PATHS = {
+    "tflite": os.path.join(EXPORT_DIR, "VGG.tflite"),
+    "tflite-int8": os.path.join(EXPORT_DIR, "VGG.int8.tflite"),
+    "onnx": os.path.join(EXPORT_DIR, "VGG.onnx"),
+    "onnx-int8": os.path.join(EXPORT_DIR, "VGG.int8.onnx"),
+}
+BACKENDS = ("keras",) + tuple(EXPORT_PATHS)
+
+# keras | tflite | tflite-int8 | onnx | onnx-int8
+INFERENCE_BACKEND = os.environ.get("LUNGSIGHT_BACKEND", "keras").lower()
+BACKEND_PATH = os.environ.get("LUNGSIGHT_BACKEND_PATH", "")
+BACKEND_THREADS = int(os.environ.get("LUNGSIGHT_BACKEND_THREADS", "0")) or None
+
+
+def _tflite_interpreter_class():
+    # Prefer the standalone runtimes: they do not pull in TensorFlow at all
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteBackend:
+    """Runs a .tflite artefact; exposes the same predict_on_batch() as a Keras model."""
+
+    name = "tflite"
+
+    def __init__(self, path: str, num_threads: int = BACKEND_THREADS):
+        self.path = path
+        self._interpreter = _tflite_interpreter_class()(model_path=path, num_threads=num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if self._batch_size != len(batch):
+                self._interpreter.resize_tensor_input(self._input["index"], list(batch.shape))
+                self._interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+
+            scale, zero_point = self._input.get("quantization", (0.0, 0))
+            if self._input["dtype"] != np.float32 and scale:
+                batch = np.round(batch / scale + zero_point).astype(self._input["dtype"])
+            self._interpreter.set_tensor(self._input["index"], batch)
+            self._interpreter.invoke()
+            out = self._interpreter.get_tensor(self._output["index"])
+
+        scale, zero_point = self._output.get("quantization", (0.0, 0))
+        if out.dtype != np.float32 and scale:
+            out = (out.astype(np.float32) - zero_point) * scale
+        return out.reshape(len(batch), NUM_CLASSES)
+
+
+class OnnxBackend:
+    """Runs a .onnx artefact with ONNX Runtime on CPU."""
+
+    name = "onnx"
+
+    def __init__(self, path: str, num_threads: int = BACKEND_THREADS):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("The ONNX backend needs onnxruntime (pip install onnxruntime).")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self._session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self._session.run(None, {self._input_name: batch})[0].reshape(len(batch), NUM_CLASSES)
+
+
+def _build_exported_backend(path: str):
+    if path.endswith(".onnx"):
+        return OnnxBackend(path)
+    return TFLiteBackend(path)
+
+
+EXPORTED_REGISTRY = ModelRegistry(builder=_build_exported_backend)
+
+
+def backend_path(name: str, weights_path: str) -> str:
+    """Model file used by a backend (LUNGSIGHT_BACKEND_PATH overrides exported artefacts)."""
+    if name == "keras":
+        return weights_path
+    if name not in EXPORT_PATHS:
+        raise ValueError(f"Unknown inference backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    return BACKEND_PATH or EXPORT_PATHS[name]
+
+
+def load_backend(weights_path: str, name: str = None) -> tuple:
+    """
+    Returns (registry entry, already_resident) for the selected backend. The
+    entry's "model" has predict_on_batch(); "weights_sha256" fingerprints the
+    exact file it runs, so cached results never cross backends.
+    """
+    name = (name or INFERENCE_BACKEND).lower()
+    path = backend_path(name, weights_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model file for backend '{name}' not found at: {path}")
+    registry = MODEL_REGISTRY if name == "keras" else EXPORTED_REGISTRY
+    return registry.load(path)
+
+
+def parity_check(reference, candidate, images: np.ndarray, threshold: float = 0.3) -> dict:
+    """
+    Compares two predict_on_batch() models on the same preprocessed images.
+    Reports the max/mean absolute probability difference and the number of
+    Y/N label flips at `threshold`, per disease label and overall.
+    """
+    from .labels import DISEASES
+
+    expected = np.asarray(reference.predict_on_batch(images), dtype=np.float32)
+    actual = np.asarray(candidate.predict_on_batch(images), dtype=np.float32)
+    diff = np.abs(expected - actual)
+    flips = (expected >= threshold) != (actual >= threshold)
+
+    return {
+        "images": int(len(images)),
+        "max_abs_diff": float(diff.max()) if diff.size else 0.0,
+        "mean_abs_diff": float(diff.mean()) if diff.size else 0.0,
+        "label_flips": int(flips.sum()),
+        "per_label": {
+            disease: {
+                "max_abs_diff": float(diff[:, i].max()),
+                "label_flips": int(flips[:, i].sum()),
+            }
+            for i, disease in enumerate(DISEASES)
+        },
+    }
@@ -0,0 +1,268 @@
+"""
+Offline end-to-end inference benchmark over the Data/CXR Images samples.
+
+    python -m lungSightAI.inferenceBenchmark --json bench.json
+    python -m lungSightAI.inferenceBenchmark --baseline bench.json --max-regression-pct 20
+    python -m lungSightAI.inferenceBenchmark --baseline bench.json --thresholds thresholds.json
+
+Measures model load time (through load_classification_model_tool), decode and
+preprocess latency, single-image and batched predict latency (p50/p95/p99),
+predict_from_image_tool latency and concurrent throughput, high-accuracy (TTA)
+latency against single-view, and RSS / peak RSS.
+Synthetic upscaled copies of the samples add volume and large-image decode cost.
+
+No network is needed: without VGG.weights.h5 a random-initialised weights file
+is generated, and without the cached ImageNet weights the architecture is built
+with weights=None before the fine-tuned weights are loaded over it. Timings stay
+representative either way; only the predictions are meaningless.
+
+--thresholds is a JSON object of per-metric allowed regressions in percent,
+e.g. {"predict_single_ms_p95": 30, "load_model_s": 50}; other metrics use
+--max-regression-pct. Metrics ending in "_per_sec" regress when they drop.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import contextlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import customTools
+from .modelRegistry import MODEL_REGISTRY, build_architecture, build_classification_model, resident_memory_mb
+from .imageCatalogue import IMAGE_DIR
+from .batchPredict import expand_inputs
+
+IMAGENET_NOTOP = "vgg16_weights_tf_dim_ordering_tf_kernels_notop.h5"
+BATCH_SIZES = (1, 8, 16)
+
+
+def peak_memory_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resident_memory_mb()
+
+
+def _percentiles(name: str, samples_ms: list) -> dict:
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        f"{name}_ms_p50": round(float(np.percentile(values, 50)), 2),
+        f"{name}_ms_p95": round(float(np.percentile(values, 95)), 2),
+        f"{name}_ms_p99": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000.0
+
+
+def imagenet_weights_cached() -> bool:
+    keras_home = os.environ.get("KERAS_HOME", os.path.join(os.path.expanduser("~"), ".keras"))
+    return os.path.exists(os.path.join(keras_home, "models", IMAGENET_NOTOP))
+
+
+def _offline_builder(weights_path: str):
+    # The fine-tuned weights cover the whole network, so the ImageNet base only saves a download
+    return build_classification_model(weights_path, base_weights=None)
+
+
+def prepare_model(workdir: str) -> dict:
+    """Points the tools at usable weights without touching the network. Returns what was substituted."""
+    setup = {"random_weights": False, "imagenet_base": imagenet_weights_cached()}
+    if not os.path.exists(customTools.WEIGHTS_PATH):
+        path = os.path.join(workdir, "VGG.weights.h5")
+        build_architecture(None).save_weights(path)
+        customTools.WEIGHTS_PATH = path
+        setup["random_weights"] = True
+    if not setup["imagenet_base"]:
+        MODEL_REGISTRY.builder = _offline_builder
+    return setup
+
+
+@contextlib.contextmanager
+def prepared_model(workdir: str):
+    """prepare_model for the length of a with block; the tools' weights path and model builder are restored after."""
+    weights_path, builder = customTools.WEIGHTS_PATH, MODEL_REGISTRY.builder
+    try:
+        yield prepare_model(workdir)
+    finally:
+        customTools.WEIGHTS_PATH = weights_path
+        MODEL_REGISTRY.builder = builder
+
+
+def synthesize_images(samples: list, workdir: str, count: int, scales=(2, 3, 4)) -> list:
+    """Upscaled JPEG copies of the samples (cycling through `scales`), for volume and decode cost."""
+    import cv2
+
+    paths = []
+    for i in range(count):
+        source = samples[i % len(samples)]
+        scale = scales[(i // len(samples)) % len(scales)]
+        image = cv2.imread(source, cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        path = os.path.join(workdir, f"synthetic_{i:04d}_x{scale}.jpg")
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        paths.append(path)
+    return paths
+
+
+def run_benchmark(images=IMAGE_DIR, synthetic: int = 30, iterations: int = 30, concurrency: int = 8) -> dict:
+    from .preprocessing import decode_image_bytes, preprocess_image_bytes
+    from .resultCache import INFERENCE_CACHE
+
+    workdir = tempfile.mkdtemp(prefix="lungsight-bench-")
+    try:
+        samples = expand_inputs(images)
+        if not samples:
+            raise RuntimeError(f"No sample images found in: {images}")
+        metrics = {"rss_start_mb": round(resident_memory_mb(), 1)}
+        with prepared_model(workdir) as setup:
+            paths = samples + synthesize_images(samples, workdir, synthetic)
+            payloads = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    payloads.append(f.read())
+
+            # Model load, through the tool (TensorFlow is already imported if random weights were generated)
+            loaded, load_ms = _timed(customTools.load_classification_model_tool)
+            if loaded["status"] != "success":
+                raise RuntimeError(f"Model load failed: {loaded.get('error_message')}")
+            metrics["load_model_s"] = round(load_ms / 1000.0, 3)
+            metrics["rss_after_load_mb"] = round(resident_memory_mb(), 1)
+            model = customTools.model
+
+            # Decode and full preprocess, per image
+            decode_ms, preprocess_ms = [], []
+            for data in payloads:
+                decode_ms.append(_timed(decode_image_bytes, data)[1])
+                preprocess_ms.append(_timed(preprocess_image_bytes, data)[1])
+            metrics.update(_percentiles("decode", decode_ms))
+            metrics.update(_percentiles("preprocess", preprocess_ms))
+
+            # Raw model latency per batch size
+            arrays = np.stack([preprocess_image_bytes(data) for data in payloads[:max(BATCH_SIZES)]])
+            while len(arrays) < max(BATCH_SIZES):
+                arrays = np.concatenate([arrays, arrays])[:max(BATCH_SIZES)]
+            for batch_size in BATCH_SIZES:
+                batch = arrays[:batch_size]
+                model.predict_on_batch(batch)  # warm-up / graph tracing
+                timings = [_timed(model.predict_on_batch, batch)[1] for _ in range(iterations)]
+                name = "predict_single" if batch_size == 1 else f"predict_batch{batch_size}"
+                metrics.update(_percentiles(name, timings))
+                metrics[f"{name}_images_per_sec"] = round(batch_size * 1000.0 / float(np.mean(timings)), 2)
+
+            # The tool end to end (read, hash, preprocess, micro-batcher, encode), cache cleared each time
+            tool_ms = []
+            for i in range(iterations):
+                INFERENCE_CACHE.clear()
+                result, elapsed = _timed(customTools.predict_from_image_tool, paths[i % len(paths)])
+                if result["status"] != "success":
+                    raise RuntimeError(f"predict_from_image_tool failed: {result.get('error_message')}")
+                tool_ms.append(elapsed)
+            metrics.update(_percentiles("predict_tool", tool_ms))
+
+            # High-accuracy mode: all TTA views of one image in a single batch
+            from .testTimeAugmentation import predict_views
+            predict_views(model, payloads[0])  # warm-up for the view batch shape
+            tta_ms = [_timed(predict_views, model, payloads[i % len(payloads)])[1] for i in range(iterations)]
+            metrics.update(_percentiles("predict_tta", tta_ms))
+            metrics["predict_tta_vs_single_ratio"] = round(
+                metrics["predict_tta_ms_p50"] / metrics["predict_single_ms_p50"], 2)
+
+            # Concurrent tool calls, as several sessions scanning at once
+            INFERENCE_CACHE.clear()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(customTools.predict_from_image_tool, paths))
+            elapsed = time.perf_counter() - started
+            ok = sum(1 for r in results if r["status"] == "success")
+            metrics[f"predict_tool_concurrent{concurrency}_images_per_sec"] = round(ok / elapsed, 2)
+
+            metrics["rss_end_mb"] = round(resident_memory_mb(), 1)
+            metrics["peak_rss_mb"] = round(peak_memory_mb(), 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    import tensorflow as tf
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "tensorflow": tf.__version__,
+            "backend": loaded.get("backend"),
+            "cpu_count": os.cpu_count(),
+            "images": len(paths),
+            "sample_images": len(samples),
+            "iterations": iterations,
+            **setup,
+        },
+        "metrics": metrics,
+    }
+
+
+def find_regressions(report: dict, baseline: dict, max_pct: float, thresholds: dict = None) -> list:
+    """Metrics worse than the baseline by more than their allowed percentage."""
+    thresholds = thresholds or {}
+    found = []
+    for name, new in report["metrics"].items():
+        old = baseline.get("metrics", {}).get(name)
+        if not old or name.startswith("rss_start"):
+            continue
+        allowed = thresholds.get(name, max_pct) / 100.0
+        higher_is_better = name.endswith("_per_sec")
+        worse = new < old * (1 - allowed) if higher_is_better else new > old * (1 + allowed)
+        if worse:
+            found.append(f"{name}: {old} -> {new} (allowed {allowed * 100:.0f}%)")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline inference benchmark for LungSight AI.")
+    parser.add_argument("--images", default=IMAGE_DIR, help="Directory / glob of sample CXRs.")
+    parser.add_argument("--synthetic", type=int, default=30, help="Upscaled synthetic copies to add.")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed runs per latency measurement.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads for the throughput run.")
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--baseline", help="Previous --json results to compare against.")
+    parser.add_argument("--max-regression-pct", type=float, default=20.0)
+    parser.add_argument("--thresholds", help="JSON file of per-metric allowed regression percentages.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.images, args.synthetic, args.iterations, args.concurrency)
+    print(json.dumps(report, indent=2))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        thresholds = {}
+        if args.thresholds:
+            with open(args.thresholds, encoding="utf-8") as f:
+                thresholds = json.load(f)
+        regressions = find_regressions(report, baseline, args.max_regression_pct, thresholds)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
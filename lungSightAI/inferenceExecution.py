@@ -0,0 +1,400 @@
+"""
+CPU execution plan for the inference server: how many model replicas serve
+predictions, and with how many threads each.
+
+shared   - one replica in this process behind the micro-batcher queue (default).
+           TensorFlow gets every available core for intra-op work and at most two
+           inter-op threads, instead of its default of one pool per core for both.
+replicas - N worker processes, each holding one replica with cores / N threads;
+           the micro-batcher keeps up to N batches in flight at once. Every
+           replica is a full TensorFlow + VGG16 copy (0.5 GB or more), so this
+           is opt-in: size the instance's memory for N of them.
+auto     - replicas once there are at least 2 * LUNGSIGHT_REPLICA_THREADS cores,
+           shared below that.
+
+Available cores honour the CPU affinity mask and the cgroup CPU quota, so a
+Cloud Run instance with 2 vCPUs plans for 2 even on a larger host.
+
+    python -m lungSightAI.inferenceExecution plan
+    python -m lungSightAI.inferenceExecution loadtest --cpus 1 2 4 8 --modes shared replicas --seconds 20
+
+The load generator runs each configuration in a fresh process pinned to that
+many cores and reports images/sec, latency and scaling efficiency.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import logging
+import argparse
+import threading
+import subprocess
+import numpy as np
+
+from .modelRegistry import ModelRegistry, MODEL_REGISTRY, build_classification_model
+from .inferenceBackend import INFERENCE_BACKEND, backend_path, load_backend
+
+EXECUTION_MODE = os.environ.get("LUNGSIGHT_EXECUTION_MODE", "shared").lower()
+REPLICAS = int(os.environ.get("LUNGSIGHT_REPLICAS", "0"))          # 0: cores // REPLICA_THREADS
+REPLICA_THREADS = int(os.environ.get("LUNGSIGHT_REPLICA_THREADS", "2"))
+INTRA_OP_THREADS = int(os.environ.get("LUNGSIGHT_INTRA_OP_THREADS", "0"))   # 0: from the plan
+INTER_OP_THREADS = int(os.environ.get("LUNGSIGHT_INTER_OP_THREADS", "0"))
+EXECUTION_MODES = ("auto", "shared", "replicas")
+REPLICA_START_TIMEOUT = float(os.environ.get("LUNGSIGHT_REPLICA_START_TIMEOUT", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+def _cgroup_cpu_limit():
+    """CPU quota in cores from cgroup v2 (cpu.max) or v1 (cfs quota), or None when unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", encoding="utf-8") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", encoding="utf-8") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """Cores this process may actually use (affinity mask, capped by the cgroup quota)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_limit()
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+def execution_plan(mode: str = EXECUTION_MODE, cpus: int = None) -> dict:
+    """{"mode", "cpus", "replicas", "intra_op_threads", "inter_op_threads"} for `mode` on `cpus` cores."""
+    cpus = cpus or available_cpus()
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode '{mode}'. Choose one of: {', '.join(EXECUTION_MODES)}")
+    if mode == "auto":
+        mode = "replicas" if cpus >= 2 * REPLICA_THREADS else "shared"
+
+    if mode == "replicas":
+        replicas = REPLICAS or max(1, cpus // max(1, REPLICA_THREADS))
+        intra = INTRA_OP_THREADS or max(1, cpus // replicas)
+        inter = INTER_OP_THREADS or 1
+    else:
+        replicas = 1
+        intra = INTRA_OP_THREADS or cpus
+        inter = INTER_OP_THREADS or min(2, cpus)
+    return {"mode": mode, "cpus": cpus, "replicas": replicas, "intra_op_threads": intra, "inter_op_threads": inter}
+
+
+EXECUTION_PLAN = execution_plan()
+
+_threads_applied = None
+
+
+def apply_thread_settings(intra: int, inter: int) -> bool:
+    """
+    Sizes TensorFlow's thread pools. Only possible before TensorFlow runs its first
+    op: returns False, with a warning, when the pools already exist.
+    """
+    global _threads_applied
+    if _threads_applied == (intra, inter):
+        return True
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra)
+        tf.config.threading.set_inter_op_parallelism_threads(inter)
+    except RuntimeError as e:
+        logger.warning("TensorFlow thread pools already initialised, intra_op=%d inter_op=%d not applied (%s)",
+                       intra, inter, e)
+        return False
+    _threads_applied = (intra, inter)
+    logger.debug("TensorFlow threads intra_op=%d inter_op=%d", intra, inter)
+    return True
+
+
+# --- replica worker processes ------------------------------------------------
+
+_replica = None
+
+
+def _init_replica(model_path: str, intra: int, inter: int, builder, ready):
+    """Worker initializer: loads this process's replica, then puts its pid on `ready`."""
+    global _replica
+    from .inferenceBackend import OnnxBackend, TFLiteBackend
+
+    if model_path.endswith(".onnx"):
+        _replica = OnnxBackend(model_path, num_threads=intra)
+    elif model_path.endswith(".tflite"):
+        _replica = TFLiteBackend(model_path, num_threads=intra)
+    else:
+        if not apply_thread_settings(intra, inter):
+            # A replica on the default pools would oversubscribe the cores the plan split up
+            raise RuntimeError(f"Could not size TensorFlow to intra_op={intra} inter_op={inter} in a replica.")
+        if builder is not None:
+            MODEL_REGISTRY.builder = builder
+        _replica = MODEL_REGISTRY.load(model_path)[0]["model"]
+    ready.put(os.getpid())
+
+
+def _replica_predict(batch: np.ndarray) -> np.ndarray:
+    return np.asarray(_replica.predict_on_batch(batch), dtype=np.float32)
+
+
+class ReplicaPool:
+    """predict_on_batch() served by one model replica per worker process."""
+
+    def __init__(self, model_path: str, replicas: int, intra: int, inter: int = 1, builder=None):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        context = multiprocessing.get_context("spawn")
+        self.model_path = model_path
+        self.replicas = replicas
+        self._ready = context.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=replicas,
+            mp_context=context,
+            initializer=_init_replica,
+            initargs=(model_path, intra, inter, builder, self._ready),
+        )
+
+    def wait_ready(self, timeout: float = REPLICA_START_TIMEOUT) -> list:
+        """
+        Starts every replica and waits until each one has reported its model loaded.
+        Returns the worker pids; raises if a replica fails to load or `timeout` passes.
+        """
+        # While no worker is idle, each submit starts another process, so these start all N
+        futures = [self._pool.submit(os.getpid) for _ in range(self.replicas)]
+        pids = set()
+        deadline = time.monotonic() + timeout
+        while len(pids) < self.replicas:
+            try:
+                pids.add(self._ready.get(timeout=0.5))
+            except queue.Empty:
+                for future in futures:
+                    if future.done() and future.exception() is not None:
+                        raise future.exception()   # BrokenProcessPool: an initializer failed
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{len(pids)} of {self.replicas} model replicas ready after {timeout:.0f}s.")
+        return sorted(pids)
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        return self._pool.submit(_replica_predict, np.ascontiguousarray(batch, dtype=np.float32)).result()
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+_active_pool = None
+
+
+def _build_replica_pool(model_path: str) -> ReplicaPool:
+    global _active_pool
+    plan = EXECUTION_PLAN
+    # A custom builder (e.g. the offline one in inferenceBenchmark.py) is passed on to the workers
+    builder = None if MODEL_REGISTRY.builder is build_classification_model else MODEL_REGISTRY.builder
+    pool = ReplicaPool(model_path, plan["replicas"], plan["intra_op_threads"], plan["inter_op_threads"], builder)
+    try:
+        pids = pool.wait_ready()
+    except BaseException:
+        pool.close()
+        raise
+    logger.info("%d model replicas ready (pids %s, %d threads each)", plan["replicas"], pids, plan["intra_op_threads"])
+    if _active_pool is not None:
+        _active_pool.close()  # the weights file changed: retire the old replicas
+    _active_pool = pool
+    return pool
+
+
+REPLICA_REGISTRY = ModelRegistry(builder=_build_replica_pool)
+
+
+def load_execution(weights_path: str, name: str = None) -> tuple:
+    """
+    load_backend() under the execution plan: returns (entry, already_resident),
+    where entry["model"] is either the in-process model or a ReplicaPool.
+    """
+    name = (name or INFERENCE_BACKEND).lower()
+    plan = EXECUTION_PLAN
+    if plan["mode"] == "shared":
+        if name == "keras":
+            apply_thread_settings(plan["intra_op_threads"], plan["inter_op_threads"])
+        return load_backend(weights_path, name)
+
+    path = backend_path(name, weights_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model file for backend '{name}' not found at: {path}")
+    return REPLICA_REGISTRY.load(path)
+
+
+# --- load generator ----------------------------------------------------------
+
+def _run_load(seconds: float, concurrency: int, weights: str = None) -> dict:
+    """Drives the micro-batcher from `concurrency` threads for `seconds`; runs inside the pinned child."""
+    import tempfile
+    from . import customTools
+    from .inferenceBenchmark import prepared_model
+
+    if weights:
+        customTools.WEIGHTS_PATH = weights
+    workdir = tempfile.mkdtemp(prefix="lungsight-load-")
+    try:
+        with prepared_model(workdir):
+            return _drive_load(seconds, concurrency)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _drive_load(seconds: float, concurrency: int) -> dict:
+    from . import customTools
+    from .batchPredict import expand_inputs
+    from .imageCatalogue import IMAGE_DIR
+    from .preprocessing import preprocess_image
+
+    images = [img for img in (preprocess_image(p) for p in expand_inputs(IMAGE_DIR)) if img is not None]
+
+    started = time.perf_counter()
+    loaded = customTools.load_classification_model_tool()
+    if loaded["status"] != "success":
+        raise RuntimeError(loaded.get("error_message"))
+    load_seconds = time.perf_counter() - started
+    batcher = customTools._inference_batcher()
+    for image in images[:EXECUTION_PLAN["replicas"] * 2]:
+        batcher.predict(image)  # warm-up / graph tracing in every replica
+
+    latencies, lock = [], threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset: int):
+        i = offset
+        while time.perf_counter() < deadline:
+            began = time.perf_counter()
+            batcher.predict(images[i % len(images)])
+            with lock:
+                latencies.append((time.perf_counter() - began) * 1000.0)
+            i += 1
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    values = np.asarray(latencies or [0.0])
+    return {
+        **EXECUTION_PLAN,
+        "concurrency": concurrency,
+        "load_seconds": round(load_seconds, 2),
+        "images": len(latencies),
+        "images_per_sec": round(len(latencies) / elapsed, 2),
+        "latency_ms_p50": round(float(np.percentile(values, 50)), 1),
+        "latency_ms_p95": round(float(np.percentile(values, 95)), 1),
+        "mean_batch_size": batcher.metrics()["mean_batch_size"],
+    }
+
+
+def load_test(cpu_counts=(1, 2, 4, 8), modes=("shared", "replicas"), seconds: float = 20.0,
+              concurrency: int = 0) -> list:
+    """Runs _run_load in a fresh process per (cores, mode), pinned to that many cores."""
+    import tempfile
+    from . import customTools
+    from .inferenceBenchmark import prepared_model
+
+    try:
+        usable = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        usable = list(range(os.cpu_count() or 1))
+    limit = available_cpus()
+
+    # Random weights are generated once here (if needed) and shared by every run
+    workdir = tempfile.mkdtemp(prefix="lungsight-load-")
+    try:
+        with prepared_model(workdir):
+            rows = _load_test_runs(cpu_counts, modes, seconds, concurrency, usable, limit, customTools.WEIGHTS_PATH)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Scaling relative to the 1-CPU (or smallest) run of the same mode
+    for mode in modes:
+        runs = [r for r in rows if r.get("requested_mode") == mode and "images_per_sec" in r]
+        if runs:
+            base = runs[0]
+            for r in runs:
+                r["speedup"] = round(r["images_per_sec"] / base["images_per_sec"], 2) if base["images_per_sec"] else None
+                r["efficiency"] = round(r["speedup"] * base["cpus"] / r["cpus"], 2) if r["speedup"] else None
+    return rows
+
+
+def _load_test_runs(cpu_counts, modes, seconds, concurrency, usable, limit, weights) -> list:
+    rows = []
+    for cpus in cpu_counts:
+        for mode in modes:
+            if cpus > limit:
+                rows.append({"cpus": cpus, "requested_mode": mode, "skipped": f"only {limit} CPUs available"})
+                continue
+            cores = set(usable[:cpus])
+            env = dict(os.environ, LUNGSIGHT_EXECUTION_MODE=mode)
+            command = [sys.executable, "-m", "lungSightAI.inferenceExecution", "_run",
+                       "--seconds", str(seconds), "--concurrency", str(concurrency or 2 * cpus),
+                       "--weights", weights]
+            print(f"Load test on {cpus} CPUs, mode {mode}...", file=sys.stderr)
+            done = subprocess.run(command, env=env, capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  preexec_fn=(lambda: os.sched_setaffinity(0, cores)) if hasattr(os, "sched_setaffinity") else None)
+            if done.returncode != 0:
+                rows.append({"cpus": cpus, "requested_mode": mode, "error": (done.stderr.strip().splitlines() or ["failed"])[-1]})
+                continue
+            rows.append({"requested_mode": mode, **json.loads(done.stdout.strip().splitlines()[-1])})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inference execution plan and CPU scaling load test.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("plan", help="Print the execution plan for this machine.")
+    load = sub.add_parser("loadtest", help="Throughput scaling across CPU counts and execution modes.")
+    load.add_argument("--cpus", type=int, nargs="+", default=[1, 2, 4, 8])
+    load.add_argument("--modes", nargs="+", default=["shared", "replicas"], choices=EXECUTION_MODES)
+    load.add_argument("--seconds", type=float, default=20.0)
+    load.add_argument("--concurrency", type=int, default=0, help="Client threads (default: 2 per CPU).")
+    load.add_argument("--json", help="Write the results to this file.")
+    run = sub.add_parser("_run")
+    run.add_argument("--seconds", type=float, default=20.0)
+    run.add_argument("--concurrency", type=int, default=2)
+    run.add_argument("--weights")
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        print(json.dumps({**EXECUTION_PLAN, "available_cpus": available_cpus(), "backend": INFERENCE_BACKEND}, indent=2))
+    elif args.command == "_run":
+        print(json.dumps(_run_load(args.seconds, args.concurrency, args.weights)))
+    else:
+        rows = load_test(args.cpus, args.modes, args.seconds, args.concurrency)
+        print(f"{'cpus':>4}  {'mode':<9} {'replicas x threads':<19} {'img/s':>8} {'speedup':>8} {'eff.':>5} {'p50 ms':>8} {'p95 ms':>8}")
+        for r in rows:
+            if "images_per_sec" not in r:
+                print(f"{r['cpus']:>4}  {r['requested_mode']:<9} {r.get('skipped') or r.get('error')}")
+                continue
+            layout = f"{r['replicas']} x {r['intra_op_threads']}"
+            print(f"{r['cpus']:>4}  {r['mode']:<9} {layout:<19} {r['images_per_sec']:>8} {r['speedup']:>8} "
+                  f"{r['efficiency']:>5} {r['latency_ms_p50']:>8} {r['latency_ms_p95']:>8}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
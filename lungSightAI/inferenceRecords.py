@@ -0,0 +1,306 @@
+"""
+Fixed-layout binary records of saved inferences, in an append-only file that
+is read back as a memory-mapped NumPy structured array (no parsing, no copy).
+
+One record (110 bytes with float32 probabilities, 84 with float16):
+
+    timestamp      datetime64[us]
+    uuid           16 bytes (the user UUID's raw bytes)
+    image_sha256   32 bytes (raw digest of the image bytes; zeros if unknown)
+    probs          13 x float32 | float16, DISEASES order
+    labels         uint16 bitmask, bit i set if DISEASES[i] was positive
+
+The file starts with a HEADER_SIZE-byte header (magic, version, probability
+width, label count, record size) followed by the packed records. Writers only
+ever append whole records, so a reader maps every complete record and ignores
+a torn tail left by a crash; the next append truncates it away first.
+
+    records = RecordLog(RECORD_LOG_PATH).read()          # np.memmap, read-only
+    records["probs"][:, DISEASES.index("Edema")]         # a strided view, still no copy
+    positive = unpack_labels(records["labels"])           # (N, 13) bool
+
+Converters to and from the legacy user_inferences.csv layout:
+
+    python -m lungSightAI.inferenceRecords from-csv user_inferences.csv --output inferences.lsr
+    python -m lungSightAI.inferenceRecords to-csv inferences.lsr --output user_inferences.csv
+    python -m lungSightAI.inferenceRecords from-history --output inferences.lsr
+    python -m lungSightAI.inferenceRecords info inferences.lsr
+"""
+import os
+import sys
+import time
+import uuid
+import struct
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from .labels import DISEASES
+from .historyStore import DATA_DIR
+
+RECORD_LOG_ENABLED = os.environ.get("LUNGSIGHT_RECORD_LOG", "1") == "1"
+RECORD_LOG_PATH = os.path.join(DATA_DIR, "inference_records.lsr")
+# Probability width of newly created logs; an existing log keeps the width in its header
+RECORD_PRECISION = os.environ.get("LUNGSIGHT_RECORD_PRECISION", "float32")
+
+MAGIC = b"LSIR"
+RECORD_VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<4sHBBI")     # magic, version, probability bytes, label count, record size
+NUM_LABELS = len(DISEASES)
+_BITS = (1 << np.arange(NUM_LABELS)).astype(np.uint16)
+_PRECISIONS = {"float32": 4, "float16": 2}
+
+
+def record_dtype(precision: str = "float32") -> np.dtype:
+    if precision not in _PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Use 'float32' or 'float16'.")
+    return np.dtype([
+        ("timestamp", "<M8[us]"),
+        ("uuid", "u1", (16,)),
+        ("image_sha256", "u1", (32,)),
+        ("probs", "<f4" if precision == "float32" else "<f2", (NUM_LABELS,)),
+        ("labels", "<u2"),
+    ])
+
+
+def pack_labels(positive) -> np.ndarray:
+    """(N, 13) or (13,) booleans -> uint16 bitmask(s)."""
+    return (np.asarray(positive, dtype=bool) * _BITS).sum(axis=-1, dtype=np.uint16)
+
+
+def unpack_labels(masks) -> np.ndarray:
+    """uint16 bitmask(s) -> (N, 13) or (13,) booleans."""
+    return (np.asarray(masks, dtype=np.uint16)[..., None] & _BITS) != 0
+
+
+def _uuid_bytes(values) -> np.ndarray:
+    return np.frombuffer(b"".join(uuid.UUID(str(v)).bytes for v in values), dtype=np.uint8).reshape(-1, 16)
+
+
+def uuid_strings(records) -> list:
+    """The uuid column back as canonical UUID strings."""
+    hexed = np.ascontiguousarray(records["uuid"]).tobytes().hex()
+    return [f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}" for h in (hexed[i:i + 32] for i in range(0, len(hexed), 32))]
+
+
+def _timestamps(values) -> np.ndarray:
+    try:
+        return np.array(values, dtype="datetime64[us]")
+    except ValueError:
+        return np.array([datetime.fromisoformat(str(v)) for v in values], dtype="datetime64[us]")
+
+
+def make_records(uuids, timestamps, probabilities, image_sha256=None, thresholds=0.3,
+                 precision: str = "float32") -> np.ndarray:
+    """
+    Builds records from columns. `probabilities` is (N, 13); `image_sha256` a list of
+    hex digests (or None); labels are `probabilities >= thresholds` (scalar or per label).
+    """
+    from .thresholdProfiles import apply_thresholds
+
+    probs = np.asarray(probabilities, dtype=np.float32).reshape(-1, NUM_LABELS)
+    records = np.zeros(len(probs), dtype=record_dtype(precision))
+    records["timestamp"] = _timestamps(timestamps)
+    records["uuid"] = _uuid_bytes(uuids)
+    if image_sha256 is not None:
+        digests = [bytes.fromhex(h) if h else bytes(32) for h in image_sha256]
+        records["image_sha256"] = np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(-1, 32)
+    records["probs"] = probs
+    records["labels"] = pack_labels(apply_thresholds(probs, thresholds))
+    return records
+
+
+class RecordLog:
+    """Append-only file of inference records with a memory-mapped reader."""
+
+    def __init__(self, path: str = RECORD_LOG_PATH, precision: str = RECORD_PRECISION):
+        self.path = path
+        self._lock = threading.Lock()
+        self.dtype = self._open_header(precision)
+
+    def _open_header(self, precision: str) -> np.dtype:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        dtype = record_dtype(precision)
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return self._read_header()
+        with os.fdopen(fd, "wb") as f:
+            header = _HEADER.pack(MAGIC, RECORD_VERSION, _PRECISIONS[precision], NUM_LABELS, dtype.itemsize)
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+        return dtype
+
+    def _read_header(self) -> np.dtype:
+        with open(self.path, "rb") as f:
+            raw = f.read(HEADER_SIZE)
+        if len(raw) < HEADER_SIZE:
+            raise ValueError(f"{self.path}: truncated record log header.")
+        magic, version, prob_bytes, labels, size = _HEADER.unpack_from(raw)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an inference record log.")
+        if version != RECORD_VERSION or labels != NUM_LABELS:
+            raise ValueError(f"{self.path}: unsupported record log (version {version}, {labels} labels).")
+        dtype = record_dtype("float32" if prob_bytes == 4 else "float16")
+        if dtype.itemsize != size:
+            raise ValueError(f"{self.path}: record size {size} does not match the expected {dtype.itemsize}.")
+        return dtype
+
+    def append(self, records: np.ndarray) -> int:
+        """Appends records (converted to this log's precision). Returns how many were written."""
+        if records.dtype != self.dtype:
+            converted = np.zeros(len(records), dtype=self.dtype)
+            for name in self.dtype.names:
+                converted[name] = records[name]
+            records = converted
+        # One write() of whole records on an O_APPEND descriptor
+        with self._lock, open(self.path, "ab") as f:
+            end = f.seek(0, os.SEEK_END)
+            torn = (end - HEADER_SIZE) % self.dtype.itemsize
+            if torn:
+                # A crash cut the last record short: drop it, or every record after it would be misaligned
+                f.truncate(end - torn)
+            f.write(records.tobytes())
+        return len(records)
+
+    def __len__(self) -> int:
+        return max(0, os.path.getsize(self.path) - HEADER_SIZE) // self.dtype.itemsize
+
+    def read(self) -> np.ndarray:
+        """Every complete record, as a read-only np.memmap (nothing is parsed or copied)."""
+        count = len(self)
+        if count == 0:
+            return np.zeros(0, dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_record_log() -> RecordLog:
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = RecordLog()
+    return _log
+
+
+def record_inference(user_uuid: str, probabilities, timestamp: str, image_sha256: str = None, thresholds=0.3):
+    """Appends one saved inference to the process-wide record log (when LUNGSIGHT_RECORD_LOG=1)."""
+    if not RECORD_LOG_ENABLED:
+        return
+    records = make_records([user_uuid], [timestamp], [probabilities],
+                           [image_sha256] if image_sha256 else None, thresholds)
+    get_record_log().append(records)
+
+
+# --- converters -------------------------------------------------------------
+
+def records_from_csv(csv_path: str, thresholds=0.3, precision: str = "float32") -> tuple:
+    """(records, skipped rows) from a user_inferences.csv; rows without a valid UUID are skipped."""
+    import pandas as pd
+
+    frame = pd.read_csv(csv_path, dtype={"uuid": str, "timestamp": str})
+    frame = frame.dropna(subset=["uuid"])
+    valid = np.ones(len(frame), dtype=bool)
+    for i, value in enumerate(frame["uuid"].tolist()):
+        try:
+            uuid.UUID(value)
+        except ValueError:
+            valid[i] = False
+    skipped = int((~valid).sum())
+    frame = frame[valid]
+
+    for disease in DISEASES:
+        if disease not in frame.columns:
+            frame[disease] = 0.0
+    probs = frame[DISEASES].fillna(0.0).to_numpy(dtype=np.float32)
+    now = datetime.now().isoformat()
+    timestamps = frame["timestamp"].fillna(now).tolist() if "timestamp" in frame.columns else [now] * len(frame)
+    return make_records(frame["uuid"].tolist(), timestamps, probs, None, thresholds, precision), skipped
+
+
+def records_from_history(store=None, thresholds=0.3, precision: str = "float32", batch: int = 50000):
+    """Yields record arrays for the whole SQLite history, `batch` rows at a time."""
+    if store is None:
+        from .historyStore import get_history_store
+        store = get_history_store()
+    rows = []
+    for row in store.iter_rows():
+        rows.append(row)
+        if len(rows) == batch:
+            yield make_records([r[0] for r in rows], [r[1] for r in rows], [r[2:] for r in rows], None, thresholds, precision)
+            rows = []
+    if rows:
+        yield make_records([r[0] for r in rows], [r[1] for r in rows], [r[2:] for r in rows], None, thresholds, precision)
+
+
+def records_to_csv(records: np.ndarray, csv_path: str) -> int:
+    """Writes records in the legacy user_inferences.csv layout (uuid, 13 probabilities, timestamp)."""
+    import pandas as pd
+
+    frame = pd.DataFrame(np.asarray(records["probs"], dtype=np.float32), columns=DISEASES)
+    frame.insert(0, "uuid", uuid_strings(records))
+    frame["timestamp"] = np.datetime_as_string(records["timestamp"], unit="us")
+    frame.to_csv(csv_path, index=False)
+    return len(frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Binary inference record logs and the user_inferences.csv layout.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    from_csv = sub.add_parser("from-csv", help="Append the rows of a user_inferences.csv to a record log.")
+    from_csv.add_argument("csv")
+    from_history = sub.add_parser("from-history", help="Append the whole SQLite inference history to a record log.")
+    for command in (from_csv, from_history):
+        command.add_argument("--output", default=RECORD_LOG_PATH)
+        command.add_argument("--precision", default=RECORD_PRECISION, choices=tuple(_PRECISIONS))
+        command.add_argument("--threshold", type=float, default=0.3, help="Threshold for the label bitmask.")
+        command.add_argument("--profile", default="", help="Per-label threshold profile for the bitmask instead.")
+    to_csv = sub.add_parser("to-csv", help="Write a record log in the user_inferences.csv layout.")
+    to_csv.add_argument("log")
+    to_csv.add_argument("--output", required=True)
+    info = sub.add_parser("info", help="Record count, size and read time of a record log.")
+    info.add_argument("log", nargs="?", default=RECORD_LOG_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command in ("from-csv", "from-history"):
+        from .thresholdProfiles import resolve_thresholds
+        thresholds, _ = resolve_thresholds(args.profile, args.threshold)
+        log = RecordLog(args.output, args.precision)
+        if args.command == "from-csv":
+            records, skipped = records_from_csv(args.csv, thresholds, args.precision)
+            written = log.append(records)
+            print(f"Appended {written} records to {args.output} ({skipped} rows without a valid UUID skipped).")
+        else:
+            written = sum(log.append(records) for records in records_from_history(None, thresholds, args.precision))
+            print(f"Appended {written} records to {args.output}.")
+        return
+
+    if args.command == "to-csv":
+        count = records_to_csv(RecordLog(args.log).read(), args.output)
+        print(f"Wrote {count} rows to {args.output}.")
+        return
+
+    log = RecordLog(args.log)
+    started = time.perf_counter()
+    records = log.read()
+    mapped_ms = (time.perf_counter() - started) * 1000.0
+    started = time.perf_counter()
+    prevalence = unpack_labels(records["labels"]).mean(axis=0) if len(records) else np.zeros(NUM_LABELS)
+    scan_ms = (time.perf_counter() - started) * 1000.0
+    print(f"{args.log}: {len(records)} records of {log.dtype.itemsize} bytes "
+          f"({log.dtype['probs'].subdtype[0].name} probabilities), {os.path.getsize(args.log) / 1024:.1f} KB")
+    print(f"Mapped in {mapped_ms:.2f} ms; label prevalence over all records in {scan_ms:.2f} ms.")
+    if len(records):
+        print(f"First {records['timestamp'][0]}, last {records['timestamp'][-1]}")
+        for disease, share in zip(DISEASES, prevalence):
+            print(f"  {disease:<28} {share:.3f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
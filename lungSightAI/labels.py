@@ -0,0 +1,7 @@
+# Output order of the classifier's 13 sigmoid units
+DISEASES = [
+    'Enlarged Cardiomediastinum', 'Cardiomegaly', 'Lung Opacity',
+    'Lung Lesion', 'Edema', 'Consolidation', 'Pneumonia',
+    'Atelectasis', 'Pneumothorax', 'Pleural Effusion',
+    'Pleural Other', 'Fracture', 'Support Devices'
+]
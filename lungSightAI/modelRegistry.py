@@ -0,0 +1,201 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+
+from .telemetry import record_event
+
+logger = logging.getLogger(__name__)
+
+NUM_CLASSES = 13
+INPUT_SHAPE = (224, 224, 3)
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resident_memory_mb() -> float:
+    """Current resident set size of this process in MB (peak RSS if /proc is unavailable)."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024.0 * 1024.0) if peak > 1 << 30 else peak / 1024.0
+    except Exception:
+        return 0.0
+
+
+def build_architecture(base_weights="imagenet"):
+    """The VGG16 + dense head classifier, untrained head. base_weights=None needs no download."""
+    # Imported here so that exported (TFLite / ONNX) backends never load Keras
+    from tensorflow.keras.applications import VGG16
+    from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout
+    from tensorflow.keras.models import Model
+
+    base_model = VGG16(weights=base_weights, include_top=False, input_shape=INPUT_SHAPE)
+    for layer in base_model.layers: layer.trainable = False
+    x = GlobalAveragePooling2D()(base_model.output)
+    x = Dense(1024, activation='relu')(x)
+    x = Dropout(0.5)(x)
+    outputs = Dense(NUM_CLASSES, activation='sigmoid')(x)
+    return Model(inputs=base_model.input, outputs=outputs)
+
+
+def build_classification_model(weights_path: str, base_weights="imagenet"):
+    """Builds the VGG16 + dense head architecture and loads the fine-tuned weights."""
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    try:
+        # Strategy 1: Build & Load Weights
+        logger.debug("Strategy 1: building the architecture and loading weights")
+        model = build_architecture(base_weights)
+        model.load_weights(weights_path)
+        logger.debug("Strategy 1 successful")
+
+    except Exception as e_weights:
+        logger.debug("Strategy 1 failed (%s), trying strategy 2", e_weights)
+        try:
+            model = load_model(weights_path, compile=False)
+            logger.debug("Strategy 2 successful")
+        except Exception:
+            raise RuntimeError(f"Load failed: {str(e_weights)}")
+
+    try:
+        model.compile(optimizer=tf.keras.optimizers.Adam(1e-4), loss='binary_crossentropy', metrics=[tf.keras.metrics.AUC()])
+    except Exception as e:
+        raise RuntimeError(f"Compilation failed: {str(e)}")
+    return model
+
+
+class ModelRegistry:
+    """
+    Thread-safe, load-once store of classification models.
+
+    Models are keyed by (absolute weights path, SHA-256 of the weights file), so a
+    replaced weights file is picked up while an unchanged one is never rebuilt.
+    The file is only re-hashed when its size or mtime changes.
+    """
+
+    def __init__(self, builder=build_classification_model):
+        self._builder = builder
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = {}
+        self._fingerprints = {}
+
+    @property
+    def builder(self):
+        """The callable that builds a model from a weights path."""
+        return self._builder
+
+    @builder.setter
+    def builder(self, builder):
+        # Models already resident are kept; the new builder applies to the next load
+        with self._lock:
+            self._builder = builder
+
+    def _key(self, weights_path: str) -> tuple:
+        path = os.path.abspath(weights_path)
+        st = os.stat(path)
+        signature = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._fingerprints.get(path)
+        if cached and cached[0] == signature:
+            return (path, cached[1])
+        sha = file_sha256(path)
+        with self._lock:
+            self._fingerprints[path] = (signature, sha)
+        return (path, sha)
+
+    def get(self, weights_path: str):
+        """Returns the resident entry for these weights, or None if not loaded yet."""
+        try:
+            key = self._key(weights_path)
+        except OSError:
+            return None
+        with self._lock:
+            return self._entries.get(key)
+
+    def load(self, weights_path: str) -> tuple:
+        """
+        Returns (entry, already_resident). Builds the model only on the first call
+        for a given weights file; concurrent callers wait for that single load.
+        """
+        key = self._key(weights_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry, True
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry, True
+
+            rss_before = resident_memory_mb()
+            started = time.perf_counter()
+            model = self._builder(key[0])
+            load_seconds = time.perf_counter() - started
+            rss_after = resident_memory_mb()
+
+            entry = {
+                "model": model,
+                "weights_path": key[0],
+                "weights_sha256": key[1],
+                "load_seconds": round(load_seconds, 3),
+                "rss_before_mb": round(rss_before, 1),
+                "rss_after_mb": round(rss_after, 1),
+                "loaded_at": time.time(),
+            }
+            with self._lock:
+                # Drop models built from an older version of the same file
+                for old_key in [k for k in self._entries if k[0] == key[0]]:
+                    del self._entries[old_key]
+                self._entries[key] = entry
+            logger.info("Model loaded in %ss (RSS %s MB)", entry["load_seconds"], entry["rss_after_mb"])
+            return entry, False
+
+    def warm_up(self, weights_path: str, background: bool = True):
+        """Loads the model ahead of the first request. Returns the thread when backgrounded."""
+        def _run():
+            try:
+                self.load(weights_path)
+            except Exception as e:
+                record_event("lungsight_model_warmup_failures_total")
+                logger.warning("Model warm-up failed (%s)", e)
+
+        if not background:
+            _run()
+            return None
+        thread = threading.Thread(target=_run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        """Load time and memory figures for every resident model."""
+        with self._lock:
+            entries = [
+                {k: v for k, v in entry.items() if k != "model"}
+                for entry in self._entries.values()
+            ]
+        return {"resident_models": entries, "resident_memory_mb": round(resident_memory_mb(), 1)}
+
+
+MODEL_REGISTRY = ModelRegistry()
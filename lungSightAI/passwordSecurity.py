@@ -0,0 +1,128 @@
+import os
+import hmac
+import time
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+from .toolExecutors import HASH
+
+# werkzeug method string, e.g. "scrypt", "scrypt:65536:8:1" or "pbkdf2:sha256:600000".
+# Stored hashes made with any other parameters are upgraded on the next login.
+HASH_METHOD = os.environ.get("LUNGSIGHT_PASSWORD_HASH_METHOD", "scrypt")
+HASH_SALT_LENGTH = int(os.environ.get("LUNGSIGHT_PASSWORD_SALT_LENGTH", "16"))
+
+LOGIN_MAX_FAILURES = int(os.environ.get("LUNGSIGHT_LOGIN_MAX_FAILURES", "5"))
+LOGIN_LOCKOUT_SECONDS = float(os.environ.get("LUNGSIGHT_LOGIN_LOCKOUT_SECONDS", "30"))
+LOGIN_MAX_LOCKOUT_SECONDS = 15 * 60
+
+# hashlib's scrypt / pbkdf2_hmac release the GIL, so the small "hash" thread pool
+# (LUNGSIGHT_HASH_WORKERS, shared with image digests) gives real parallelism
+# without the start-up and pickling cost of a process pool.
+# werkzeug is imported on first use, so importing the agent does not pay for it.
+
+
+def normalize_method(method: str) -> str:
+    """Expands werkzeug's shorthand ("scrypt", "pbkdf2") to the full parameter string it stores."""
+    name, *args = method.split(":")
+    if name == "scrypt":
+        defaults = ["32768", "8", "1"]
+        return ":".join(["scrypt"] + args + defaults[len(args):])
+    if name == "pbkdf2":
+        from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+        defaults = ["sha256", str(DEFAULT_PBKDF2_ITERATIONS)]
+        return ":".join(["pbkdf2"] + args + defaults[len(args):])
+    return method
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    """True if a stored hash was made with different parameters than HASH_METHOD."""
+    return stored_hash.split("$", 1)[0] != normalize_method(HASH_METHOD)
+
+
+async def _run_hash_job(fn, *args):
+    # Beyond LUNGSIGHT_HASH_MAX_PENDING jobs this raises toolExecutors.Busy rather than queueing
+    return await HASH.run(fn, *args)
+
+
+def _generate_hash(password: str) -> str:
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(password, HASH_METHOD, HASH_SALT_LENGTH)
+
+
+def _check_hash(stored_hash: str, password: str) -> bool:
+    from werkzeug.security import check_password_hash
+    return check_password_hash(stored_hash, password)
+
+
+async def hash_password(password: str) -> str:
+    """generate_password_hash on the bounded hashing pool (raises Busy when it is full)."""
+    return await _run_hash_job(_generate_hash, password)
+
+
+async def verify_password(stored_hash: str, password: str) -> bool:
+    """check_password_hash on the bounded hashing pool (raises Busy when it is full)."""
+    return await _run_hash_job(_check_hash, stored_hash, password)
+
+
+class LoginThrottle:
+    """
+    Per-username brute-force protection that avoids running the KDF at all.
+
+    After LOGIN_MAX_FAILURES consecutive failures a username is locked for
+    LOGIN_LOCKOUT_SECONDS, doubling on each further lockout. Wrong passwords
+    that were already rejected for the current stored hash are recognised from a
+    keyed digest and rejected without a KDF evaluation.
+    """
+
+    def __init__(self, max_failures: int = LOGIN_MAX_FAILURES, lockout_seconds: float = LOGIN_LOCKOUT_SECONDS,
+                 max_users: int = 10000, max_known_bad: int = 50000):
+        self.max_failures = max(1, max_failures)
+        self.lockout_seconds = lockout_seconds
+        self.max_users = max_users
+        self.max_known_bad = max_known_bad
+        self._key = secrets.token_bytes(32)  # per process; digests are never persisted
+        self._lock = threading.Lock()
+        self._users = OrderedDict()       # username -> [failures, lockouts, locked_until]
+        self._known_bad = OrderedDict()   # digest -> None
+
+    def _digest(self, stored_hash: str, password: str) -> bytes:
+        return hmac.new(self._key, f"{stored_hash}\0{password}".encode("utf-8"), hashlib.blake2b).digest()
+
+    def retry_after(self, username: str) -> float:
+        """Seconds until this username may try again (0 if not locked)."""
+        with self._lock:
+            record = self._users.get(username)
+            if record is None:
+                return 0.0
+            return max(0.0, record[2] - time.monotonic())
+
+    def is_known_bad(self, stored_hash: str, password: str) -> bool:
+        with self._lock:
+            return self._digest(stored_hash, password) in self._known_bad
+
+    def record_failure(self, username: str, stored_hash: str = None, password: str = None):
+        with self._lock:
+            record = self._users.pop(username, None) or [0, 0, 0.0]
+            record[0] += 1
+            if record[0] >= self.max_failures:
+                lock_for = min(self.lockout_seconds * (2 ** record[1]), LOGIN_MAX_LOCKOUT_SECONDS)
+                record[2] = time.monotonic() + lock_for
+                record[0] = 0
+                record[1] += 1
+            self._users[username] = record
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+            if stored_hash is not None and password is not None:
+                self._known_bad[self._digest(stored_hash, password)] = None
+                while len(self._known_bad) > self.max_known_bad:
+                    self._known_bad.popitem(last=False)
+
+    def record_success(self, username: str):
+        with self._lock:
+            self._users.pop(username, None)
+
+
+LOGIN_THROTTLE = LoginThrottle()
@@ -0,0 +1,446 @@
+"""
+Population analytics over the inference history, kept up to date as scans arrive.
+
+PopulationAnalytics folds every batch the history store writes into dense
+NumPy aggregates (no re-reading of the history):
+
+- per day: scan count, per-label probability sums and per-label histograms
+  (HISTOGRAM_BINS bins of width 1 / HISTOGRAM_BINS over [0, 1])
+- all time: the same three, as running totals
+- per user and day: scan count and per-label probability sums
+
+Threshold counts come from the histograms (exact for thresholds on a bin edge,
+i.e. multiples of 0.05 up to 0.95; higher thresholds count the last bin), so
+"prevalence of Pleural Effusion >= 0.3 in the last 30 days" is a slice-sum over
+30 rows, and all-time figures are O(1).
+
+The aggregates are saved to a columnar .npz cache together with the id of the
+last history row they include; on start-up only newer rows are read back.
+
+    python -m lungSightAI.populationAnalytics summary --days 30
+    python -m lungSightAI.populationAnalytics trend "Cardiomegaly" --user <uuid> --window 7
+    python -m lungSightAI.populationAnalytics rebuild
+"""
+import os
+import sys
+import json
+import atexit
+import logging
+import argparse
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+from .labels import DISEASES
+from .historyStore import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_PATH = os.path.join(DATA_DIR, "inference_aggregates.npz")
+CACHE_VERSION = 1
+HISTOGRAM_BINS = 20
+NUM_LABELS = len(DISEASES)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _day_numbers(timestamps) -> np.ndarray:
+    """Days since 1970-01-01 for ISO timestamps (vectorised; odd formats parsed one by one)."""
+    try:
+        return np.array([t[:10] for t in timestamps], dtype="datetime64[D]").astype(np.int64)
+    except ValueError:
+        days = []
+        for t in timestamps:
+            try:
+                days.append(datetime.fromisoformat(str(t)).date().toordinal() - _EPOCH_ORDINAL)
+            except ValueError:
+                days.append(date.today().toordinal() - _EPOCH_ORDINAL)
+        return np.array(days, dtype=np.int64)
+
+
+def _day_number(value) -> int:
+    if isinstance(value, int):
+        return value
+    return date.fromisoformat(str(value)[:10]).toordinal() - _EPOCH_ORDINAL
+
+
+def _day_text(day: int) -> str:
+    return date.fromordinal(int(day) + _EPOCH_ORDINAL).isoformat()
+
+
+def _label_index(label: str) -> int:
+    lowered = label.strip().lower().replace("_", " ")
+    for i, disease in enumerate(DISEASES):
+        if disease.lower() == lowered:
+            return i
+    raise ValueError(f"Unknown label '{label}'. Choose one of: {', '.join(DISEASES)}")
+
+
+def _grow(array: np.ndarray, rows: int) -> np.ndarray:
+    """Doubles the first axis until it holds `rows` rows (zero-filled)."""
+    if rows <= len(array):
+        return array
+    grown = np.zeros((max(rows, 2 * len(array), 16),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class PopulationAnalytics:
+    """Incrementally maintained per-day, per-user and all-time aggregates of the inference history."""
+
+    def __init__(self, bins: int = HISTOGRAM_BINS):
+        self.bins = bins
+        self._lock = threading.Lock()
+        self.watermark = 0                 # id of the last history row folded in
+        self.stale = False                 # rows were written that the listener could not fold
+        self._day0 = None                  # day number of row 0 of the per-day arrays
+        self._days = 0
+        self._day_count = np.zeros(0, dtype=np.int64)
+        self._day_sum = np.zeros((0, NUM_LABELS), dtype=np.float64)
+        self._day_hist = np.zeros((0, NUM_LABELS, bins), dtype=np.int32)
+        self._total_count = 0
+        self._total_sum = np.zeros(NUM_LABELS, dtype=np.float64)
+        self._total_hist = np.zeros((NUM_LABELS, bins), dtype=np.int64)
+        self._users = {}                   # uuid -> user number
+        self._user_rows = []               # user number -> [row in the user-day table, ...]
+        self._user_day_rows = {}           # (user number, day) -> row
+        self._ud_day = np.zeros(0, dtype=np.int64)
+        self._ud_count = np.zeros(0, dtype=np.int64)
+        self._ud_sum = np.zeros((0, NUM_LABELS), dtype=np.float64)
+        self._ud_rows = 0
+
+    # --- folding --------------------------------------------------------------
+
+    def _day_slots(self, days: np.ndarray) -> np.ndarray:
+        """Row of each day in the per-day arrays, extending them as needed."""
+        low, high = int(days.min()), int(days.max())
+        if self._day0 is None:
+            self._day0 = low
+        if low < self._day0:
+            shift = self._day0 - low
+            self._day_count = np.concatenate([np.zeros(shift, dtype=np.int64), self._day_count])
+            self._day_sum = np.concatenate([np.zeros((shift, NUM_LABELS)), self._day_sum])
+            self._day_hist = np.concatenate([np.zeros((shift, NUM_LABELS, self.bins), dtype=np.int32), self._day_hist])
+            self._day0 = low
+            self._days += shift
+        needed = high - self._day0 + 1
+        self._day_count = _grow(self._day_count, needed)
+        self._day_sum = _grow(self._day_sum, needed)
+        self._day_hist = _grow(self._day_hist, needed)
+        self._days = max(self._days, needed)
+        return days - self._day0
+
+    def _user_day_slots(self, uuids, days: np.ndarray) -> np.ndarray:
+        slots = np.empty(len(days), dtype=np.int64)
+        for i, (user_uuid, day) in enumerate(zip(uuids, days.tolist())):
+            user = self._users.get(user_uuid)
+            if user is None:
+                user = self._users[user_uuid] = len(self._user_rows)
+                self._user_rows.append([])
+            row = self._user_day_rows.get((user, day))
+            if row is None:
+                row = self._user_day_rows[(user, day)] = self._ud_rows
+                self._user_rows[user].append(row)
+                self._ud_rows += 1
+            slots[i] = row
+        self._ud_day = _grow(self._ud_day, self._ud_rows)
+        self._ud_count = _grow(self._ud_count, self._ud_rows)
+        self._ud_sum = _grow(self._ud_sum, self._ud_rows)
+        self._ud_day[slots] = days
+        return slots
+
+    def fold(self, rows: list, ids=None):
+        """
+        Adds (uuid, timestamp, *probs) rows to every aggregate, vectorised per batch.
+        With `ids` (their history row ids), rows at or below the watermark are skipped
+        and the watermark advances, so a row is never counted twice.
+        """
+        if not rows:
+            return 0
+        probs = np.clip(np.asarray([row[2:] for row in rows], dtype=np.float64), 0.0, 1.0)
+        days = _day_numbers([row[1] for row in rows])
+        uuids = [row[0] for row in rows]
+
+        with self._lock:
+            if ids is not None:
+                ids = np.asarray(ids, dtype=np.int64)
+                fresh = ids > self.watermark
+                if not fresh.all():
+                    probs, days, ids = probs[fresh], days[fresh], ids[fresh]
+                    uuids = [u for u, keep in zip(uuids, fresh) if keep]
+                if not len(ids):
+                    return 0
+                self.watermark = int(ids.max())
+
+            bins = np.minimum((probs * self.bins).astype(np.int64), self.bins - 1)
+            labels = np.broadcast_to(np.arange(NUM_LABELS), bins.shape)
+            slots = self._day_slots(days)
+            np.add.at(self._day_count, slots, 1)
+            np.add.at(self._day_sum, slots, probs)
+            np.add.at(self._day_hist, (np.broadcast_to(slots[:, None], bins.shape), labels, bins), 1)
+            self._total_count += len(days)
+            self._total_sum += probs.sum(axis=0)
+            np.add.at(self._total_hist, (labels, bins), 1)
+
+            user_slots = self._user_day_slots(uuids, days)
+            np.add.at(self._ud_count, user_slots, 1)
+            np.add.at(self._ud_sum, user_slots, probs)
+        return len(days)
+
+    def on_history_write(self, rows: list, last_id: int):
+        """HistoryStore listener. Folds a batch only if it directly follows the watermark."""
+        first_id = last_id - len(rows) + 1
+        if first_id == self.watermark + 1:
+            self.fold(rows, range(first_id, last_id + 1))
+        elif last_id > self.watermark:
+            self.stale = True   # rows written behind our back (e.g. by another process): sync() on next query
+
+    def sync(self, store) -> int:
+        """Folds history rows newer than the watermark. Returns how many were added."""
+        self.stale = False
+        added = 0
+        batch = []
+        for row in store.iter_rows(after_id=self.watermark, with_ids=True):
+            batch.append(row)
+            if len(batch) == 10000:
+                added += self.fold([r[1:] for r in batch], [r[0] for r in batch])
+                batch = []
+        return added + self.fold([r[1:] for r in batch], [r[0] for r in batch])
+
+    # --- queries --------------------------------------------------------------
+
+    def _range(self, since=None, until=None, days: int = None) -> tuple:
+        """Row range [lo, hi) of the per-day arrays; None means all time."""
+        if since is None and until is None and not days:
+            return None
+        if self._day0 is None:
+            return (0, 0)
+        end = _day_number(until) + 1 if until else _day_number(date.today().isoformat()) + 1
+        start = _day_number(since) if since else (end - days if days else self._day0)
+        lo = min(max(start - self._day0, 0), self._days)
+        hi = min(max(end - self._day0, 0), self._days)
+        return (lo, max(lo, hi))
+
+    def _window(self, since=None, until=None, days: int = None) -> tuple:
+        """(count, sums (13,), histograms (13, bins)) over a date range or all time."""
+        span = self._range(since, until, days)
+        if span is None:
+            return self._total_count, self._total_sum.copy(), self._total_hist.copy()
+        lo, hi = span
+        return (int(self._day_count[lo:hi].sum()), self._day_sum[lo:hi].sum(axis=0),
+                self._day_hist[lo:hi].sum(axis=0, dtype=np.int64))
+
+    def _threshold_bin(self, threshold: float) -> int:
+        # The last bin is closed ([0.95, 1.0]), so a threshold of 1.0 counts it rather than nothing
+        return min(int(np.ceil(round(threshold * self.bins, 9))), self.bins - 1)
+
+    def summary(self, threshold: float = 0.3, since=None, until=None, days: int = None) -> dict:
+        """Scans, mean probability and prevalence (share of scans >= threshold) for every label."""
+        with self._lock:
+            count, sums, hist = self._window(since, until, days)
+        first_bin = self._threshold_bin(threshold)
+        positives = hist[:, first_bin:].sum(axis=1)
+        return {
+            "scans": count,
+            "threshold": first_bin / self.bins,
+            "labels": {
+                disease: {
+                    "mean_probability": round(float(sums[i] / count), 4) if count else None,
+                    "positive": int(positives[i]),
+                    "prevalence": round(float(positives[i] / count), 4) if count else None,
+                }
+                for i, disease in enumerate(DISEASES)
+            },
+        }
+
+    def prevalence(self, label: str, threshold: float = 0.3, since=None, until=None, days: int = None) -> dict:
+        i = _label_index(label)
+        with self._lock:
+            count, _, hist = self._window(since, until, days)
+        first_bin = self._threshold_bin(threshold)
+        positive = int(hist[i, first_bin:].sum())
+        return {"label": DISEASES[i], "threshold": first_bin / self.bins, "scans": count,
+                "positive": positive, "prevalence": round(positive / count, 4) if count else None}
+
+    def histogram(self, label: str, since=None, until=None, days: int = None) -> dict:
+        i = _label_index(label)
+        with self._lock:
+            count, _, hist = self._window(since, until, days)
+        return {"label": DISEASES[i], "scans": count,
+                "bin_edges": [round(b / self.bins, 4) for b in range(self.bins + 1)],
+                "counts": hist[i].tolist()}
+
+    @staticmethod
+    def _rolling(days: np.ndarray, counts: np.ndarray, sums: np.ndarray, window: int) -> list:
+        """Per active day: that day's mean and the scan-weighted mean over the trailing `window` days."""
+        cum_count = np.concatenate([[0], np.cumsum(counts)])
+        cum_sum = np.concatenate([[0.0], np.cumsum(sums)])
+        starts = np.searchsorted(days, days - window + 1, side="left")
+        ends = np.arange(1, len(days) + 1)
+        rolling = (cum_sum[ends] - cum_sum[starts]) / (cum_count[ends] - cum_count[starts])
+        return [{"date": _day_text(d), "scans": int(c), "mean": round(float(s / c), 4), "rolling_mean": round(float(r), 4)}
+                for d, c, s, r in zip(days, counts, sums, rolling)]
+
+    def daily_trend(self, label: str, window: int = 7, since=None, until=None, days: int = None) -> dict:
+        """Population per-day mean of a label and its rolling mean, for days with scans."""
+        i = _label_index(label)
+        with self._lock:
+            if self._day0 is None:
+                return {"label": DISEASES[i], "window_days": window, "days": []}
+            lo, hi = self._range(since, until, days) or (0, self._days)
+            start = max(0, lo - window + 1)   # the first days' rolling means look back too
+            counts = self._day_count[start:hi].copy()
+            sums = self._day_sum[start:hi, i].copy()
+            day0 = self._day0 + start
+        active = np.nonzero(counts)[0]
+        series = self._rolling(active + day0, counts[active], sums[active], window)
+        first = lo - start
+        return {"label": DISEASES[i], "window_days": window,
+                "days": [point for day, point in zip(active, series) if day >= first]}
+
+    def user_trend(self, user_uuid: str, label: str, window: int = 7) -> dict:
+        """One user's per-day mean of a label and its rolling mean."""
+        i = _label_index(label)
+        with self._lock:
+            user = self._users.get(user_uuid)
+            if user is None:
+                return {"label": DISEASES[i], "window_days": window, "days": []}
+            rows = np.asarray(self._user_rows[user], dtype=np.int64)
+            days, counts, sums = self._ud_day[rows], self._ud_count[rows], self._ud_sum[rows, i]
+        order = np.argsort(days, kind="stable")
+        return {"label": DISEASES[i], "window_days": window,
+                "days": self._rolling(days[order], counts[order], sums[order], window)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"scans": self._total_count, "users": len(self._users), "user_days": self._ud_rows,
+                    "days": self._days, "first_day": _day_text(self._day0) if self._day0 is not None else None,
+                    "watermark": self.watermark,
+                    "memory_kb": round((self._day_count.nbytes + self._day_sum.nbytes + self._day_hist.nbytes
+                                        + self._ud_day.nbytes + self._ud_count.nbytes + self._ud_sum.nbytes) / 1024, 1)}
+
+    # --- columnar cache -------------------------------------------------------
+
+    def save(self, path: str = ANALYTICS_CACHE_PATH):
+        """Writes the aggregates to an .npz file (atomically)."""
+        with self._lock:
+            users = sorted(self._users, key=self._users.get)
+            ud_user = np.empty(self._ud_rows, dtype=np.int64)
+            for user, rows in enumerate(self._user_rows):
+                ud_user[rows] = user
+            arrays = {
+                "meta": np.array([CACHE_VERSION, self.bins, NUM_LABELS, self.watermark,
+                                  self._day0 if self._day0 is not None else -1, self._days], dtype=np.int64),
+                "labels": np.array(DISEASES),
+                "day_count": self._day_count[:self._days],
+                "day_sum": self._day_sum[:self._days],
+                "day_hist": self._day_hist[:self._days],
+                "users": np.array(users, dtype=str),
+                "ud_user": ud_user,
+                "ud_day": self._ud_day[:self._ud_rows],
+                "ud_count": self._ud_count[:self._ud_rows],
+                "ud_sum": self._ud_sum[:self._ud_rows],
+            }
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = path + ".tmp.npz"
+            np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = ANALYTICS_CACHE_PATH):
+        """Aggregates from an .npz cache, or None if it is missing or was built differently."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                version, bins, labels, watermark, day0, days = data["meta"].tolist()
+                if version != CACHE_VERSION or labels != NUM_LABELS or data["labels"].tolist() != DISEASES:
+                    return None
+                self = cls(bins=bins)
+                self.watermark = watermark
+                self._day0 = None if day0 < 0 else day0
+                self._days = days
+                self._day_count = data["day_count"].copy()
+                self._day_sum = data["day_sum"].copy()
+                self._day_hist = data["day_hist"].copy()
+                self._total_count = int(self._day_count.sum())
+                self._total_sum = self._day_sum.sum(axis=0)
+                self._total_hist = self._day_hist.sum(axis=0, dtype=np.int64)
+                self._users = {u: i for i, u in enumerate(data["users"].tolist())}
+                self._user_rows = [[] for _ in self._users]
+                ud_user, ud_day = data["ud_user"], data["ud_day"]
+                for row, (user, day) in enumerate(zip(ud_user.tolist(), ud_day.tolist())):
+                    self._user_rows[user].append(row)
+                    self._user_day_rows[(user, day)] = row
+                self._ud_day = ud_day.copy()
+                self._ud_count = data["ud_count"].copy()
+                self._ud_sum = data["ud_sum"].copy()
+                self._ud_rows = len(ud_day)
+                return self
+        except (OSError, KeyError, ValueError) as e:
+            if os.path.exists(path):
+                logger.warning("Ignoring analytics cache %s (%s)", path, e)
+            return None
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_population_analytics() -> PopulationAnalytics:
+    """
+    Process-wide aggregates: loaded from the .npz cache, caught up with the history
+    store, then kept current by its write listener. Saved again at exit.
+    """
+    global _analytics
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                from .historyStore import get_history_store
+
+                store = get_history_store()
+                analytics = PopulationAnalytics.load() or PopulationAnalytics()
+                store.add_listener(analytics.on_history_write)
+                added = analytics.sync(store)
+                if added:
+                    logger.info("Folded %d history rows into the population aggregates", added)
+                    analytics.save()
+                atexit.register(analytics.save)
+                _analytics = analytics
+    elif _analytics.stale:
+        from .historyStore import get_history_store
+        _analytics.sync(get_history_store())
+    return _analytics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Population analytics over the LungSight AI inference history.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summary", help="Prevalence and mean probability for every label.")
+    summary.add_argument("--threshold", type=float, default=0.3)
+    summary.add_argument("--days", type=int, default=0, help="Last N days (default: all time).")
+    trend = sub.add_parser("trend", help="Per-day and rolling mean of one label.")
+    trend.add_argument("label")
+    trend.add_argument("--user", help="One user's trend instead of the population's.")
+    trend.add_argument("--window", type=int, default=7)
+    sub.add_parser("rebuild", help="Rebuild the .npz cache from the whole history.")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        from .historyStore import get_history_store
+        analytics = PopulationAnalytics()
+        print(f"Folded {analytics.sync(get_history_store())} rows.")
+        analytics.save()
+        print(json.dumps(analytics.stats(), indent=2))
+        return
+
+    analytics = get_population_analytics()
+    if args.command == "summary":
+        result = analytics.summary(args.threshold, days=args.days or None)
+    elif args.user:
+        result = analytics.user_trend(args.user, args.label, args.window)
+    else:
+        result = analytics.daily_trend(args.label, args.window)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
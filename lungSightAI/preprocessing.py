@@ -0,0 +1,150 @@
+import os
+import cv2
+import struct
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_SIZE = (224, 224)
+
+# VGG16 "caffe" preprocessing: BGR channel order minus the ImageNet channel means.
+# cv2 already decodes to BGR, so this is exactly preprocess_input(RGB image).
+VGG_MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+# JPEGs whose short side is at least this many pixels times the reduction factor
+# are decoded at 1/2, 1/4 or 1/8 scale. 0 disables reduced decoding.
+REDUCED_DECODE_MIN_SIDE = int(os.environ.get("LUNGSIGHT_REDUCED_DECODE_MIN_SIDE", "448"))
+PREPROCESS_WORKERS = int(os.environ.get("LUNGSIGHT_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def image_dimensions(data: bytes):
+    """(width, height) read from a JPEG or PNG header without decoding, or None."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+def _decode_flag(data: bytes) -> int:
+    if REDUCED_DECODE_MIN_SIDE <= 0 or data[:2] != b"\xff\xd8":
+        return cv2.IMREAD_COLOR
+    dims = image_dimensions(data)
+    if dims is None:
+        return cv2.IMREAD_COLOR
+    short_side = min(dims)
+    for factor, flag in _REDUCED_FLAGS:
+        if short_side >= REDUCED_DECODE_MIN_SIDE * factor:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_image_bytes(data: bytes, full_resolution: bool = False):
+    """
+    Decodes to a BGR uint8 array, at reduced resolution for large JPEGs unless
+    `full_resolution` (crops need the detail a reduced decode drops). None if unreadable.
+    """
+    flag = cv2.IMREAD_COLOR if full_resolution else _decode_flag(data)
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+
+
+def preprocess_into(out: np.ndarray, img: np.ndarray) -> np.ndarray:
+    """Resizes a decoded BGR image and writes the VGG16 input into `out` (224, 224, 3) float32."""
+    resized = cv2.resize(img, IMAGE_SIZE)
+    np.subtract(resized, VGG_MEAN_BGR, out=out, casting="unsafe")
+    return out
+
+
+def preprocess_image_bytes(data: bytes, out: np.ndarray = None):
+    """
+    Returns the (224, 224, 3) float32 VGG16 input for an encoded image,
+    or None if it cannot be decoded. Writes into `out` when given.
+    """
+    img = decode_image_bytes(data)
+    if img is None:
+        return None
+    if out is None:
+        out = np.empty(IMAGE_SIZE[::-1] + (3,), dtype=np.float32)
+    return preprocess_into(out, img)
+
+
+def preprocess_image(image_path: str, out: np.ndarray = None):
+    """
+    Reads an image and returns the (224, 224, 3) float32 VGG16 input,
+    or None if the file cannot be decoded.
+    """
+    try:
+        with open(image_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return preprocess_image_bytes(data, out)
+
+
+class PreprocessPipeline:
+    """
+    Decode/preprocess stage that runs ahead of the model.
+
+    Images are decoded on a thread pool (OpenCV releases the GIL) straight into
+    one of two preallocated float32 batch buffers. While the caller runs the
+    model on one buffer, the next batch is being filled into the other, so a
+    batch must be consumed before the one after it is requested.
+    """
+
+    def __init__(self, batch_size: int = 16, workers: int = PREPROCESS_WORKERS):
+        self.batch_size = max(1, int(batch_size))
+        self.workers = max(1, int(workers))
+        self._buffers = [
+            np.empty((self.batch_size,) + IMAGE_SIZE[::-1] + (3,), dtype=np.float32)
+            for _ in range(2)
+        ]
+        self._lock = threading.Lock()
+
+    def _fill(self, pool, buffer, paths):
+        return [pool.submit(preprocess_image, path, buffer[slot]) for slot, path in enumerate(paths)]
+
+    def batches(self, paths):
+        """
+        Yields (paths, batch, ok) per chunk of `batch_size` paths, where `batch`
+        is a view of a reused buffer and `ok[i]` says whether paths[i] decoded.
+        Only rows with ok[i] set hold valid data.
+        """
+        paths = list(paths)
+        chunks = [paths[i:i + self.batch_size] for i in range(0, len(paths), self.batch_size)]
+        if not chunks:
+            return
+
+        with self._lock, ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cxr-preprocess") as pool:
+            pending = self._fill(pool, self._buffers[0], chunks[0])
+            for index, chunk in enumerate(chunks):
+                futures = pending
+                if index + 1 < len(chunks):
+                    pending = self._fill(pool, self._buffers[(index + 1) % 2], chunks[index + 1])
+
+                ok = []
+                for future in futures:
+                    try:
+                        ok.append(future.result() is not None)
+                    except Exception:
+                        ok.append(False)
+                yield chunk, self._buffers[index % 2][:len(chunk)], ok
@@ -0,0 +1,416 @@
+"""
+Chest X-ray PDF report renderer.
+
+The fixed page furniture (header, field labels, "Findings:" heading) is drawn
+once per document as a form XObject and stamped onto every page with doForm();
+only the variable fields are drawn per report. Findings, conclusion and advice
+flow onto continuation pages instead of running off the bottom of the page.
+
+    python -m lungSightAI.reportRenderer batch reports.jsonl --output reports.zip --workers 4
+    python -m lungSightAI.reportRenderer batch reports.jsonl --output reports/
+    python -m lungSightAI.reportRenderer benchmark --reports 200
+
+Batch input is JSONL, one object per report with the generate_cxr_pdf_report
+field names (patient_name, age_sex, ref_by, date, xray_no, exam_title,
+findings, conclusion, advice).
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import zipfile
+import argparse
+import textwrap
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+FIELDS = ("patient_name", "age_sex", "ref_by", "date", "xray_no", "exam_title", "findings", "conclusion", "advice")
+FIELD_DEFAULTS = {
+    "patient_name": "Unknown",
+    "xray_no": "Unknown",
+    "exam_title": "X-RAY CHEST PA VIEW",
+    "findings": "No findings recorded.",
+}
+
+HEADER_TEXT = "X-RAYS REPORTING FORMATE"
+FOOTER_TEXT = "THANKS FOR THE REFERAL,"
+WRAP_WIDTH = 85
+LINE_HEIGHT = 18
+SECTION_GAP = 10
+FOOTER_GAP = 40
+BOTTOM_MARGIN = 50
+FINDINGS_TOP = 535          # first findings line on page 1
+CONTINUED_TOP = 710         # first line on continuation pages
+
+# Content streams are a few KB of text; zlib + ASCII85 encoding them (reportlab's
+# pure-Python A85 encoder) costs more than it saves. Set to 1 for smaller files.
+REPORT_PAGE_COMPRESSION = int(os.environ.get("LUNGSIGHT_REPORT_COMPRESSION", "0"))
+# Bump when the layout changes, so deduplicated artifacts are re-rendered
+RENDERER_VERSION = 1
+# Where the async tool renders reports: "process" (default) or "thread". Rendering is
+# pure Python, so in a thread it still holds the GIL and stalls the event loop.
+REPORT_EXECUTOR = os.environ.get("LUNGSIGHT_REPORT_EXECUTOR", "process")
+REPORT_RENDER_WORKERS = int(os.environ.get("LUNGSIGHT_REPORT_RENDER_WORKERS", "2"))
+REPORT_WORKERS = int(os.environ.get("LUNGSIGHT_REPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_FIRST_PAGE_FORM = "cxr_first_page"
+_CONTINUED_FORM = "cxr_continued_page"
+
+# (x, y, label) of the patient-detail labels and where their values go
+_DETAIL_LABELS = (
+    (50, 700, "PATIENT NAME:"), (350, 700, "AGE / SEX:"),
+    (50, 675, "REF. BY DR     :"), (350, 675, "DATE:"),
+    (50, 650, "X-RAY NO        :"),
+)
+_DETAIL_VALUES = ((160, 700, "patient_name"), (430, 700, "age_sex"), (160, 675, "ref_by"),
+                  (430, 675, "date"), (160, 650, "xray_no"))
+
+
+def normalize_fields(fields: dict) -> dict:
+    """All report fields as strings, with the same defaults the tool has always used."""
+    return {name: str(fields.get(name) or FIELD_DEFAULTS.get(name, "")) for name in FIELDS}
+
+
+def report_filename(xray_no: str) -> str:
+    safe_xray_no = "".join([c for c in str(xray_no) if c.isalnum() or c in ('-', '_')])
+    return f"Report_{safe_xray_no}.pdf"
+
+
+def _draw_centered(c, width, y, text, font, size, underlined=False):
+    c.setFont(font, size)
+    text_width = c.stringWidth(text, font, size)
+    x = (width - text_width) / 2
+    c.drawString(x, y, text)
+    if underlined:
+        c.line(x, y - 2, x + text_width, y - 2)
+
+
+def _define_first_page_form(c, width):
+    c.beginForm(_FIRST_PAGE_FORM)
+    _draw_centered(c, width, 750, HEADER_TEXT, "Helvetica-Bold", 16, underlined=True)
+    text = c.beginText()
+    text.setFont("Helvetica-BoldOblique", 11)
+    for x, y, label in _DETAIL_LABELS:
+        text.setTextOrigin(x, y)
+        text.textOut(label)
+    text.setFont("Helvetica-Bold", 12)
+    text.setTextOrigin(50, 560)
+    text.textOut("Findings:")
+    c.drawText(text)
+    c.line(50, 558, 105, 558)
+    c.endForm()
+
+
+def _next_page(c, width, has_continued_form: bool) -> bool:
+    c.showPage()
+    if not has_continued_form:
+        c.beginForm(_CONTINUED_FORM)
+        _draw_centered(c, width, 750, HEADER_TEXT, "Helvetica-Bold", 16, underlined=True)
+        c.endForm()
+    c.doForm(_CONTINUED_FORM)
+    return True
+
+
+def _body_lines(fields: dict):
+    """(font, size, text, gap_after) for every wrapped line of the flowing sections."""
+    sections = (
+        ("Helvetica-Oblique", fields["findings"]),
+        ("Helvetica-Bold", f"Conclusion: {fields['conclusion']}"),
+        ("Helvetica-BoldOblique", f"Adv: {fields['advice']}"),
+    )
+    for index, (font, text) in enumerate(sections):
+        lines = textwrap.wrap(text, width=WRAP_WIDTH)
+        for i, line in enumerate(lines):
+            last = i == len(lines) - 1 and index < len(sections) - 1
+            yield font, 11, line, SECTION_GAP if last else 0
+
+
+def render_report(fields: dict) -> bytes:
+    """Renders one report and returns the PDF bytes."""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    fields = normalize_fields(fields)
+    width, height = letter
+    c = canvas.Canvas(None, pagesize=letter, pageCompression=REPORT_PAGE_COMPRESSION)
+    _define_first_page_form(c, width)
+    continued = False
+
+    c.doForm(_FIRST_PAGE_FORM)
+    _draw_centered(c, width, 600, fields["exam_title"], "Helvetica-BoldOblique", 14, underlined=True)
+
+    # One text object per page for all variable text, rather than a text object per drawString
+    text = c.beginText()
+    text.setFont("Helvetica", 11)
+    for x, y, name in _DETAIL_VALUES:
+        text.setTextOrigin(x, y)
+        text.textOut(fields[name])
+
+    y = FINDINGS_TOP
+    font = None
+    for line_font, size, line, gap_after in _body_lines(fields):
+        if y < BOTTOM_MARGIN:
+            c.drawText(text)
+            continued = _next_page(c, width, continued)
+            text, font, y = c.beginText(), None, CONTINUED_TOP
+        if line_font != font:
+            font = line_font
+            text.setFont(font, size)
+        text.setTextOrigin(50, y)
+        text.textOut(line)
+        y -= LINE_HEIGHT + gap_after
+
+    y -= FOOTER_GAP
+    if y < BOTTOM_MARGIN:
+        c.drawText(text)
+        _next_page(c, width, continued)
+        text, y = c.beginText(), CONTINUED_TOP
+    text.setFont("Helvetica-BoldOblique", 12)
+    text.setTextOrigin(50, y)
+    text.textOut(FOOTER_TEXT)
+    c.drawText(text)
+
+    c.showPage()
+    return c.getpdfdata()
+
+
+def report_input_hash(fields: dict) -> str:
+    """sha256 of the normalised fields and RENDERER_VERSION; equal hashes render identical PDFs."""
+    payload = json.dumps([RENDERER_VERSION, normalize_fields(fields)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+_render_pool = None
+_in_flight = {}                  # input hash -> asyncio.Future shared by identical concurrent requests
+_pool_lock = threading.Lock()
+
+
+def _render_executor():
+    global _render_pool
+    if _render_pool is None:
+        with _pool_lock:
+            if _render_pool is None:
+                workers = max(1, REPORT_RENDER_WORKERS)
+                if REPORT_EXECUTOR == "thread":
+                    _render_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-render")
+                else:
+                    # spawn, not fork: the server process may hold TensorFlow threads and locks
+                    import multiprocessing
+                    _render_pool = ProcessPoolExecutor(max_workers=workers,
+                                                       mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+
+def start_render_workers():
+    """Starts the report executor's workers now rather than on the first report (spawn takes ~1 s)."""
+    pool = _render_executor()
+    for _ in range(max(1, REPORT_RENDER_WORKERS)):
+        pool.submit(normalize_fields, {})
+
+
+async def render_report_async(fields: dict, input_hash: str = None) -> bytes:
+    """
+    render_report on the report executor, so the event loop keeps serving other
+    sessions while a PDF is drawn. Identical requests already in flight share one render.
+    """
+    input_hash = input_hash or report_input_hash(fields)
+    pending = _in_flight.get(input_hash)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    loop = asyncio.get_running_loop()
+    pending = loop.run_in_executor(_render_executor(), render_report, fields)
+    _in_flight[input_hash] = pending
+    try:
+        return await asyncio.shield(pending)
+    finally:
+        if _in_flight.get(input_hash) is pending:
+            del _in_flight[input_hash]
+
+
+def _render_named(fields: dict):
+    return report_filename(fields.get("xray_no") or "Unknown"), render_report(fields)
+
+
+def _unique_name(name: str, seen: dict) -> str:
+    count = seen.get(name, 0)
+    seen[name] = count + 1
+    if count == 0:
+        return name
+    stem, ext = os.path.splitext(name)
+    return f"{stem}_{count + 1}{ext}"
+
+
+def render_batch(reports, output: str, workers: int = REPORT_WORKERS, chunksize: int = 8) -> dict:
+    """
+    Renders many reports in a process pool and streams each finished PDF into
+    `output` (a .zip file, or a directory that is created if needed), in input
+    order. At most 2 * workers chunks are in flight, so memory stays bounded
+    however many reports are queued.
+    """
+    started = time.perf_counter()
+    to_zip = output.lower().endswith(".zip")
+    archive = zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) if to_zip else None
+    if not to_zip:
+        os.makedirs(output, exist_ok=True)
+
+    seen, count, pages, written = {}, 0, 0, 0
+
+    def write(name, pdf_bytes):
+        nonlocal count, pages, written
+        name = _unique_name(name, seen)
+        if archive is not None:
+            archive.writestr(name, pdf_bytes)
+        else:
+            with open(os.path.join(output, name), "wb") as f:
+                f.write(pdf_bytes)
+        count += 1
+        pages += pdf_bytes.count(b"/Type /Page\n")
+        written += len(pdf_bytes)
+
+    def chunks():
+        chunk = []
+        for fields in reports:
+            chunk.append(fields)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    try:
+        if workers <= 1:
+            for chunk in chunks():
+                for name, pdf_bytes in map(_render_named, chunk):
+                    write(name, pdf_bytes)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for chunk in chunks():
+                    pending.append(pool.submit(_render_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        for name, pdf_bytes in pending.popleft().result():
+                            write(name, pdf_bytes)
+                while pending:
+                    for name, pdf_bytes in pending.popleft().result():
+                        write(name, pdf_bytes)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "reports": count,
+        "pages": pages,
+        "bytes": written,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def _render_chunk(chunk: list) -> list:
+    return [_render_named(fields) for fields in chunk]
+
+
+def _legacy_render(fields: dict) -> bytes:
+    """The pre-template implementation (full redraw per report, one page), kept as the benchmark baseline."""
+    import io
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    fields = normalize_fields(fields)
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    _draw_centered(c, width, 750, HEADER_TEXT, "Helvetica-Bold", 16, underlined=True)
+    c.setFont("Helvetica-BoldOblique", 11)
+    for x, y, label in _DETAIL_LABELS:
+        c.drawString(x, y, label)
+    c.setFont("Helvetica", 11)
+    for x, y, name in _DETAIL_VALUES:
+        c.drawString(x, y, fields[name])
+    _draw_centered(c, width, 600, fields["exam_title"], "Helvetica-BoldOblique", 14, underlined=True)
+    y_cursor = 560
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y_cursor, "Findings:")
+    c.line(50, y_cursor - 2, 105, y_cursor - 2)
+    y_cursor -= 25
+    for font, text in (("Helvetica-Oblique", fields["findings"]),
+                       ("Helvetica-Bold", f"Conclusion: {fields['conclusion']}"),
+                       ("Helvetica-BoldOblique", f"Adv: {fields['advice']}")):
+        c.setFont(font, 11)
+        for line in textwrap.wrap(text, width=WRAP_WIDTH):
+            c.drawString(50, y_cursor, line)
+            y_cursor -= 18
+        y_cursor -= 10
+    y_cursor -= 30
+    c.setFont("Helvetica-BoldOblique", 12)
+    c.drawString(50, y_cursor, FOOTER_TEXT)
+    c.showPage()
+    c.save()
+    buffer.seek(0)
+    pdf_bytes = buffer.getvalue()
+    buffer.close()
+    return pdf_bytes
+
+
+SAMPLE_REPORT = {
+    "patient_name": "Jane Doe", "age_sex": "54 / F", "ref_by": "Dr. Smith", "date": "2025-01-01",
+    "xray_no": "CXR-0001", "exam_title": "X-RAY CHEST PA VIEW",
+    "findings": "The cardiac silhouette is enlarged. Patchy opacities are seen in the right lower zone. "
+                "Costophrenic angles are clear. Visualized bones appear normal.",
+    "conclusion": "Cardiomegaly with right lower zone consolidation.",
+    "advice": "Clinical correlation suggested.",
+}
+
+
+def benchmark(reports: int = 200, workers: int = REPORT_WORKERS) -> dict:
+    """Single-process pages/sec of the legacy and templated renderers, plus batch mode throughput."""
+    import tempfile
+
+    samples = [dict(SAMPLE_REPORT, xray_no=f"CXR-{i:04d}") for i in range(reports)]
+    result = {"reports": reports}
+    for name, fn in (("legacy", _legacy_render), ("templated", render_report)):
+        fn(samples[0])  # font/module warm-up
+        started = time.perf_counter()
+        for fields in samples:
+            fn(fields)
+        elapsed = time.perf_counter() - started
+        result[f"{name}_pages_per_sec"] = round(reports / elapsed, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        batch = render_batch(samples, os.path.join(tmp, "reports.zip"), workers=workers)
+    result[f"batch_{workers}_workers_pages_per_sec"] = batch["pages_per_sec"]
+    return result
+
+
+def _read_jsonl(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render CXR PDF reports in bulk, or benchmark the renderer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    batch = sub.add_parser("batch", help="Render every report in a JSONL file.")
+    batch.add_argument("reports", help="JSONL file, one report per line.")
+    batch.add_argument("--output", required=True, help="Output .zip file or directory.")
+    batch.add_argument("--workers", type=int, default=REPORT_WORKERS)
+    bench = sub.add_parser("benchmark", help="Pages/sec of the legacy vs the templated renderer.")
+    bench.add_argument("--reports", type=int, default=200)
+    bench.add_argument("--workers", type=int, default=REPORT_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        print(json.dumps(render_batch(_read_jsonl(args.reports), args.output, args.workers), indent=2))
+    else:
+        print(json.dumps(benchmark(args.reports, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
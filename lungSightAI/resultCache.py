@@ -0,0 +1,150 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("LUNGSIGHT_CACHE_SIZE", "1024"))
+DEFAULT_DB_PATH = os.environ.get("LUNGSIGHT_CACHE_DB", "")
+DEFAULT_DB_MAX_MB = float(os.environ.get("LUNGSIGHT_CACHE_DB_MAX_MB", "64"))
+
+
+def image_digest(data: bytes) -> str:
+    """Content hash of the raw (still encoded) image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class InferenceCache:
+    """
+    Probability cache keyed on (model weights hash, image bytes hash).
+
+    Tier 1 is an in-process LRU; tier 2 is an optional SQLite file evicted by
+    least-recent access once it grows past `db_max_bytes`. Only raw
+    probabilities are stored, so callers re-apply their own threshold.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, db_path: str = DEFAULT_DB_PATH,
+                 db_max_bytes: int = int(DEFAULT_DB_MAX_MB * 1024 * 1024)):
+        self.max_entries = max(0, int(max_entries))
+        self.db_max_bytes = int(db_max_bytes)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._db = None
+        self._db_bytes = 0
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS inference_cache (
+                key TEXT PRIMARY KEY,
+                probs BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_cache_access ON inference_cache (last_access)")
+        self._db.commit()
+        self._db_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM inference_cache").fetchone()[0]
+
+    @staticmethod
+    def _key(model_hash: str, image_hash: str) -> str:
+        return f"{model_hash}:{image_hash}"
+
+    def get(self, model_hash: str, image_hash: str):
+        """Returns the cached float32 probability vector, or None."""
+        key = self._key(model_hash, image_hash)
+        with self._lock:
+            probs = self._memory.get(key)
+            if probs is not None:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return probs
+
+            if self._db is not None:
+                row = self._db.execute("SELECT probs FROM inference_cache WHERE key=?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE inference_cache SET last_access=? WHERE key=?", (time.time(), key))
+                    self._db.commit()
+                    probs = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, probs)
+                    self._hits += 1
+                    self._disk_hits += 1
+                    return probs
+
+            self._misses += 1
+            return None
+
+    def put(self, model_hash: str, image_hash: str, probs):
+        key = self._key(model_hash, image_hash)
+        probs = np.asarray(probs, dtype=np.float32).copy()
+        probs.setflags(write=False)
+        with self._lock:
+            self._remember(key, probs)
+            if self._db is not None:
+                blob = probs.tobytes()
+                size = len(blob) + len(key)
+                cur = self._db.execute("SELECT size FROM inference_cache WHERE key=?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO inference_cache (key, probs, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, blob, size, time.time()),
+                )
+                self._db_bytes += size - (cur[0] if cur else 0)
+                self._evict_db()
+                self._db.commit()
+
+    def _remember(self, key, probs):
+        if self.max_entries == 0:
+            return
+        self._memory[key] = probs
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _evict_db(self):
+        while self._db_bytes > self.db_max_bytes:
+            # Drop the least recently used tenth (at least one row) per pass
+            rows = self._db.execute(
+                "SELECT key, size FROM inference_cache ORDER BY last_access LIMIT "
+                "MAX(1, (SELECT COUNT(*) FROM inference_cache) / 10)"
+            ).fetchall()
+            if not rows:
+                self._db_bytes = 0
+                return
+            self._db.executemany("DELETE FROM inference_cache WHERE key=?", [(k,) for k, _ in rows])
+            self._db_bytes -= sum(size for _, size in rows)
+            self._evictions += len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM inference_cache")
+                self._db.commit()
+                self._db_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._db_bytes if self._db is not None else None,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+INFERENCE_CACHE = InferenceCache()
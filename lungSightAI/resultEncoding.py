@@ -0,0 +1,83 @@
+"""
+Compact, versioned encoding of one scan's results for tool outputs and session state.
+
+Version 1 (what the agents see):
+
+    {"v": 1, "t": 0.3, "p": [0.012, 0.81, ...], "pos": {"Cardiomegaly": 0.81}}
+
+`p` holds the probabilities in fixed DISEASES order, rounded to PROB_DECIMALS;
+`pos` expands only the labels at or above the threshold `t`. The threshold is
+applied to the unrounded model outputs, so rounding for the payload never
+changes a label (0.2996 stays negative at t=0.3 although `p` shows 0.3); `pos`,
+not `p`, is what decides a finding. With a per-label
+threshold profile, `t` is a list in DISEASES order and `profile` names it:
+
+    {"v": 1, "t": [0.12, 0.25, ...], "profile": "sensitivity", "p": [...], "pos": {...}}
+
+The old verbose form
+(13 {"probability", "label"} objects) is still accepted everywhere a result is
+read back, and decode_results() reproduces it when a caller needs it.
+"""
+from .labels import DISEASES
+
+ENCODING_VERSION = 1
+PROB_DECIMALS = 3
+
+
+def encode_results(probabilities, threshold, profile: str = None) -> dict:
+    """Encodes one row of model outputs (DISEASES order); `threshold` is a scalar or one per label."""
+    import numpy as np
+    from .thresholdProfiles import apply_thresholds, thresholds_for_output
+
+    raw = np.asarray(probabilities, dtype=np.float64)
+    probs = np.round(raw, PROB_DECIMALS).tolist()
+    positive = apply_thresholds(raw, threshold)
+    encoded = {"v": ENCODING_VERSION, "t": thresholds_for_output(threshold)}
+    if profile:
+        encoded["profile"] = profile
+    encoded["p"] = probs
+    encoded["pos"] = {DISEASES[i]: probs[i] for i in np.flatnonzero(positive)}
+    return encoded
+
+
+def is_encoded(results: dict) -> bool:
+    return isinstance(results, dict) and "v" in results and "p" in results
+
+
+def result_probabilities(results: dict) -> list:
+    """Probabilities in DISEASES order from a compact or a verbose result (missing labels are 0.0)."""
+    if is_encoded(results):
+        if results["v"] != ENCODING_VERSION:
+            raise ValueError(f"Unsupported result encoding version: {results['v']}")
+        if len(results["p"]) != len(DISEASES):
+            raise ValueError(f"Expected {len(DISEASES)} probabilities, got {len(results['p'])}.")
+        return [float(p) for p in results["p"]]
+    return [float(results[d]["probability"]) if d in results else 0.0 for d in DISEASES]
+
+
+def decode_results(results: dict, threshold: float = None) -> dict:
+    """
+    Expands to the verbose {disease: {"probability", "label"}} form. A compact
+    result keeps the labels of its `pos` (decided on the unrounded outputs);
+    passing `threshold` re-labels from the rounded `p` instead.
+    """
+    from .thresholdProfiles import apply_thresholds
+
+    probs = result_probabilities(results)
+    if threshold is None and is_encoded(results):
+        positive = [d in results["pos"] for d in DISEASES]
+    else:
+        positive = apply_thresholds(probs, 0.3 if threshold is None else threshold).tolist()
+    return {
+        disease: {"probability": prob, "label": "Y" if flag else "N"}
+        for disease, prob, flag in zip(DISEASES, probs, positive)
+    }
+
+
+def summary_text(analyzed_file: str, results: dict) -> str:
+    """One-line form for session state, e.g. 'img8.jpg v1 t=0.3 Abnormal: Cardiomegaly 0.81'."""
+    positives = results["pos"]
+    verdict = "Abnormal" if positives else "Normal"
+    findings = ", ".join(f"{d} {p:.2f}" for d, p in positives.items()) or "no label above threshold"
+    threshold = results.get("profile") or results["t"]
+    return f"{analyzed_file} v{results['v']} t={threshold} {verdict}: {findings}"
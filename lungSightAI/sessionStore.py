@@ -0,0 +1,273 @@
+"""
+Bounded, persistent session service for the Runner built in agent.py.
+
+TieredSessionService keeps recently used sessions in an LRU memory tier (with a
+TTL and a memory budget) in front of ADK's DatabaseSessionService (SQLAlchemy;
+SQLite via aiosqlite by default). Every event is written through to the
+database, so evicting a session from memory, or losing the instance on
+scale-in, loses nothing. At the start of each new turn, events older than the
+last SESSION_KEEP_TURNS turns are dropped from memory and from the database,
+so a session's history stops growing. Session state is kept in full.
+
+Selected with LUNGSIGHT_SESSION_BACKEND=tiered. build_session_service() serves
+both the Runner in agent.py and `adk web`, which reaches it through the
+"lungsight://" session URI registered in the repository's services.py (the
+Dockerfile passes --session_service_uri=lungsight://). With metrics enabled the
+memory tier's hits, misses, evictions and byte budget are exported as
+lungsight_session_* metrics.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Optional
+
+from google.adk.sessions import DatabaseSessionService
+from google.adk.sessions.base_session_service import BaseSessionService, GetSessionConfig, ListSessionsResponse
+
+from .telemetry import register_collector
+
+logger = logging.getLogger(__name__)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_DB_URL = os.environ.get(
+    "LUNGSIGHT_SESSION_DB_URL",
+    "sqlite+aiosqlite:///" + os.path.join(CURRENT_DIR, "Data", "sessions.db"),
+)
+SESSION_CACHE_SIZE = int(os.environ.get("LUNGSIGHT_SESSION_CACHE_SIZE", "256"))
+SESSION_CACHE_MB = float(os.environ.get("LUNGSIGHT_SESSION_CACHE_MB", "64"))
+SESSION_TTL_SECONDS = float(os.environ.get("LUNGSIGHT_SESSION_TTL_SECONDS", "1800"))
+# Turns (invocations) of event history kept per session; 0 keeps everything
+SESSION_KEEP_TURNS = int(os.environ.get("LUNGSIGHT_SESSION_KEEP_TURNS", "20"))
+# memory (default): unbounded, lost on restart. tiered: bounded LRU/TTL memory tier
+# over a database. database: every read and write hits the database.
+SESSION_BACKEND = os.environ.get("LUNGSIGHT_SESSION_BACKEND", "memory")
+
+# Two plain statements rather than DELETE ... NOT IN (SELECT ... LIMIT): MySQL
+# rejects LIMIT in an IN subquery and a subquery on the table being deleted from.
+_SELECT_TURNS = """
+    SELECT invocation_id FROM events
+    WHERE app_name = :app_name AND user_id = :user_id AND session_id = :session_id
+    GROUP BY invocation_id ORDER BY MAX(timestamp) DESC
+"""
+_DELETE_TURNS = """
+    DELETE FROM events
+    WHERE app_name = :app_name AND user_id = :user_id AND session_id = :session_id
+      AND invocation_id IN :invocation_ids
+"""
+
+
+def _event_bytes(event) -> int:
+    return len(event.model_dump_json(exclude_none=True))
+
+
+def _copy(session, config: GetSessionConfig = None):
+    """A caller-owned copy: the hot entry itself is never handed out."""
+    events = session.events
+    if config is not None:
+        if config.after_timestamp:
+            events = [e for e in events if e.timestamp >= config.after_timestamp]
+        if config.num_recent_events is not None:
+            events = events[-config.num_recent_events:] if config.num_recent_events else []
+    return session.model_copy(update={"events": list(events), "state": dict(session.state)})
+
+
+class TieredSessionService(BaseSessionService):
+    """LRU + TTL memory tier in front of a DatabaseSessionService, with per-session turn compaction."""
+
+    def __init__(self, db_url: str = SESSION_DB_URL, max_sessions: int = SESSION_CACHE_SIZE,
+                 max_mb: float = SESSION_CACHE_MB, ttl_seconds: float = SESSION_TTL_SECONDS,
+                 keep_turns: int = SESSION_KEEP_TURNS):
+        if db_url.startswith("sqlite"):
+            path = db_url.split(":///", 1)[-1]
+            if path and path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.store = DatabaseSessionService(db_url=db_url)
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl_seconds = ttl_seconds
+        self.keep_turns = keep_turns
+        self._hot = OrderedDict()   # (app, user, id) -> [session, bytes, last_access]
+        self._hot_bytes = 0
+        self._metrics = {"hits": 0, "misses": 0, "evicted_ttl": 0, "evicted_lru": 0,
+                         "evicted_memory": 0, "compacted_events": 0, "compacted_turns": 0}
+        register_collector(self.metric_samples)
+
+    # --- hot tier -----------------------------------------------------------
+
+    def _put(self, session, size: int = None):
+        key = (session.app_name, session.user_id, session.id)
+        self._drop(key)
+        if size is None:
+            size = sum(_event_bytes(e) for e in session.events)
+        self._hot[key] = [session, size, time.monotonic()]
+        self._hot_bytes += size
+        self._evict()
+
+    def _drop(self, key) -> bool:
+        entry = self._hot.pop(key, None)
+        if entry is not None:
+            self._hot_bytes -= entry[1]
+        return entry is not None
+
+    def _evict(self):
+        now = time.monotonic()
+        # Least recently used first, so expired entries are all at the front
+        while self._hot and now - next(iter(self._hot.values()))[2] > self.ttl_seconds:
+            self._drop(next(iter(self._hot)))
+            self._metrics["evicted_ttl"] += 1
+        while len(self._hot) > self.max_sessions:
+            self._drop(next(iter(self._hot)))
+            self._metrics["evicted_lru"] += 1
+        while len(self._hot) > 1 and self._hot_bytes > self.max_bytes:
+            key = next(iter(self._hot))
+            logger.debug("Session %s spilled from memory (%d bytes)", key[2], self._hot[key][1])
+            self._drop(key)
+            self._metrics["evicted_memory"] += 1
+
+    def _touch(self, key):
+        entry = self._hot.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] > self.ttl_seconds:
+            self._drop(key)
+            self._metrics["evicted_ttl"] += 1
+            return None
+        entry[2] = time.monotonic()
+        self._hot.move_to_end(key)
+        return entry
+
+    # --- compaction ---------------------------------------------------------
+
+    async def _compact(self, session):
+        """Keeps the events of the last keep_turns invocations, in memory and in the database."""
+        turns = list(dict.fromkeys(e.invocation_id for e in session.events))
+        if len(turns) <= self.keep_turns:
+            return
+        keep = set(turns[-self.keep_turns:])
+        kept = [e for e in session.events if e.invocation_id in keep]
+        dropped = len(session.events) - len(kept)
+        session.events[:] = kept
+
+        from sqlalchemy import bindparam, text
+
+        key = {"app_name": session.app_name, "user_id": session.user_id, "session_id": session.id}
+        async with self.store.db_engine.begin() as conn:
+            # Newest first; the database may hold turns this copy of the session does not
+            stored = [row[0] for row in await conn.execute(text(_SELECT_TURNS), key)]
+            old = stored[self.keep_turns:]
+            if old:
+                delete = text(_DELETE_TURNS).bindparams(bindparam("invocation_ids", expanding=True))
+                await conn.execute(delete, {**key, "invocation_ids": old})
+        self._metrics["compacted_events"] += dropped
+        self._metrics["compacted_turns"] += len(turns) - self.keep_turns
+
+    # --- BaseSessionService -------------------------------------------------
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None):
+        session = await self.store.create_session(app_name=app_name, user_id=user_id, state=state,
+                                                  session_id=session_id)
+        self._put(_copy(session))
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None):
+        entry = self._touch((app_name, user_id, session_id))
+        if entry is not None:
+            self._metrics["hits"] += 1
+            return _copy(entry[0], config)
+
+        self._metrics["misses"] += 1
+        session = await self.store.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        if session is None:
+            return None
+        self._put(_copy(session))
+        return _copy(session, config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        return await self.store.list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._drop((app_name, user_id, session_id))
+        await self.store.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def get_user_state(self, *, app_name: str, user_id: str) -> dict[str, Any]:
+        return await self.store.get_user_state(app_name=app_name, user_id=user_id)
+
+    async def append_event(self, session, event):
+        key = (session.app_name, session.user_id, session.id)
+        new_turn = (not event.partial and self.keep_turns > 0 and event.author == "user"
+                    and (not session.events or session.events[-1].invocation_id != event.invocation_id))
+        try:
+            event = await self.store.append_event(session, event)
+        except Exception:
+            # Most likely stale (another instance wrote to this session): reload on the next get
+            self._drop(key)
+            raise
+        if event.partial:
+            return event
+
+        size = None
+        if new_turn:
+            await self._compact(session)
+        elif key in self._hot:
+            size = self._hot[key][1] + _event_bytes(event)
+        # The caller's session is now the newest revision; cache a copy of it
+        self._put(_copy(session), size)
+        return event
+
+    async def close(self):
+        self._hot.clear()
+        self._hot_bytes = 0
+        await self.store.close()
+
+    def stats(self) -> dict:
+        sizes = [entry[1] for entry in self._hot.values()]
+        return {
+            **self._metrics,
+            "hot_sessions": len(sizes),
+            "hot_bytes": self._hot_bytes,
+            "max_session_bytes": max(sizes, default=0),
+            "avg_session_bytes": round(sum(sizes) / len(sizes), 1) if sizes else 0.0,
+            "session_bytes": {key[2]: entry[1] for key, entry in self._hot.items()},
+        }
+
+    def metric_samples(self) -> list:
+        """The memory tier's counters and sizes as telemetry samples (see register_collector)."""
+        m = self._metrics
+        return [
+            ("lungsight_session_cache_requests_total", "counter", (("result", "hit"),), m["hits"]),
+            ("lungsight_session_cache_requests_total", "counter", (("result", "miss"),), m["misses"]),
+            ("lungsight_session_cache_evictions_total", "counter", (("cause", "ttl"),), m["evicted_ttl"]),
+            ("lungsight_session_cache_evictions_total", "counter", (("cause", "lru"),), m["evicted_lru"]),
+            ("lungsight_session_cache_evictions_total", "counter", (("cause", "memory"),), m["evicted_memory"]),
+            ("lungsight_session_compacted_events_total", "counter", (), m["compacted_events"]),
+            ("lungsight_session_cache_sessions", "gauge", (), len(self._hot)),
+            ("lungsight_session_cache_bytes", "gauge", (), self._hot_bytes),
+            ("lungsight_session_cache_budget_bytes", "gauge", (), self.max_bytes),
+        ]
+
+
+def build_session_service(backend: str = SESSION_BACKEND) -> BaseSessionService:
+    """The session service for LUNGSIGHT_SESSION_BACKEND: memory, tiered or database."""
+    if backend == "tiered":
+        logger.info("Using the tiered (memory + database) session service")
+        return TieredSessionService()
+    if backend == "database":
+        logger.info("Using the database session service")
+        return DatabaseSessionService(db_url=SESSION_DB_URL)
+    if backend != "memory":
+        raise ValueError(f"Unknown session backend '{backend}'. Use memory, tiered or database.")
+    from google.adk.sessions import InMemorySessionService
+    logger.info("Using the in-memory session service")
+    return InMemorySessionService()
+
+
+def session_service_factory(uri: str, **kwargs) -> BaseSessionService:
+    """
+    `adk web` factory for "lungsight://" URIs (registered in services.py).
+    "lungsight://tiered" picks a backend; a bare "lungsight://" uses LUNGSIGHT_SESSION_BACKEND.
+    """
+    from urllib.parse import urlparse
+    return build_session_service(urlparse(uri).netloc or SESSION_BACKEND)
@@ -0,0 +1,370 @@
+"""
+Latency, error and payload-size metrics for tools and agents, exported in the
+Prometheus text format.
+
+Enabled with LUNGSIGHT_METRICS=1. When disabled (the default) @instrumented
+returns the tool function itself and span() / record_size() return after one
+flag check, so the hot path pays nothing.
+
+    @instrumented
+    def predict_from_image_tool(...): ...        # latency, calls by status, result size
+
+    with span("predict.preprocess"): ...          # one stage of a tool
+    record_size("predict_from_image_tool", "image", len(image_bytes))
+
+With metrics enabled, agent.py starts a scrape endpoint on LUNGSIGHT_METRICS_PORT
+(default 9464): `curl localhost:9464/metrics`. render_prometheus() returns the same
+text for anything else that wants to serve or log it.
+"""
+import os
+import json
+import time
+import bisect
+import weakref
+import inspect
+import logging
+import functools
+import threading
+import contextlib
+
+METRICS_ENABLED = os.environ.get("LUNGSIGHT_METRICS", "0") == "1"
+METRICS_PORT = int(os.environ.get("LUNGSIGHT_METRICS_PORT", "9464"))
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    """Fixed-bucket histogram: per-bucket counts plus sum and count."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _number(value) -> str:
+    """Whole numbers without an exponent (byte counts stay exact), others as repr."""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    """
+    Histograms and counters keyed by (metric name, label tuple), plus collectors:
+    callables sampled at render time for values another component already keeps.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}   # (name, labels) -> Histogram
+        self._counters = {}     # (name, labels) -> float
+        self._collectors = []   # weak references to callables returning [(name, type, labels, value)]
+        self._help = {}
+
+    def observe(self, name: str, labels: tuple, value: float, bounds: tuple = LATENCY_BUCKETS):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram(bounds)
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: tuple, value: float = 1.0):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0.0) + value
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def add_collector(self, collect):
+        """
+        Samples collect() -> [(name, "counter" | "gauge", labels, value)] on every
+        render. Held weakly, so a collector goes away with the object that owns it.
+        """
+        ref = weakref.WeakMethod(collect) if inspect.ismethod(collect) else weakref.ref(collect)
+        with self._lock:
+            self._collectors.append(ref)
+
+    def _collect(self) -> list:
+        with self._lock:
+            self._collectors = [ref for ref in self._collectors if ref() is not None]
+            collectors = [ref() for ref in self._collectors]
+        samples = []
+        for collect in collectors:
+            if collect is None:
+                continue
+            try:
+                samples.extend(collect())
+            except Exception:
+                pass   # a failing collector must not break the scrape
+        return samples
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        """{"histograms": {...}, "counters": {...}} with label tuples flattened to strings."""
+        def key(name, labels):
+            return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+        with self._lock:
+            return {
+                "histograms": {key(n, l): {"count": h.count, "sum": round(h.sum, 6)}
+                               for (n, l), h in self._histograms.items()},
+                "counters": {key(n, l): v for (n, l), v in self._counters.items()},
+            }
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        def labels_text(labels, extra=()):
+            pairs = tuple(labels) + tuple(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        collected = sorted(self._collect(), key=lambda sample: sample[:3])
+
+        lines, declared = [], set()
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{labels_text(labels, (('le', repr(float(bound))),))} {cumulative}")
+            lines.append(f"{name}_bucket{labels_text(labels, (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{name}_sum{labels_text(labels)} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{labels_text(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{labels_text(labels)} {_number(value)}")
+        for name, kind, labels, value in collected:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{labels_text(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+METRICS.describe("lungsight_tool_latency_seconds", "Tool call latency.")
+METRICS.describe("lungsight_tool_calls_total", "Tool calls by outcome.")
+METRICS.describe("lungsight_stage_latency_seconds", "Latency of one stage inside a tool.")
+METRICS.describe("lungsight_payload_bytes", "Sizes of images, PDFs and tool results.")
+METRICS.describe("lungsight_agent_latency_seconds", "Agent run latency, sub-agents included.")
+METRICS.describe("lungsight_agent_tokens_total", "Gemini tokens by agent and kind.")
+METRICS.describe("lungsight_busy_rejections_total", "Tool calls turned away because a workload was full.")
+METRICS.describe("lungsight_reports_deduplicated_total", "PDF report calls answered with the artifact already saved.")
+METRICS.describe("lungsight_record_log_failures_total", "Saved scans that could not be appended to the binary record log.")
+METRICS.describe("lungsight_history_failures_total", "Inference history flushes and write listeners that failed.")
+METRICS.describe("lungsight_model_warmup_failures_total", "Background model loads that failed.")
+METRICS.describe("lungsight_session_cache_requests_total", "Session memory tier lookups by result (hit / miss).")
+METRICS.describe("lungsight_session_cache_evictions_total", "Sessions dropped from the memory tier by cause.")
+METRICS.describe("lungsight_session_compacted_events_total", "Events removed by per-session turn compaction.")
+METRICS.describe("lungsight_session_cache_sessions", "Sessions held in the memory tier.")
+METRICS.describe("lungsight_session_cache_bytes", "Event bytes held in the memory tier.")
+METRICS.describe("lungsight_session_cache_budget_bytes", "Memory tier byte budget (LUNGSIGHT_SESSION_CACHE_MB).")
+
+
+def _outcome(result) -> str:
+    """Tools report failures as {"status": "error"} (or an "Error ..." string), not exceptions."""
+    if isinstance(result, dict):
+        status = result.get("status")
+        return status if status in ("error", "busy") else "ok"
+    if isinstance(result, str) and result.startswith("Error"):
+        return "error"
+    return "ok"
+
+
+def _result_bytes(result) -> int:
+    try:
+        return len(json.dumps(result, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _finish(name: str, started: float, result):
+    labels = (("tool", name),)
+    METRICS.observe("lungsight_tool_latency_seconds", labels, time.perf_counter() - started)
+    METRICS.inc("lungsight_tool_calls_total", labels + (("status", _outcome(result)),))
+    METRICS.observe("lungsight_payload_bytes", labels + (("kind", "result"),), _result_bytes(result), SIZE_BUCKETS)
+
+
+def instrumented(func=None, *, name: str = None):
+    """
+    Records latency, outcome and result size of every call to a sync or async tool.
+    functools.wraps keeps the name, docstring and signature ADK builds the tool
+    declaration from. A no-op (returns `func` itself) when metrics are disabled.
+    """
+    if func is None:
+        return functools.partial(instrumented, name=name)
+    if not METRICS_ENABLED:
+        return func
+
+    tool = name or func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException:
+                METRICS.observe("lungsight_tool_latency_seconds", (("tool", tool),), time.perf_counter() - started)
+                METRICS.inc("lungsight_tool_calls_total", (("tool", tool), ("status", "exception")))
+                raise
+            _finish(tool, started, result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            METRICS.observe("lungsight_tool_latency_seconds", (("tool", tool),), time.perf_counter() - started)
+            METRICS.inc("lungsight_tool_calls_total", (("tool", tool), ("status", "exception")))
+            raise
+        _finish(tool, started, result)
+        return result
+    return wrapper
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        METRICS.observe("lungsight_stage_latency_seconds", (("stage", self.stage),), time.perf_counter() - self.started)
+        return False
+
+
+def span(stage: str):
+    """Context manager timing one stage of a tool, e.g. span("predict.inference")."""
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return _Span(stage)
+
+
+def record_stage(stage: str, seconds: float):
+    """Records a stage time measured by the caller (span() does this for a with-block)."""
+    if not METRICS_ENABLED:
+        return
+    METRICS.observe("lungsight_stage_latency_seconds", (("stage", stage),), seconds)
+
+
+def record_size(tool: str, kind: str, nbytes: int):
+    """Records a payload size (image bytes, PDF bytes, ...) for a tool."""
+    if not METRICS_ENABLED:
+        return
+    METRICS.observe("lungsight_payload_bytes", (("tool", tool), ("kind", kind)), nbytes, SIZE_BUCKETS)
+
+
+def record_tokens(agent: str, usage: dict):
+    """Adds one model call's token usage (see tokenAccounting.event_usage) to the agent's counters."""
+    if not METRICS_ENABLED:
+        return
+    for kind in ("prompt_tokens", "output_tokens"):
+        METRICS.inc("lungsight_agent_tokens_total", (("agent", agent), ("kind", kind[:-7])), usage[kind])
+
+
+def record_event(name: str, **labels):
+    """Counts one occurrence of `name`, e.g. record_event("lungsight_busy_rejections_total", workload="model")."""
+    if not METRICS_ENABLED:
+        return
+    METRICS.inc(name, tuple(labels.items()))
+
+
+# --- agents -----------------------------------------------------------------
+
+_agent_starts = {}
+
+
+def _agent_started(callback_context):
+    _agent_starts[(callback_context.invocation_id, callback_context.agent_name)] = time.perf_counter()
+    return None
+
+
+def _agent_finished(callback_context):
+    started = _agent_starts.pop((callback_context.invocation_id, callback_context.agent_name), None)
+    if started is not None:
+        METRICS.observe("lungsight_agent_latency_seconds", (("agent", callback_context.agent_name),),
+                        time.perf_counter() - started)
+    return None
+
+
+# Spread into each LlmAgent(...); empty when disabled, so no callbacks are registered
+AGENT_TIMING = {"before_agent_callback": _agent_started, "after_agent_callback": _agent_finished} if METRICS_ENABLED else {}
+
+
+# --- export -----------------------------------------------------------------
+
+def render_prometheus() -> str:
+    return METRICS.render_prometheus()
+
+
+def register_collector(collect):
+    """Exports values a component already tracks (see MetricsRegistry.add_collector); sampled only on scrape."""
+    METRICS.add_collector(collect)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """Serves GET /metrics from a daemon thread. Returns the server (started once per process)."""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            threading.Thread(target=_server.serve_forever, name="lungsight-metrics", daemon=True).start()
+            logger.info("Metrics endpoint on http://%s:%d/metrics", host, port)
+    return _server
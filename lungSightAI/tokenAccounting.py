@@ -0,0 +1,149 @@
+"""
+Per-turn token accounting from the usage metadata Gemini already returns.
+
+Live: record_token_usage is registered as every agent's after_model_callback. It
+keeps running per-agent totals in state["token_usage"]; AgentTool forwards a
+sub-agent's state changes to the parent session, so sub-agent calls (which run in
+their own child session) are counted too.
+
+Offline, from exported session logs:
+
+    python -m lungSightAI.tokenAccounting "Session Logs/*.json"
+    python -m lungSightAI.tokenAccounting "Session Logs/*.json" --json usage.json
+"""
+import sys
+import glob
+import json
+import logging
+import argparse
+
+from .telemetry import record_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tool calls that mark a turn as a scan, for the prompt-tokens-per-scan figure
+SCAN_TOOLS = ("analyze_scan_tool", "predict_from_image_tool", "cxr_agent")
+
+_FIELDS = (
+    ("prompt_tokens", "prompt_token_count", "promptTokenCount"),
+    ("output_tokens", "candidates_token_count", "candidatesTokenCount"),
+    ("total_tokens", "total_token_count", "totalTokenCount"),
+)
+
+
+def _get(obj, snake: str, camel: str):
+    """Reads a field from an ADK/genai object or from its camelCase JSON export."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(camel, obj.get(snake))
+    return getattr(obj, snake, None)
+
+
+def event_usage(event) -> dict:
+    """{prompt_tokens, output_tokens, total_tokens} of one model response, or None."""
+    usage = _get(event, "usage_metadata", "usageMetadata")
+    if usage is None:
+        return None
+    return {key: int(_get(usage, snake, camel) or 0) for key, snake, camel in _FIELDS}
+
+
+def _function_calls(event) -> list:
+    content = _get(event, "content", "content")
+    names = []
+    for part in _get(content, "parts", "parts") or []:
+        call = _get(part, "function_call", "functionCall")
+        if call is not None:
+            names.append(_get(call, "name", "name"))
+    return names
+
+
+def _empty() -> dict:
+    return {"model_calls": 0, "prompt_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+
+def _add(totals: dict, usage: dict):
+    totals["model_calls"] += 1
+    for key in ("prompt_tokens", "output_tokens", "total_tokens"):
+        totals[key] += usage[key]
+
+
+def summarize_events(events) -> dict:
+    """
+    Groups a session's events by invocation (one user turn each) and sums the
+    token usage per turn and per author.
+    """
+    turns = {}
+    for event in events:
+        invocation_id = _get(event, "invocation_id", "invocationId")
+        turn = turns.setdefault(invocation_id, {"invocation_id": invocation_id, "tools": [], **_empty(), "by_author": {}})
+        turn["tools"].extend(_function_calls(event))
+        usage = event_usage(event)
+        if usage is None:
+            continue
+        _add(turn, usage)
+        _add(turn["by_author"].setdefault(_get(event, "author", "author"), _empty()), usage)
+
+    totals = _empty()
+    scan_turns = []
+    for turn in turns.values():
+        turn["scan"] = any(tool in SCAN_TOOLS for tool in turn["tools"])
+        for key in totals:
+            totals[key] += turn[key]
+        if turn["scan"]:
+            scan_turns.append(turn)
+
+    totals["turns"] = len(turns)
+    totals["scan_turns"] = len(scan_turns)
+    totals["prompt_tokens_per_turn"] = round(totals["prompt_tokens"] / len(turns), 1) if turns else 0.0
+    totals["prompt_tokens_per_scan"] = (
+        round(sum(t["prompt_tokens"] for t in scan_turns) / len(scan_turns), 1) if scan_turns else None
+    )
+    return {"turns": list(turns.values()), "totals": totals}
+
+
+def record_token_usage(callback_context, llm_response):
+    """after_model_callback: adds this model call to state["token_usage"][agent name]."""
+    usage = event_usage(llm_response)
+    if usage is None or not usage["total_tokens"]:
+        return None
+    ledger = dict(callback_context.state.get("token_usage") or {})
+    totals = dict(ledger.get(callback_context.agent_name) or _empty())
+    _add(totals, usage)
+    ledger[callback_context.agent_name] = totals
+    callback_context.state["token_usage"] = ledger
+    record_tokens(callback_context.agent_name, usage)
+    logger.debug("%s tokens prompt=%d output=%d (invocation %s)", callback_context.agent_name,
+                 usage["prompt_tokens"], usage["output_tokens"], callback_context.invocation_id)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-turn token usage of exported LungSight AI sessions.")
+    parser.add_argument("sessions", nargs="+", help="Session JSON files or glob patterns.")
+    parser.add_argument("--json", help="Write the full per-turn report to this file.")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for pattern in args.sessions:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path, encoding="utf-8") as f:
+                session = json.load(f)
+            summary = summarize_events(session.get("events", []))
+            report[path] = summary
+
+            totals = summary["totals"]
+            print(f"{path}: {totals['turns']} turns, {totals['model_calls']} model calls, "
+                  f"{totals['prompt_tokens']} prompt / {totals['output_tokens']} output tokens, "
+                  f"prompt tokens per scan: {totals['prompt_tokens_per_scan']}")
+            for turn in summary["turns"]:
+                print(f"  {turn['invocation_id']:<40} calls={turn['model_calls']:<3} prompt={turn['prompt_tokens']:<6} "
+                      f"output={turn['output_tokens']:<5} {'scan ' if turn['scan'] else ''}{','.join(turn['tools'])}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
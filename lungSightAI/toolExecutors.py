@@ -0,0 +1,171 @@
+"""
+Dedicated executors for the blocking parts of the tools, one per workload, so
+the ADK event loop only ever awaits.
+
+    io      file reads, SQLite (history, cache, users), CSV appends   LUNGSIGHT_IO_WORKERS (8)
+    decode  JPEG/PNG decode and VGG preprocessing (OpenCV drops the GIL)  LUNGSIGHT_DECODE_WORKERS (CPUs)
+    model   model load and direct forward passes; micro-batched calls
+            only hold a slot while they wait                           LUNGSIGHT_MODEL_WORKERS (2)
+    hash    image digests and password KDFs                            LUNGSIGHT_HASH_WORKERS (2)
+
+Each workload admits at most LUNGSIGHT_<WORKLOAD>_MAX_PENDING jobs (running +
+queued, default 4 per worker, at least 16 for decode; for the model, twice the
+micro-batch size). A job beyond that raises Busy instead of joining an
+unbounded queue, and @busy_status turns it into {"status": "busy", "retry_after_ms": ...} for the agent.
+"""
+import os
+import time
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .telemetry import record_event
+
+logger = logging.getLogger(__name__)
+
+
+def _cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _env_int(name: str, default: int) -> int:
+    return max(1, int(os.environ.get(name, str(default))))
+
+
+IO_WORKERS = _env_int("LUNGSIGHT_IO_WORKERS", 8)
+DECODE_WORKERS = _env_int("LUNGSIGHT_DECODE_WORKERS", _cpus())
+MODEL_WORKERS = _env_int("LUNGSIGHT_MODEL_WORKERS", 2)
+HASH_WORKERS = _env_int("LUNGSIGHT_HASH_WORKERS", 2)
+
+IO_MAX_PENDING = _env_int("LUNGSIGHT_IO_MAX_PENDING", IO_WORKERS * 4)
+DECODE_MAX_PENDING = _env_int("LUNGSIGHT_DECODE_MAX_PENDING", max(16, DECODE_WORKERS * 4))
+MODEL_MAX_PENDING = _env_int("LUNGSIGHT_MODEL_MAX_PENDING", 2 * int(os.environ.get("LUNGSIGHT_MAX_BATCH_SIZE", "8")))
+HASH_MAX_PENDING = _env_int("LUNGSIGHT_HASH_MAX_PENDING", HASH_WORKERS * 4)
+
+MIN_RETRY_AFTER_SECONDS = 0.05
+
+
+class Busy(Exception):
+    """A workload is at its pending-job limit; retry after `retry_after` seconds."""
+
+    def __init__(self, workload: str, retry_after: float):
+        super().__init__(f"{workload} workload is busy")
+        self.workload = workload
+        self.retry_after = retry_after
+
+    def result(self) -> dict:
+        return {
+            "status": "busy",
+            "message": "The server is busy right now. Retry this call shortly.",
+            "workload": self.workload,
+            "retry_after_ms": int(self.retry_after * 1000) + 1,
+        }
+
+
+class Workload:
+    """A thread pool for one kind of blocking work, with a cap on jobs in flight."""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._avg_seconds = 0.0
+        self._completed = 0
+        self._rejected = 0
+        self._peak_pending = 0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"lungsight-{self.name}")
+        return self._pool
+
+    def retry_after(self) -> float:
+        """Rough time until a slot frees up: queued jobs x mean job time / workers."""
+        return max(MIN_RETRY_AFTER_SECONDS, self._avg_seconds * self._pending / self.workers)
+
+    def _admit(self) -> float:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise Busy(self.name, self.retry_after())
+            self._pending += 1
+            if self._pending > self._peak_pending:
+                self._peak_pending = self._pending
+        return time.perf_counter()
+
+    def _done(self, started: float, _future=None):
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+            # Exponential moving average, for retry_after()
+            self._avg_seconds = seconds if self._completed == 1 else 0.9 * self._avg_seconds + 0.1 * seconds
+
+    async def run(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) on this workload's threads. Raises Busy when the workload is full."""
+        started = self._admit()
+        try:
+            future = self._executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._done(started)
+            raise
+        # The slot is held until the job itself finishes, even if the caller is cancelled
+        future.add_done_callback(functools.partial(self._done, started))
+        return await asyncio.wrap_future(future)
+
+    async def wait(self, submit, *args):
+        """Awaits the concurrent Future returned by submit(*args) (e.g. MicroBatcher.submit), holding a slot."""
+        started = self._admit()
+        try:
+            future = submit(*args)
+        except BaseException:
+            self._done(started)
+            raise
+        future.add_done_callback(functools.partial(self._done, started))
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "peak_pending": self._peak_pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "mean_ms": round(self._avg_seconds * 1000.0, 2),
+            }
+
+
+IO = Workload("io", IO_WORKERS, IO_MAX_PENDING)
+DECODE = Workload("decode", DECODE_WORKERS, DECODE_MAX_PENDING)
+MODEL = Workload("model", MODEL_WORKERS, MODEL_MAX_PENDING)
+HASH = Workload("hash", HASH_WORKERS, HASH_MAX_PENDING)
+WORKLOADS = {w.name: w for w in (IO, DECODE, MODEL, HASH)}
+
+
+def workload_stats() -> dict:
+    return {name: workload.stats() for name, workload in WORKLOADS.items()}
+
+
+def busy_status(func):
+    """Async tool decorator: a Busy raised anywhere inside becomes the tool's "busy" result."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except Busy as busy:
+            record_event("lungsight_busy_rejections_total", tool=func.__name__, workload=busy.workload)
+            logger.debug("%s rejected, %s workload full", func.__name__, busy.workload)
+            return busy.result()
+    return wrapper
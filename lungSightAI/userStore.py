@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import threading
+
+from .toolExecutors import IO
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(CURRENT_DIR, "Data", "CSV files")
+DB_NAME = os.path.join(DATA_DIR, "users.db")
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        full_name TEXT,
+        gender TEXT,
+        age INTEGER,
+        username TEXT UNIQUE,
+        password TEXT,
+        user_uuid TEXT
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)",
+    "CREATE INDEX IF NOT EXISTS idx_users_uuid ON users (user_uuid)",
+)
+
+# Fixed statement texts: sqlite3 keeps each connection's compiled statements in
+# its statement cache, so these are prepared once per connection and reused.
+_INSERT_USER = "INSERT INTO users (full_name, gender, age, username, password, user_uuid) VALUES (?, ?, ?, ?, ?, ?)"
+_SELECT_CREDENTIALS = "SELECT password, user_uuid FROM users INDEXED BY idx_users_username WHERE username=?"
+_SELECT_BY_UUID = "SELECT full_name, gender, age, username, user_uuid FROM users INDEXED BY idx_users_uuid WHERE user_uuid=?"
+_UPDATE_PASSWORD = "UPDATE users SET password=? WHERE username=?"
+
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # readers never block the writer (login bursts)
+    "PRAGMA synchronous=NORMAL",    # safe with WAL, avoids an fsync per commit
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _user_dict(row) -> dict:
+    if row is None:
+        return None
+    return dict(zip(("full_name", "gender", "age", "username", "user_uuid"), row))
+
+
+class UserStore:
+    """
+    SQLite user store with one long-lived connection per thread (WAL mode).
+    The schema and indexes are created once per process, on first use.
+    """
+
+    def __init__(self, db_path: str = DB_NAME):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5.0, cached_statements=64)
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened (and the schema initialised) on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            if not self._initialized:
+                with self._init_lock:
+                    if not self._initialized:
+                        for statement in _SCHEMA:
+                            conn.execute(statement)
+                        conn.commit()
+                        self._initialized = True
+        return conn
+
+    def create_user(self, full_name, gender, age, username, password_hash, user_uuid):
+        """Inserts a user; raises sqlite3.IntegrityError if the username is taken."""
+        conn = self.connection()
+        with conn:
+            conn.execute(_INSERT_USER, (full_name, gender, age, username, password_hash, user_uuid))
+
+    def get_credentials(self, username):
+        """(password_hash, user_uuid) for a username, or None."""
+        return self.connection().execute(_SELECT_CREDENTIALS, (username,)).fetchone()
+
+    def get_by_uuid(self, user_uuid) -> dict:
+        return _user_dict(self.connection().execute(_SELECT_BY_UUID, (user_uuid,)).fetchone())
+
+    def update_password_hash(self, username, password_hash):
+        conn = self.connection()
+        with conn:
+            conn.execute(_UPDATE_PASSWORD, (password_hash, username))
+
+    def close(self):
+        """Closes the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class AsyncUserStore:
+    """
+    Async front of a UserStore for the async tools. Every call runs on the "io"
+    executor (see toolExecutors.py), whose long-lived threads each keep their own
+    pooled connection, so a signup or login opens nothing and the event loop
+    only awaits. Raises toolExecutors.Busy when the io workload is full.
+    """
+
+    def __init__(self, store: UserStore):
+        self.store = store
+
+    async def create_user(self, full_name, gender, age, username, password_hash, user_uuid):
+        """Inserts a user; raises sqlite3.IntegrityError if the username is taken."""
+        await IO.run(self.store.create_user, full_name, gender, age, username, password_hash, user_uuid)
+
+    async def get_credentials(self, username):
+        return await IO.run(self.store.get_credentials, username)
+
+    async def get_by_uuid(self, user_uuid) -> dict:
+        return await IO.run(self.store.get_by_uuid, user_uuid)
+
+    async def update_password_hash(self, username, password_hash):
+        await IO.run(self.store.update_password_hash, username, password_hash)
+
+
+USER_STORE = UserStore()
+ASYNC_USER_STORE = AsyncUserStore(USER_STORE)
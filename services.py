@@ -0,0 +1,15 @@
+"""
+Custom services for `adk web` / `adk api_server`, which load this file from the
+agents directory (the repository root) at start-up.
+
+    adk web --session_service_uri=lungsight://          # LUNGSIGHT_SESSION_BACKEND decides
+    adk web --session_service_uri=lungsight://tiered    # or name the backend
+
+The Dockerfile passes the first form, so the session backend settings apply to
+the deployed server, not only to the Runner in agent.py.
+"""
+from google.adk.cli.service_registry import get_service_registry
+
+from lungSightAI.sessionStore import session_service_factory
+
+get_service_registry().register_session_service("lungsight", session_service_factory)
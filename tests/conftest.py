@@ -0,0 +1,12 @@
+import os
+import sys
+
+# The package is imported from the checkout, as `adk web` does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeToolContext:
+    """Stand-in for ADK's ToolContext: the tools only touch `state`."""
+
+    def __init__(self, **state):
+        self.state = dict(state)
@@ -0,0 +1,132 @@
+import time
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from lungSightAI.batchingEngine import MicroBatcher
+
+
+def _image(value: float) -> np.ndarray:
+    return np.full((4, 4, 3), value, dtype=np.float32)
+
+
+def _row_per_image(batch):
+    # 13 "probabilities" per image, all equal to that image's fill value
+    return np.repeat(batch.mean(axis=(1, 2, 3))[:, None], 13, axis=1)
+
+
+def test_every_caller_gets_its_own_row():
+    batcher = MicroBatcher(_row_per_image, max_batch_size=4, max_wait_ms=20)
+    try:
+        futures = [batcher.submit(_image(i)) for i in range(10)]
+        rows = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.close()
+
+    assert [row.shape for row in rows] == [(13,)] * 10
+    assert [float(row[0]) for row in rows] == list(range(10))
+    metrics = batcher.metrics()
+    assert metrics["images"] == 10
+    assert max(metrics["batch_size_counts"]) <= 4
+
+
+def test_concurrent_callers_with_several_workers():
+    batcher = MicroBatcher(_row_per_image, max_batch_size=8, max_wait_ms=5, workers=2)
+    results = {}
+
+    def caller(n):
+        results[n] = float(batcher.predict(_image(n), timeout=5)[0])
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    batcher.close()
+
+    assert results == {n: float(n) for n in range(32)}
+
+
+def test_reused_buffer_does_not_leak_between_batches():
+    seen = []
+
+    def remember(batch):
+        seen.append(batch.shape[0])
+        return _row_per_image(batch)
+
+    batcher = MicroBatcher(remember, max_batch_size=4, max_wait_ms=0)
+    try:
+        assert float(batcher.predict(_image(7), timeout=5)[0]) == 7.0
+        assert float(batcher.predict(_image(3), timeout=5)[0]) == 3.0
+    finally:
+        batcher.close()
+    # Each flush only hands the model the images it holds, not the whole buffer
+    assert seen == [1, 1]
+
+
+def test_model_errors_reach_every_caller_in_the_batch():
+    def broken(batch):
+        raise RuntimeError("forward pass failed")
+
+    batcher = MicroBatcher(broken, max_batch_size=4, max_wait_ms=20)
+    try:
+        futures = [batcher.submit(_image(i)) for i in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="forward pass failed"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_closed_batcher_rejects_new_images():
+    batcher = MicroBatcher(_row_per_image)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(_image(1))
+
+
+def test_submits_racing_close_never_hang():
+    for _ in range(20):
+        batcher = MicroBatcher(_row_per_image, max_batch_size=4, max_wait_ms=1, workers=2)
+        futures, start = [], threading.Barrier(5)
+
+        def client(value):
+            start.wait()
+            for _ in range(50):
+                try:
+                    futures.append(batcher.submit(_image(value)))
+                except RuntimeError:
+                    return
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        batcher.close()
+        for thread in threads:
+            thread.join()
+
+        # Every accepted image was either served or failed by close(); none is left pending
+        for future in futures:
+            assert future.exception(timeout=5) is None or "closed" in str(future.exception())
+
+
+def test_images_left_in_the_queue_are_failed_on_close():
+    release = threading.Event()
+    batcher = MicroBatcher(lambda batch: (release.wait(5), _row_per_image(batch))[1], max_batch_size=1)
+    first = batcher.submit(_image(1))
+    closer = threading.Thread(target=batcher.close)
+    closer.start()
+    while not (batcher._stopped and batcher._queue.qsize()):
+        time.sleep(0.001)
+    # An image behind the stop sentinel, as an unlocked submit racing close() could leave
+    stray = Future()
+    batcher._queue.put((_image(2), stray, time.perf_counter()))
+    release.set()
+    closer.join(timeout=5)
+
+    assert first.result(timeout=1)[0] == 1.0
+    with pytest.raises(RuntimeError, match="closed"):
+        stray.result(timeout=1)
@@ -0,0 +1,22 @@
+import os
+import sys
+import json
+import subprocess
+
+from lungSightAI.coldStart import BASE_IMPORT, TOOL_IMPORTS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_deferred_tool_imports_are_not_loaded_by_the_server():
+    # A fresh interpreter: this test process has imported most of them already
+    script = (
+        f"import sys, json, importlib; importlib.import_module({BASE_IMPORT!r}); "
+        f"print(json.dumps(sorted(sys.modules)))"
+    )
+    done = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, capture_output=True, text=True,
+                          timeout=300, check=True)
+    loaded = set(json.loads(done.stdout.strip().splitlines()[-1]))
+
+    eager = {tool: [m for m in modules if m in loaded] for tool, modules in TOOL_IMPORTS.items()}
+    assert {tool: modules for tool, modules in eager.items() if modules} == {}
@@ -0,0 +1,66 @@
+import uuid
+
+import numpy as np
+import pytest
+
+import lungSightAI.historyStore as historyStore
+import lungSightAI.inferenceRecords as inferenceRecords
+from lungSightAI import customTools
+from lungSightAI.labels import DISEASES
+
+from conftest import FakeToolContext
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """History and record log in a temporary directory instead of Data/CSV files."""
+    history = historyStore.HistoryStore(str(tmp_path / "history.db"), flush_interval=60.0)
+    log = inferenceRecords.RecordLog(str(tmp_path / "records.lsr"))
+    monkeypatch.setattr(historyStore, "_store", history)
+    monkeypatch.setattr(inferenceRecords, "_log", log)
+    monkeypatch.setattr(inferenceRecords, "RECORD_LOG_ENABLED", True)
+    return history, log
+
+
+def _preds(value=0.2996):
+    preds = np.full(len(DISEASES), 0.01, dtype=np.float32)
+    preds[DISEASES.index("Cardiomegaly")] = value
+    return preds
+
+
+def test_saved_scan_keeps_the_unrounded_outputs(stores):
+    history, log = stores
+    context = FakeToolContext(uuid=str(uuid.uuid4()))
+    preds = _preds()
+
+    prediction = customTools._prediction_result("/images/img1.jpg", preds, False, 0.3, None, False, context,
+                                                "ab" * 32)
+    assert prediction["results"]["pos"] == {}
+    saved = customTools.save_to_csv_tool(prediction["results"], context)
+    assert saved["status"] == "success"
+
+    # Committed before the tool returned, with the model's value rather than the payload's 0.3
+    scan = history.recent_scans(context.state["uuid"])[0]
+    assert scan["Cardiomegaly"] == pytest.approx(float(preds[DISEASES.index("Cardiomegaly")]))
+    records = log.read()
+    assert len(records) == 1
+    assert bytes(records["image_sha256"][0]).hex() == "ab" * 32
+    assert not inferenceRecords.unpack_labels(records["labels"]).any()
+
+
+def test_results_from_elsewhere_are_saved_as_given(stores):
+    history, log = stores
+    context = FakeToolContext(uuid=str(uuid.uuid4()))
+    customTools._prediction_result("/images/img1.jpg", _preds(), False, 0.3, None, False, context, "ab" * 32)
+
+    other = customTools.encode_results(_preds(0.75), 0.3)
+    assert customTools.save_to_csv_tool(other, context)["status"] == "success"
+
+    assert history.recent_scans(context.state["uuid"])[0]["Cardiomegaly"] == 0.75
+    # The hash belonged to the other prediction, so it is not attached
+    assert not log.read()["image_sha256"][0].any()
+
+
+def test_saving_requires_a_login(stores):
+    saved = customTools.save_to_csv_tool(customTools.encode_results(_preds(), 0.3), FakeToolContext())
+    assert saved["status"] == "error"
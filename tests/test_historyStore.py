@@ -0,0 +1,117 @@
+import csv
+import logging
+import sqlite3
+
+import pytest
+
+import lungSightAI.historyStore as historyStore
+from lungSightAI import telemetry
+from lungSightAI.historyStore import HistoryStore
+from lungSightAI.labels import DISEASES
+
+
+def _count(db_path) -> int:
+    # A separate connection, as another process would see the table
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM inferences").fetchone()[0]
+
+
+def _write_legacy_csv(path, rows: int):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["uuid"] + DISEASES + ["timestamp"])
+        for i in range(rows):
+            writer.writerow([f"user-{i % 3}"] + [i / 100.0] * len(DISEASES) + [f"2025-01-{i % 28 + 1:02d}T10:00:00"])
+
+
+def test_waiting_append_is_committed_before_it_returns(tmp_path):
+    db_path = str(tmp_path / "history.db")
+    store = HistoryStore(db_path, flush_interval=60.0)
+
+    store.append("user-1", [0.5] * len(DISEASES), "2025-01-01T10:00:00", wait=True)
+    assert _count(db_path) == 1
+
+
+def test_buffered_appends_wait_for_a_flush(tmp_path):
+    db_path = str(tmp_path / "history.db")
+    store = HistoryStore(db_path, flush_interval=60.0)
+
+    store.append("user-1", {"Cardiomegaly": 0.8}, "2025-01-01T10:00:00")
+    assert _count(db_path) == 0
+    store.flush()
+    assert _count(db_path) == 1
+
+    scan = store.recent_scans("user-1")[0]
+    assert scan["Cardiomegaly"] == 0.8 and scan["Edema"] == 0.0
+
+
+def test_waiting_append_raises_when_the_write_fails(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=60.0)
+    with pytest.raises(sqlite3.Error):
+        store.append("user-1", [0.5] * (len(DISEASES) - 1), wait=True)
+
+
+def test_recent_scans_are_newest_first(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0)
+    for day in (3, 1, 2):
+        store.append("user-1", [day / 10.0] * len(DISEASES), f"2025-01-0{day}T10:00:00")
+    store.append("user-2", [0.9] * len(DISEASES), "2025-01-09T10:00:00")
+
+    scans = store.recent_scans("user-1", limit=2)
+    assert [s["timestamp"][:10] for s in scans] == ["2025-01-03", "2025-01-02"]
+
+
+def test_csv_migration_is_idempotent(tmp_path):
+    legacy = str(tmp_path / "user_inferences.csv")
+    _write_legacy_csv(legacy, 25)
+    db_path = str(tmp_path / "history.db")
+
+    assert HistoryStore(db_path).migrate_from_csv(legacy) == 25
+    # A restart (new process, new connection) imports nothing
+    assert HistoryStore(db_path).migrate_from_csv(legacy) == 0
+    assert _count(db_path) == 25
+
+
+def test_concurrent_migrations_import_once(tmp_path, monkeypatch):
+    legacy = str(tmp_path / "user_inferences.csv")
+    _write_legacy_csv(legacy, 25)
+    db_path = str(tmp_path / "history.db")
+    first, second = HistoryStore(db_path), HistoryStore(db_path)
+    reader = csv.DictReader
+    raced = []
+
+    def racing_reader(f):
+        # The other process imports between our first check and our transaction
+        monkeypatch.setattr(historyStore.csv, "DictReader", reader)
+        raced.append(second.migrate_from_csv(legacy))
+        return reader(f)
+
+    monkeypatch.setattr(historyStore.csv, "DictReader", racing_reader)
+    assert first.migrate_from_csv(legacy) == 0
+    assert raced == [25]
+    assert _count(db_path) == 25
+
+
+def test_missing_csv_is_not_migrated(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    assert store.migrate_from_csv(str(tmp_path / "missing.csv")) == 0
+
+
+def test_listener_failure_is_counted_and_logged(tmp_path, monkeypatch, caplog, capsys):
+    registry = telemetry.MetricsRegistry()
+    monkeypatch.setattr(telemetry, "METRICS", registry)
+    monkeypatch.setattr(telemetry, "METRICS_ENABLED", True)
+    db_path = str(tmp_path / "history.db")
+    store = HistoryStore(db_path, flush_interval=0)
+
+    def broken(rows, last_id):
+        raise RuntimeError("aggregates unavailable")
+
+    store.add_listener(broken)
+    with caplog.at_level(logging.WARNING, logger="lungSightAI.historyStore"):
+        store.append("user-1", [0.5] * len(DISEASES), "2025-01-01T10:00:00")
+
+    assert _count(db_path) == 1   # the row itself is committed
+    assert registry.snapshot()["counters"] == {'lungsight_history_failures_total{stage="listener"}': 1.0}
+    assert "aggregates unavailable" in caplog.text
+    assert capsys.readouterr().out == ""
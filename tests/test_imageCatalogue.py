@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+import lungSightAI.imageCatalogue as imageCatalogue
+from lungSightAI import customTools
+from lungSightAI.imageCatalogue import ImageCatalogue
+
+
+def _touch(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(b"\xff\xd8" + name.encode())
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    """An image directory whose catalogue only refreshes on its own once a minute."""
+    _touch(tmp_path, "img1.jpg", "img2.jpg", "img10.jpg", "image3.png")
+    catalogue = ImageCatalogue(str(tmp_path), refresh_seconds=60.0)
+    monkeypatch.setattr(imageCatalogue, "_catalogue", catalogue)
+    monkeypatch.setattr(imageCatalogue, "IMAGE_DIR", str(tmp_path))
+    return tmp_path, catalogue
+
+
+def test_vague_references_resolve(images):
+    root, catalogue = images
+    assert catalogue.resolve("image 1") == str(root / "img1.jpg")
+    assert catalogue.resolve("1st xray") == str(root / "img1.jpg")
+    assert catalogue.resolve("IMG10") == str(root / "img10.jpg")
+    assert catalogue.resolve('"image3.png"') == str(root / "image3.png")
+    assert catalogue.resolve("image 7") is None
+
+
+def test_numbers_match_as_written_before_by_value(images):
+    root, catalogue = images
+    # Only img1.jpg: "01" still finds it by value
+    assert catalogue.resolve("image 01") == str(root / "img1.jpg")
+
+    _touch(root, "img01.jpg")
+    catalogue.refresh(force=True)
+    assert catalogue.resolve("image 01") == str(root / "img01.jpg")
+    assert catalogue.resolve("image 1") == str(root / "img1.jpg")
+
+
+def test_files_added_between_refreshes_are_found(images):
+    root, catalogue = images
+    assert catalogue.resolve("img1") is not None   # catalogue listed now, next refresh in a minute
+
+    _touch(root, "img11.jpg", "scan_42.png")
+    assert customTools._resolve_image_path("img11.jpg") == os.path.join(str(root), "img11.jpg")
+    assert customTools._resolve_image_path("image 42") == str(root / "scan_42.png")
+
+
+def test_misses_suggest_close_names(images):
+    root, _ = images
+    resolved, error = customTools._locate_image("img100")
+    assert resolved is None
+    assert error["status"] == "error"
+    assert "img10.jpg" in error["did_you_mean"]
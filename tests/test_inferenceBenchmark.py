@@ -0,0 +1,24 @@
+from lungSightAI import customTools, inferenceBenchmark
+from lungSightAI.modelRegistry import MODEL_REGISTRY
+
+
+class FakeArchitecture:
+    def save_weights(self, path):
+        with open(path, "wb") as f:
+            f.write(b"random weights")
+
+
+def test_prepared_model_restores_the_tools_settings(tmp_path, monkeypatch):
+    missing = str(tmp_path / "missing" / "VGG.weights.h5")
+    monkeypatch.setattr(customTools, "WEIGHTS_PATH", missing)
+    monkeypatch.setattr(inferenceBenchmark, "build_architecture", lambda weights: FakeArchitecture())
+    monkeypatch.setattr(inferenceBenchmark, "imagenet_weights_cached", lambda: False)
+    builder = MODEL_REGISTRY.builder
+
+    with inferenceBenchmark.prepared_model(str(tmp_path)) as setup:
+        assert setup == {"random_weights": True, "imagenet_base": False}
+        assert customTools.WEIGHTS_PATH == str(tmp_path / "VGG.weights.h5")
+        assert MODEL_REGISTRY.builder is inferenceBenchmark._offline_builder
+
+    assert customTools.WEIGHTS_PATH == missing
+    assert MODEL_REGISTRY.builder is builder
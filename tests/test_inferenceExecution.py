@@ -0,0 +1,86 @@
+import os
+import time
+import logging
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from lungSightAI import inferenceExecution
+from lungSightAI.modelRegistry import ModelRegistry, build_classification_model
+
+
+class Doubler:
+    def predict_on_batch(self, batch):
+        return batch * 2
+
+
+def slow_builder(weights_path: str):
+    # Replicas finish loading at different times; all of them must be waited for
+    time.sleep(0.2 + (os.getpid() % 5) * 0.1)
+    return Doubler()
+
+
+def broken_builder(weights_path: str):
+    raise OSError("weights unreadable")
+
+
+@pytest.fixture
+def weights(tmp_path):
+    path = tmp_path / "model.weights.h5"
+    path.write_bytes(b"weights")
+    return str(path)
+
+
+def test_builder_is_public_and_replaceable(weights):
+    registry = ModelRegistry()
+    assert registry.builder is build_classification_model
+    registry.builder = lambda path: Doubler()
+    entry, resident = registry.load(weights)
+    assert isinstance(entry["model"], Doubler) and not resident
+
+
+def test_wait_ready_returns_once_every_replica_has_loaded(weights):
+    pool = inferenceExecution.ReplicaPool(weights, 3, intra=1, builder=slow_builder)
+    try:
+        pids = pool.wait_ready(timeout=120)
+        assert len(pids) == 3
+        batch = np.ones((2, 4), dtype=np.float32)
+        np.testing.assert_array_equal(pool.predict_on_batch(batch), batch * 2)
+    finally:
+        pool.close()
+
+
+def test_wait_ready_raises_when_a_replica_cannot_load(weights):
+    pool = inferenceExecution.ReplicaPool(weights, 2, intra=1, builder=broken_builder)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            pool.wait_ready(timeout=120)
+    finally:
+        pool.close()
+
+
+def test_thread_settings_warn_when_tensorflow_already_started(monkeypatch, caplog):
+    import tensorflow as tf
+
+    def started(threads):
+        raise RuntimeError("Intra op parallelism cannot be modified after initialization.")
+
+    monkeypatch.setattr(inferenceExecution, "_threads_applied", None)
+    monkeypatch.setattr(tf.config.threading, "set_intra_op_parallelism_threads", started)
+    with caplog.at_level(logging.WARNING, logger="lungSightAI.inferenceExecution"):
+        assert inferenceExecution.apply_thread_settings(3, 1) is False
+    assert "intra_op=3 inter_op=1 not applied" in caplog.text
+
+
+def test_replica_refuses_to_run_on_unsized_thread_pools(monkeypatch, weights):
+    monkeypatch.setattr(inferenceExecution, "apply_thread_settings", lambda intra, inter: False)
+    with pytest.raises(RuntimeError, match="intra_op=2 inter_op=1"):
+        inferenceExecution._init_replica(weights, 2, 1, None, None)
+
+
+@pytest.mark.skipif("LUNGSIGHT_EXECUTION_MODE" in os.environ, reason="execution mode set by the environment")
+def test_replicas_are_opt_in():
+    assert inferenceExecution.EXECUTION_MODE == "shared"
+    assert inferenceExecution.execution_plan(cpus=16)["replicas"] == 1
+    assert inferenceExecution.execution_plan("auto", cpus=16)["mode"] == "replicas"
@@ -0,0 +1,127 @@
+import csv
+import uuid
+
+import numpy as np
+import pytest
+
+from lungSightAI import inferenceRecords
+from lungSightAI.historyStore import HistoryStore
+from lungSightAI.inferenceRecords import (HEADER_SIZE, RecordLog, make_records, records_from_csv,
+                                          records_from_history, records_to_csv, unpack_labels, uuid_strings)
+from lungSightAI.labels import DISEASES
+
+
+def _columns(count: int, seed: int = 1) -> tuple:
+    rng = np.random.default_rng(seed)
+    uuids = [str(uuid.UUID(int=int(rng.integers(1 << 62)))) for _ in range(count)]
+    timestamps = [f"2026-05-{1 + i % 28:02d}T10:{i % 60:02d}:00.123456" for i in range(count)]
+    probs = rng.random((count, len(DISEASES))).astype(np.float32)
+    digests = [bytes(rng.integers(0, 256, 32, dtype=np.uint8)).hex() for _ in range(count)]
+    return uuids, timestamps, probs, digests
+
+
+def test_records_round_trip_through_the_log(tmp_path):
+    uuids, timestamps, probs, digests = _columns(25)
+    log = RecordLog(str(tmp_path / "records.lsr"), precision="float32")
+    assert log.append(make_records(uuids, timestamps, probs, digests, 0.3)) == 25
+
+    records = RecordLog(str(tmp_path / "records.lsr")).read()
+
+    assert len(records) == 25
+    assert uuid_strings(records) == uuids
+    assert np.datetime_as_string(records["timestamp"], unit="us").tolist() == timestamps
+    np.testing.assert_array_equal(records["probs"], probs)
+    assert [bytes(d).hex() for d in records["image_sha256"]] == digests
+    np.testing.assert_array_equal(unpack_labels(records["labels"]), probs >= 0.3)
+
+
+def test_torn_tail_is_ignored_and_dropped_by_the_next_append(tmp_path):
+    path = str(tmp_path / "records.lsr")
+    uuids, timestamps, probs, _ = _columns(4)
+    log = RecordLog(path)
+    log.append(make_records(uuids[:3], timestamps[:3], probs[:3]))
+    with open(path, "ab") as f:
+        f.write(make_records(uuids[3:], timestamps[3:], probs[3:]).tobytes()[:40])   # crash mid-write
+
+    assert len(log) == 3
+    np.testing.assert_array_equal(log.read()["probs"], probs[:3])
+
+    log.append(make_records(uuids[3:], timestamps[3:], probs[3:]))
+    records = RecordLog(path).read()
+    assert uuid_strings(records) == uuids
+    np.testing.assert_array_equal(records["probs"], probs)
+
+
+def test_float16_log_keeps_its_width_when_reopened(tmp_path):
+    path = str(tmp_path / "records.lsr")
+    uuids, timestamps, probs, _ = _columns(10)
+    RecordLog(path, precision="float16").append(make_records(uuids, timestamps, probs))
+
+    reopened = RecordLog(path, precision="float32")
+    records = reopened.read()
+
+    assert reopened.dtype.itemsize == 84
+    assert records["probs"].dtype == np.float16
+    np.testing.assert_allclose(records["probs"], probs, atol=1e-3)
+    assert uuid_strings(records) == uuids
+
+
+@pytest.mark.parametrize("header, message", [
+    (b"NOPE" + bytes(HEADER_SIZE - 4), "is not an inference record log"),
+    (b"LSIR\x01", "truncated record log header"),
+])
+def test_foreign_or_truncated_files_are_rejected(tmp_path, header, message):
+    path = tmp_path / "records.lsr"
+    path.write_bytes(header)
+    with pytest.raises(ValueError, match=message):
+        RecordLog(str(path))
+
+
+def test_csv_round_trip_skips_rows_without_a_uuid(tmp_path):
+    uuids, timestamps, probs, _ = _columns(6)
+    source = tmp_path / "user_inferences.csv"
+    with open(source, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["uuid", *DISEASES, "timestamp"])
+        for u, p, t in zip(uuids, probs, timestamps):
+            writer.writerow([u, *(repr(float(x)) for x in p), t])
+        writer.writerow(["not-a-uuid", *([0.5] * len(DISEASES)), timestamps[0]])
+
+    records, skipped = records_from_csv(str(source))
+    assert skipped == 1 and len(records) == 6
+
+    copy = tmp_path / "copy.csv"
+    assert records_to_csv(records, str(copy)) == 6
+    again, skipped = records_from_csv(str(copy))
+    assert skipped == 0
+    assert uuid_strings(again) == uuids
+    np.testing.assert_array_equal(again["probs"], probs)
+    np.testing.assert_array_equal(again["timestamp"], records["timestamp"])
+    np.testing.assert_array_equal(again["labels"], records["labels"])
+
+
+def test_history_converter_covers_every_row_in_batches(tmp_path):
+    uuids, timestamps, probs, _ = _columns(11)
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0)
+    for u, t, p in zip(uuids, timestamps, probs):
+        store.append(u, p, t)
+
+    batches = list(records_from_history(store, batch=4))
+
+    assert [len(b) for b in batches] == [4, 4, 3]
+    records = np.concatenate(batches)
+    assert uuid_strings(records) == uuids
+    np.testing.assert_allclose(records["probs"], probs, rtol=1e-6)
+
+
+def test_record_inference_appends_to_the_process_log(tmp_path, monkeypatch):
+    log = RecordLog(str(tmp_path / "records.lsr"))
+    monkeypatch.setattr(inferenceRecords, "_log", log)
+    monkeypatch.setattr(inferenceRecords, "RECORD_LOG_ENABLED", True)
+    uuids, timestamps, probs, digests = _columns(1)
+
+    inferenceRecords.record_inference(uuids[0], probs[0], timestamps[0], digests[0], 0.5)
+
+    records = log.read()
+    assert uuid_strings(records) == uuids and bytes(records["image_sha256"][0]).hex() == digests[0]
+    np.testing.assert_array_equal(unpack_labels(records["labels"][0]), probs[0] >= 0.5)
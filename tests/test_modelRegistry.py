@@ -0,0 +1,79 @@
+import os
+import threading
+
+from lungSightAI.modelRegistry import ModelRegistry
+
+
+def _weights(tmp_path, content=b"weights v1"):
+    path = tmp_path / "VGG.weights.h5"
+    path.write_bytes(content)
+    return str(path)
+
+
+def _counting_builder():
+    built = []
+
+    def builder(path):
+        built.append(path)
+        return object()
+
+    return builder, built
+
+
+def test_model_is_built_once_per_weights_file(tmp_path):
+    builder, built = _counting_builder()
+    registry = ModelRegistry(builder)
+    path = _weights(tmp_path)
+
+    first, resident = registry.load(path)
+    assert not resident
+    second, resident = registry.load(path)
+    assert resident
+    assert second["model"] is first["model"]
+    assert built == [os.path.abspath(path)]
+    assert registry.get(path) is first
+
+
+def test_concurrent_loads_share_one_build(tmp_path):
+    gate = threading.Event()
+    built = []
+
+    def slow_builder(path):
+        built.append(path)
+        gate.wait(5)
+        return object()
+
+    registry = ModelRegistry(slow_builder)
+    path = _weights(tmp_path)
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.load(path)[0]["model"])) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(built) == 1
+    assert len(models) == 8 and all(m is models[0] for m in models)
+
+
+def test_replaced_weights_are_reloaded(tmp_path):
+    builder, built = _counting_builder()
+    registry = ModelRegistry(builder)
+    path = _weights(tmp_path)
+    first, _ = registry.load(path)
+
+    with open(path, "wb") as f:
+        f.write(b"weights v2, a different size")
+    second, resident = registry.load(path)
+
+    assert not resident
+    assert second["weights_sha256"] != first["weights_sha256"]
+    assert len(built) == 2
+    # Only the current version stays resident
+    assert len(registry.stats()["resident_models"]) == 1
+
+
+def test_missing_weights_are_not_resident(tmp_path):
+    registry = ModelRegistry(lambda path: object())
+    assert registry.get(str(tmp_path / "missing.h5")) is None
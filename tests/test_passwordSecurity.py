@@ -0,0 +1,82 @@
+import time
+import asyncio
+
+import pytest
+
+from lungSightAI import passwordSecurity
+from lungSightAI.passwordSecurity import LoginThrottle, needs_rehash, normalize_method
+from lungSightAI.toolExecutors import Busy, Workload
+
+FAST_METHOD = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture
+def hash_pool(monkeypatch):
+    """Cheap KDF parameters and a private one-thread hashing pool."""
+    pool = Workload("hash", 1, 4)
+    monkeypatch.setattr(passwordSecurity, "HASH", pool)
+    monkeypatch.setattr(passwordSecurity, "HASH_METHOD", FAST_METHOD)
+    return pool
+
+
+def test_lockout_after_max_failures_and_unlock_after_the_window():
+    throttle = LoginThrottle(max_failures=3, lockout_seconds=0.2)
+    for _ in range(2):
+        throttle.record_failure("alice")
+    assert throttle.retry_after("alice") == 0.0
+
+    throttle.record_failure("alice")
+    assert 0.0 < throttle.retry_after("alice") <= 0.2
+    assert throttle.retry_after("bob") == 0.0
+
+    time.sleep(0.25)
+    assert throttle.retry_after("alice") == 0.0
+
+
+def test_repeated_lockouts_double_and_success_resets():
+    throttle = LoginThrottle(max_failures=1, lockout_seconds=10)
+    throttle.record_failure("alice")
+    assert 0 < throttle.retry_after("alice") <= 10
+    throttle.record_failure("alice")
+    assert 10 < throttle.retry_after("alice") <= 20
+
+    throttle.record_success("alice")
+    assert throttle.retry_after("alice") == 0.0
+
+
+def test_a_known_bad_digest_never_rejects_the_right_password(hash_pool):
+    throttle = LoginThrottle(max_failures=10)
+    stored = asyncio.run(passwordSecurity.hash_password("correct horse"))
+    throttle.record_failure("alice", stored, "wrong guess")
+
+    assert throttle.is_known_bad(stored, "wrong guess")
+    assert not throttle.is_known_bad(stored, "correct horse")
+    assert asyncio.run(passwordSecurity.verify_password(stored, "correct horse"))
+
+    # A new stored hash (e.g. after a password change) starts with a clean slate
+    rehashed = asyncio.run(passwordSecurity.hash_password("wrong guess"))
+    assert not throttle.is_known_bad(rehashed, "wrong guess")
+
+
+def test_hashing_runs_on_the_hash_pool(hash_pool):
+    stored = asyncio.run(passwordSecurity.hash_password("secret"))
+    assert asyncio.run(passwordSecurity.verify_password(stored, "secret"))
+    assert not asyncio.run(passwordSecurity.verify_password(stored, "not it"))
+    assert hash_pool.stats()["completed"] == 3
+
+
+def test_a_full_hash_pool_reports_busy(monkeypatch):
+    monkeypatch.setattr(passwordSecurity, "HASH", Workload("hash", 1, 0))
+    with pytest.raises(Busy):
+        asyncio.run(passwordSecurity.hash_password("secret"))
+
+
+def test_needs_rehash_compares_full_parameters(monkeypatch):
+    monkeypatch.setattr(passwordSecurity, "HASH_METHOD", "scrypt")
+    assert normalize_method("scrypt") == "scrypt:32768:8:1"
+    assert not needs_rehash("scrypt:32768:8:1$salt$digest")
+    assert needs_rehash("scrypt:16384:8:1$salt$digest")
+    assert needs_rehash(f"{FAST_METHOD}$salt$digest")
+
+    monkeypatch.setattr(passwordSecurity, "HASH_METHOD", FAST_METHOD)
+    assert not needs_rehash(f"{FAST_METHOD}$salt$digest")
@@ -0,0 +1,196 @@
+import csv
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from lungSightAI.historyStore import HistoryStore
+from lungSightAI.labels import DISEASES
+from lungSightAI.populationAnalytics import PopulationAnalytics
+
+USERS = [f"user-{n}" for n in range(4)]
+FIRST_DAY = date(2026, 3, 1)
+
+
+def _rows(count: int, seed: int = 7, day_offset: int = 0) -> list:
+    """(uuid, timestamp, *probs) rows over ~6 weeks, with gaps and a few probabilities on bin edges."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(count):
+        day = FIRST_DAY + timedelta(days=day_offset + int(rng.choice([0, 1, 2, 5, 9, 10, 20, 33, 40])))
+        probs = rng.random(len(DISEASES))
+        probs[rng.integers(len(DISEASES))] = rng.choice([0.0, 0.05, 0.3, 0.5, 1.0])
+        stamp = f"{day.isoformat()}T{int(rng.integers(24)):02d}:{int(rng.integers(60)):02d}:00"
+        rows.append((str(rng.choice(USERS)), stamp, *probs.tolist()))
+    return rows
+
+
+def _day(row) -> date:
+    return date.fromisoformat(row[1][:10])
+
+
+def _window(rows, since=None, until=None) -> list:
+    return [r for r in rows
+            if (since is None or _day(r) >= date.fromisoformat(since))
+            and (until is None or _day(r) <= date.fromisoformat(until))]
+
+
+def _brute_summary(rows, threshold) -> dict:
+    probs = np.array([r[2:] for r in rows], dtype=np.float64).reshape(-1, len(DISEASES))
+    positives = (probs >= threshold).sum(axis=0)
+    return {disease: (round(float(probs[:, i].mean()), 4) if len(rows) else None, int(positives[i]))
+            for i, disease in enumerate(DISEASES)}
+
+
+def _brute_trend(rows, label, window) -> list:
+    i = DISEASES.index(label)
+    by_day = {}
+    for r in rows:
+        by_day.setdefault(_day(r), []).append(r[2 + i])
+    points = []
+    for day in sorted(by_day):
+        trailing = [p for d, ps in by_day.items() if day - timedelta(days=window - 1) <= d <= day for p in ps]
+        points.append({"date": day.isoformat(), "scans": len(by_day[day]),
+                       "mean": round(float(np.mean(by_day[day])), 4),
+                       "rolling_mean": round(float(np.mean(trailing)), 4)})
+    return points
+
+
+def _assert_matches(analytics, rows, threshold=0.3, since=None, until=None):
+    summary = analytics.summary(threshold, since=since, until=until)
+    assert summary["threshold"] == min(threshold, 0.95)
+    expected = _brute_summary(_window(rows, since, until), summary["threshold"])
+    assert summary["scans"] == len(_window(rows, since, until))
+    for disease, (mean, positive) in expected.items():
+        assert summary["labels"][disease]["mean_probability"] == mean
+        assert summary["labels"][disease]["positive"] == positive
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.05, 0.3, 0.5, 0.95, 1.0])
+def test_summary_matches_a_brute_force_count(threshold):
+    rows = _rows(600)
+    analytics = PopulationAnalytics()
+    for start in range(0, len(rows), 97):
+        analytics.fold(rows[start:start + 97])
+
+    _assert_matches(analytics, rows, threshold)
+    _assert_matches(analytics, rows, threshold, since="2026-03-03", until="2026-03-21")
+
+
+def test_earlier_days_folded_later_extend_the_range():
+    late, early = _rows(200, seed=1, day_offset=30), _rows(200, seed=2)
+    analytics = PopulationAnalytics()
+    analytics.fold(late)
+    analytics.fold(early)
+
+    _assert_matches(analytics, late + early)
+    _assert_matches(analytics, late + early, since="2026-03-02", until="2026-04-05")
+    assert analytics.stats()["first_day"] == "2026-03-01"
+
+
+def test_histogram_matches_a_brute_force_binning():
+    rows = _rows(300)
+    analytics = PopulationAnalytics()
+    analytics.fold(rows)
+    label = "Pleural Effusion" if "Pleural Effusion" in DISEASES else DISEASES[0]
+    values = np.array([r[2 + DISEASES.index(label)] for r in rows])
+
+    histogram = analytics.histogram(label)
+
+    expected = np.bincount(np.minimum((values * 20).astype(int), 19), minlength=20)
+    assert histogram["counts"] == expected.tolist()
+
+
+@pytest.mark.parametrize("window", [1, 3, 7])
+def test_trends_match_a_brute_force_rolling_mean(window):
+    rows = _rows(500)
+    analytics = PopulationAnalytics()
+    analytics.fold(rows[:250])
+    analytics.fold(rows[250:])
+    label = DISEASES[3]
+
+    assert analytics.daily_trend(label, window)["days"] == _brute_trend(rows, label, window)
+    since, until = "2026-03-06", "2026-04-01"
+    expected = [p for p in _brute_trend(rows, label, window) if since <= p["date"] <= until]
+    assert analytics.daily_trend(label, window, since=since, until=until)["days"] == expected
+    for user in USERS:
+        mine = [r for r in rows if r[0] == user]
+        assert analytics.user_trend(user, label, window)["days"] == _brute_trend(mine, label, window)
+
+
+def test_history_listener_keeps_the_aggregates_equal_to_a_rebuild(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=60.0, batch_size=1000)
+    analytics = PopulationAnalytics()
+    store.add_listener(analytics.on_history_write)
+    rows = _rows(250)
+    for i, row in enumerate(rows):
+        store.append(row[0], row[2:], row[1])
+        if i % 60 == 0:
+            store.flush()
+    store.flush()
+
+    rebuilt = PopulationAnalytics()
+    rebuilt.sync(store)
+    assert analytics.watermark == rebuilt.watermark == len(rows)
+    assert not analytics.stale
+    assert analytics.summary(0.3) == rebuilt.summary(0.3)
+    _assert_matches(analytics, rows)
+
+
+def _legacy_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["uuid", "timestamp", *DISEASES])
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_migrated_rows_reach_the_listener(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0)
+    first, legacy = _rows(50, seed=3), _rows(80, seed=4)
+    for row in first:
+        store.append(row[0], row[2:], row[1])
+    analytics = PopulationAnalytics()
+    analytics.sync(store)
+    store.add_listener(analytics.on_history_write)
+
+    assert store.migrate_from_csv(_legacy_csv(tmp_path / "user_inferences.csv", legacy)) == len(legacy)
+
+    assert not analytics.stale and analytics.watermark == len(first) + len(legacy)
+    assert analytics.sync(store) == 0
+    _assert_matches(analytics, first + legacy)
+
+
+def test_rows_written_behind_the_listener_are_caught_up_once(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0)
+    first, missed, later = _rows(50, seed=3), _rows(30, seed=5), _rows(20, seed=6)
+    analytics = PopulationAnalytics()
+    for row in first:
+        store.append(row[0], row[2:], row[1])
+    analytics.sync(store)
+    for row in missed:                       # e.g. written by another process
+        store.append(row[0], row[2:], row[1])
+    store.add_listener(analytics.on_history_write)
+    for row in later:
+        store.append(row[0], row[2:], row[1])
+
+    assert analytics.stale
+    assert analytics.sync(store) == len(missed) + len(later)
+    assert analytics.sync(store) == 0
+    _assert_matches(analytics, first + missed + later)
+
+
+def test_cache_round_trip_keeps_every_query(tmp_path):
+    rows = _rows(300)
+    analytics = PopulationAnalytics()
+    analytics.fold(rows, range(1, len(rows) + 1))
+    path = str(tmp_path / "aggregates.npz")
+    analytics.save(path)
+
+    loaded = PopulationAnalytics.load(path)
+
+    assert loaded.watermark == len(rows)
+    assert loaded.summary(0.5) == analytics.summary(0.5)
+    assert loaded.daily_trend(DISEASES[0], 7) == analytics.daily_trend(DISEASES[0], 7)
+    assert loaded.user_trend(USERS[1], DISEASES[0], 7) == analytics.user_trend(USERS[1], DISEASES[0], 7)
+    assert loaded.fold(rows[:10], range(1, 11)) == 0   # already counted
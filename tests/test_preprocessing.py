@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+
+from lungSightAI.preprocessing import PreprocessPipeline, VGG_MEAN_BGR, preprocess_image
+
+
+def _write_images(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"img{i}.png"
+        cv2.imwrite(str(path), np.full((32, 48, 3), 10 * i, dtype=np.uint8))
+        paths.append(str(path))
+    return paths
+
+
+def test_pipeline_yields_batches_in_input_order(tmp_path):
+    paths = _write_images(tmp_path, 5)
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    paths.insert(3, str(broken))
+
+    seen = []
+    for chunk, batch, ok in PreprocessPipeline(batch_size=2, workers=3).batches(paths):
+        assert len(chunk) == len(batch) == len(ok)
+        for path, row, decoded in zip(chunk, batch, ok):
+            seen.append((path, decoded))
+            if decoded:
+                # Compared before the next batch is requested: the buffers are reused
+                np.testing.assert_allclose(row, preprocess_image(path))
+
+    assert [path for path, _ in seen] == paths
+    assert [decoded for _, decoded in seen] == [True, True, True, False, True, True]
+
+
+def test_preprocessing_subtracts_the_vgg_means(tmp_path):
+    path = _write_images(tmp_path, 2)[1]
+    out = preprocess_image(path)
+    assert out.shape == (224, 224, 3) and out.dtype == np.float32
+    np.testing.assert_allclose(out[0, 0], 10 - VGG_MEAN_BGR, rtol=1e-6)
+
+
+def test_empty_input_yields_nothing():
+    assert list(PreprocessPipeline(batch_size=4).batches([])) == []
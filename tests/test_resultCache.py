@@ -0,0 +1,50 @@
+import numpy as np
+
+from lungSightAI.modelRegistry import file_sha256
+from lungSightAI.resultCache import InferenceCache, image_digest
+
+
+def _probs(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).random(13).astype(np.float32)
+
+
+def test_new_weights_miss_the_old_entries(tmp_path):
+    weights = tmp_path / "model.h5"
+    weights.write_bytes(b"weights v1")
+    cache = InferenceCache(max_entries=8, db_path=str(tmp_path / "cache.db"))
+    image = image_digest(b"same image bytes")
+    cache.put(file_sha256(str(weights)), image, _probs(1))
+
+    weights.write_bytes(b"weights v2")
+
+    assert cache.get(file_sha256(str(weights)), image) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_memory_tier_evicts_the_least_recently_used_entry():
+    cache = InferenceCache(max_entries=3)
+    for i in range(3):
+        cache.put("m", f"img{i}", _probs(i))
+    cache.get("m", "img0")                     # img1 is now the oldest
+
+    cache.put("m", "img3", _probs(3))
+
+    assert cache.get("m", "img1") is None
+    for i in (0, 2, 3):
+        np.testing.assert_array_equal(cache.get("m", f"img{i}"), _probs(i))
+    assert cache.stats()["memory_entries"] == 3 and cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_stays_under_its_byte_bound_and_drops_the_oldest(tmp_path):
+    path = str(tmp_path / "cache.db")
+    entry_size = _probs(0).nbytes + len("m:img00")
+    cache = InferenceCache(max_entries=0, db_path=path, db_max_bytes=entry_size * 10)
+    for i in range(25):
+        cache.put("m", f"img{i:02d}", _probs(i))
+
+    reopened = InferenceCache(max_entries=0, db_path=path, db_max_bytes=entry_size * 10)
+
+    assert 0 < reopened.stats()["disk_bytes"] <= entry_size * 10
+    assert reopened.get("m", "img00") is None
+    np.testing.assert_array_equal(reopened.get("m", "img24"), _probs(24))
+    assert reopened.stats()["disk_hits"] == 1
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from lungSightAI.labels import DISEASES
+from lungSightAI.resultEncoding import (decode_results, encode_results, is_encoded, result_probabilities,
+                                        summary_text)
+
+
+def _probs(**values):
+    probs = np.full(len(DISEASES), 0.01)
+    for name, value in values.items():
+        probs[DISEASES.index(name.replace("_", " "))] = value
+    return probs
+
+
+def test_threshold_is_applied_before_rounding():
+    encoded = encode_results(_probs(Cardiomegaly=0.2996, Edema=0.30004), 0.3)
+    cardiomegaly, edema = DISEASES.index("Cardiomegaly"), DISEASES.index("Edema")
+
+    # Both print as 0.3, but only the one really at the threshold is a finding
+    assert encoded["p"][cardiomegaly] == encoded["p"][edema] == 0.3
+    assert list(encoded["pos"]) == ["Edema"]
+
+
+def test_decoding_keeps_the_encoded_labels():
+    encoded = encode_results(_probs(Cardiomegaly=0.2996, Edema=0.81), 0.3)
+    verbose = decode_results(encoded)
+
+    assert verbose["Cardiomegaly"] == {"probability": 0.3, "label": "N"}
+    assert verbose["Edema"] == {"probability": 0.81, "label": "Y"}
+    # An explicit threshold re-labels from the rounded probabilities
+    assert decode_results(encoded, threshold=0.5)["Edema"]["label"] == "Y"
+    assert decode_results(encoded, threshold=0.9)["Edema"]["label"] == "N"
+
+
+def test_per_label_thresholds_and_profile_name():
+    thresholds = np.full(len(DISEASES), 0.5)
+    thresholds[DISEASES.index("Pneumonia")] = 0.1
+    encoded = encode_results(_probs(Pneumonia=0.2, Edema=0.4), thresholds, "sensitivity")
+
+    assert encoded["profile"] == "sensitivity"
+    assert len(encoded["t"]) == len(DISEASES)
+    assert list(encoded["pos"]) == ["Pneumonia"]
+    assert "t=sensitivity" in summary_text("img1.jpg", encoded)
+
+
+def test_verbose_results_are_still_read():
+    verbose = {"Cardiomegaly": {"probability": 0.7, "label": "Y"}}
+    assert not is_encoded(verbose)
+    probs = result_probabilities(verbose)
+    assert probs[DISEASES.index("Cardiomegaly")] == 0.7 and sum(probs) == 0.7
+
+
+def test_unknown_versions_are_rejected():
+    encoded = encode_results(_probs(), 0.3)
+    encoded["v"] = 99
+    with pytest.raises(ValueError):
+        result_probabilities(encoded)
@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+import pytest
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from lungSightAI import telemetry
+from lungSightAI.sessionStore import TieredSessionService, build_session_service, session_service_factory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _event(invocation: str, author: str, text: str = "hi") -> Event:
+    role = "user" if author == "user" else "model"
+    return Event(invocation_id=invocation, author=author,
+                 content=types.Content(role=role, parts=[types.Part(text=text)]))
+
+
+async def _run_turns(service, session, turns: int):
+    for turn in range(turns):
+        session = await service.get_session(app_name="A", user_id="u", session_id=session.id)
+        await service.append_event(session, _event(f"inv{turn}", "user"))
+        await service.append_event(session, _event(f"inv{turn}", "orchestrator", "x" * 500))
+    return session
+
+
+def test_old_turns_are_compacted_in_memory_and_in_the_database(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}"
+
+    async def scenario():
+        service = TieredSessionService(url, keep_turns=3)
+        session = await service.create_session(app_name="A", user_id="u", state={"uuid": "x"})
+        session = await _run_turns(service, session, 6)
+        stats = service.stats()
+        await service.close()
+
+        # A fresh instance reads what the database holds
+        reloaded_service = TieredSessionService(url)
+        reloaded = await reloaded_service.get_session(app_name="A", user_id="u", session_id=session.id)
+        await reloaded_service.close()
+        return session, reloaded, stats
+
+    session, reloaded, stats = asyncio.run(scenario())
+    # Each new turn drops the oldest beyond the last three, the new one included
+    assert sorted({e.invocation_id for e in session.events}) == ["inv3", "inv4", "inv5"]
+    assert sorted({e.invocation_id for e in reloaded.events}) == ["inv3", "inv4", "inv5"]
+    assert reloaded.state["uuid"] == "x"
+    assert stats["compacted_turns"] == 3 and stats["hits"] == 6
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}"
+
+    async def scenario():
+        service = TieredSessionService(url, max_sessions=2)
+        sessions = [await service.create_session(app_name="A", user_id="u") for _ in range(4)]
+        first = await service.get_session(app_name="A", user_id="u", session_id=sessions[0].id)
+        stats = service.stats()
+        await service.close()
+        return first, stats
+
+    first, stats = asyncio.run(scenario())
+    assert first is not None   # evicted from memory, read back from the database
+    assert stats["evicted_lru"] >= 2 and stats["misses"] == 1 and stats["hot_sessions"] <= 2
+
+
+def test_cache_figures_are_exported(tmp_path, monkeypatch):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}"
+    service = TieredSessionService(url, max_mb=1)
+
+    async def scenario():
+        session = await service.create_session(app_name="A", user_id="u")
+        await service.get_session(app_name="A", user_id="u", session_id=session.id)
+        await service.close()
+
+    asyncio.run(scenario())
+    text = telemetry.render_prometheus()
+    assert 'lungsight_session_cache_requests_total{result="hit"} 1' in text
+    assert "# TYPE lungsight_session_cache_budget_bytes gauge" in text
+    assert f"lungsight_session_cache_budget_bytes {1024 * 1024}" in text
+
+
+def test_adk_web_gets_the_configured_backend():
+    from google.adk.cli.service_registry import get_service_registry, load_services_module
+
+    assert isinstance(session_service_factory("lungsight://memory"), InMemorySessionService)
+    # services.py in the agents directory registers the lungsight:// scheme for adk web
+    load_services_module(ROOT)
+    service = get_service_registry().create_session_service("lungsight://memory", agents_dir=ROOT)
+    assert isinstance(service, InMemorySessionService)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        build_session_service("redis")
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+
+import pytest
+
+from lungSightAI import customTools, telemetry, toolExecutors
+
+from conftest import FakeToolContext
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    registry = telemetry.MetricsRegistry()
+    monkeypatch.setattr(telemetry, "METRICS", registry)
+    monkeypatch.setattr(telemetry, "METRICS_ENABLED", True)
+    return registry
+
+
+def test_events_and_stages_are_not_recorded_when_disabled(monkeypatch):
+    registry = telemetry.MetricsRegistry()
+    monkeypatch.setattr(telemetry, "METRICS", registry)
+    monkeypatch.setattr(telemetry, "METRICS_ENABLED", False)
+    telemetry.record_event("lungsight_busy_rejections_total", tool="t", workload="io")
+    telemetry.record_stage("scan.predict", 0.2)
+    assert registry.snapshot() == {"histograms": {}, "counters": {}}
+
+
+def test_busy_rejection_is_counted_and_logged_not_printed(metrics, caplog, capsys):
+    @toolExecutors.busy_status
+    async def crowded_tool():
+        raise toolExecutors.Busy("model", 0.2)
+
+    with caplog.at_level(logging.DEBUG, logger="lungSightAI.toolExecutors"):
+        result = asyncio.run(crowded_tool())
+
+    assert result["status"] == "busy"
+    assert metrics.snapshot()["counters"] == {
+        'lungsight_busy_rejections_total{tool="crowded_tool",workload="model"}': 1.0
+    }
+    assert "crowded_tool rejected, model workload full" in caplog.text
+    assert capsys.readouterr().out == ""
+
+
+def test_unchanged_report_is_counted_as_deduplicated(metrics, caplog, capsys):
+    from lungSightAI.reportRenderer import report_filename, report_input_hash
+
+    fields = {
+        "patient_name": "A", "age_sex": "40/F", "ref_by": "Dr B", "date": "2026-01-01", "xray_no": "7",
+        "exam_title": "CXR PA", "findings": "Clear.", "conclusion": "Normal.", "advice": "None.",
+    }
+    filename = report_filename("7")
+    context = FakeToolContext(report_artifacts={filename: {"input_sha256": report_input_hash(fields), "version": 3}})
+
+    with caplog.at_level(logging.DEBUG, logger="lungSightAI.customTools"):
+        result = asyncio.run(customTools.generate_cxr_pdf_report(**fields, tool_context=context))
+
+    assert result["deduplicated"] is True and result["version"] == 3
+    assert metrics.snapshot()["counters"] == {"lungsight_reports_deduplicated_total{}": 1.0}
+    assert "skipping render" in caplog.text
+    assert capsys.readouterr().out == ""
+
+
+def test_scan_timings_go_to_the_stage_histogram(metrics, capsys):
+    prediction = {"results": {"pos": {"Effusion": 0.61}}, "analyzed_file": "img1.jpg"}
+    timings = {"load_model_ms": 1.0, "predict_ms": 120.0, "save_ms": 4.0, "total_ms": 125.0}
+
+    summary = customTools._scan_summary(prediction, {"status": "success"}, timings, FakeToolContext())
+
+    assert summary["verdict"] == "Abnormal"
+    histograms = metrics.snapshot()["histograms"]
+    assert histograms['lungsight_stage_latency_seconds{stage="scan.predict"}'] == {"count": 1, "sum": 0.12}
+    assert set(histograms) == {f'lungsight_stage_latency_seconds{{stage="scan.{name}"}}'
+                               for name in ("load_model", "predict", "save", "total")}
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,32 @@
+import cv2
+import numpy as np
+
+from lungSightAI import preprocessing, testTimeAugmentation
+
+
+def _large_jpeg() -> tuple:
+    # Fine stripes survive a full decode but blur away in a 1/4 scale one
+    img = np.zeros((1800, 1800, 3), dtype=np.uint8)
+    img[:, ::2] = 255
+    ok, data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 100])
+    assert ok
+    return img, data.tobytes()
+
+
+def test_single_view_decode_is_reduced_for_large_jpegs(monkeypatch):
+    monkeypatch.setattr(preprocessing, "REDUCED_DECODE_MIN_SIDE", 448)
+    _, data = _large_jpeg()
+    assert preprocessing.decode_image_bytes(data).shape[:2] == (450, 450)
+    assert preprocessing.decode_image_bytes(data, full_resolution=True).shape[:2] == (1800, 1800)
+
+
+def test_views_are_cut_from_the_full_resolution_image(monkeypatch):
+    monkeypatch.setattr(preprocessing, "REDUCED_DECODE_MIN_SIDE", 448)
+    _, data = _large_jpeg()
+    full = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    views = ("full", "center", "tiles")
+
+    batch = testTimeAugmentation.preprocess_views_bytes(data, views)
+
+    np.testing.assert_array_equal(batch, testTimeAugmentation.preprocess_views(full, views))
+    assert batch.shape == (6, 224, 224, 3)
@@ -0,0 +1,111 @@
+import json
+
+import numpy as np
+import pytest
+
+from lungSightAI import customTools, thresholdProfiles
+from lungSightAI.labels import DISEASES
+
+from conftest import FakeToolContext
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    """A calibrated "sensitivity" profile on disk, served as the process-wide profiles."""
+    path = str(tmp_path / "threshold_profiles.json")
+    thresholds = {d: 0.1 for d in DISEASES}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"profiles": {"sensitivity": {"thresholds": thresholds}}}, f)
+    monkeypatch.setattr(thresholdProfiles, "_profiles", thresholdProfiles.load_profiles(path))
+    monkeypatch.setattr(thresholdProfiles, "THRESHOLD_PROFILE", "")
+    return path
+
+
+@pytest.fixture
+def builtin_only(monkeypatch):
+    monkeypatch.setattr(thresholdProfiles, "_profiles", {"default": thresholdProfiles.uniform_thresholds()})
+    monkeypatch.setattr(thresholdProfiles, "THRESHOLD_PROFILE", "")
+
+
+def test_calibrated_profiles_load_beside_the_default(profiles):
+    loaded = thresholdProfiles.load_profiles(profiles)
+    assert sorted(loaded) == ["default", "sensitivity"]
+    np.testing.assert_array_equal(loaded["default"], np.full(len(DISEASES), 0.3))
+    np.testing.assert_array_equal(loaded["sensitivity"], np.full(len(DISEASES), 0.1))
+
+
+def test_tools_use_a_calibrated_profile(profiles):
+    thresholds, name, note = thresholdProfiles.tool_thresholds("sensitivity", 0.3)
+    assert name == "sensitivity" and note is None
+    np.testing.assert_array_equal(thresholds, np.full(len(DISEASES), 0.1))
+
+
+def test_tools_fall_back_to_the_scalar_threshold_for_a_missing_profile(builtin_only):
+    thresholds, name, note = thresholdProfiles.tool_thresholds("balanced", 0.4)
+    assert thresholds == 0.4 and name is None
+    assert "'balanced' is not available" in note and "default" in note and "0.4" in note
+
+
+def test_the_command_line_still_rejects_a_missing_profile(builtin_only):
+    with pytest.raises(ValueError, match="Unknown threshold profile 'balanced'"):
+        thresholdProfiles.resolve_thresholds("balanced", 0.3)
+
+
+def test_fallback_note_reaches_the_prediction_and_the_scan_summary(builtin_only):
+    context = FakeToolContext()
+    preds = np.full(len(DISEASES), 0.35, dtype=np.float32)
+    thresholds, name, note = thresholdProfiles.tool_thresholds("balanced", 0.3)
+
+    prediction = customTools._prediction_result("/images/img1.jpg", preds, False, thresholds, name, False,
+                                                context, None, note)
+    summary = customTools._scan_summary(prediction, {"status": "success"}, {}, context)
+
+    assert prediction["note"] == note and summary["note"] == note
+    assert prediction["results"]["t"] == 0.3
+    assert set(prediction["results"]["pos"]) == set(DISEASES)
+
+
+def test_no_note_without_a_fallback(profiles):
+    preds = np.full(len(DISEASES), 0.2, dtype=np.float32)
+    thresholds, name, note = thresholdProfiles.tool_thresholds("sensitivity", 0.3)
+    prediction = customTools._prediction_result("/images/img1.jpg", preds, False, thresholds, name, False,
+                                                None, None, note)
+    assert "note" not in prediction
+    assert set(prediction["results"]["pos"]) == set(DISEASES)
+
+
+def test_sweep_matches_a_brute_force_confusion_count():
+    rng = np.random.default_rng(3)
+    probs = rng.random((400, len(DISEASES))).astype(np.float32)
+    truth = (rng.random((400, len(DISEASES))) < 0.3).astype(np.int8)
+    truth[rng.random(truth.shape) < 0.1] = -1
+    grid = thresholdProfiles.threshold_grid(0.05)
+
+    counts = thresholdProfiles.sweep(probs, truth, grid)
+
+    for k, t in enumerate(grid):
+        predicted = probs >= t
+        np.testing.assert_array_equal(counts["tp"][:, k], (predicted & (truth == 1)).sum(axis=0))
+        np.testing.assert_array_equal(counts["fp"][:, k], (predicted & (truth == 0)).sum(axis=0))
+        np.testing.assert_array_equal(counts["fn"][:, k], (~predicted & (truth == 1)).sum(axis=0))
+        np.testing.assert_array_equal(counts["tn"][:, k], (~predicted & (truth == 0)).sum(axis=0))
+
+
+def test_sensitivity_profile_meets_its_target_and_round_trips(tmp_path):
+    rng = np.random.default_rng(5)
+    truth = (rng.random((500, len(DISEASES))) < 0.4).astype(np.int8)
+    probs = np.clip(truth * 0.4 + rng.random(truth.shape) * 0.6, 0, 1).astype(np.float32)
+    truth[:, -1] = 0   # one label without positives keeps the default
+
+    profiles = thresholdProfiles.calibrate(probs, truth, target_sensitivity=0.9)
+    path = str(tmp_path / "profiles.json")
+    thresholdProfiles.save_profiles(profiles, "labelled.csv", path)
+    loaded = thresholdProfiles.load_profiles(path)
+
+    sensitivity = loaded["sensitivity"]
+    for j in range(len(DISEASES) - 1):
+        found = (probs[truth[:, j] == 1, j] >= sensitivity[j]).mean()
+        assert found >= 0.9
+    assert sensitivity[-1] == thresholdProfiles.DEFAULT_THRESHOLD
+    assert profiles["sensitivity"]["metrics"][DISEASES[-1]]["calibrated"] is False
+    assert sorted(loaded) == ["balanced", "default", "sensitivity"]
@@ -0,0 +1,66 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from lungSightAI.toolExecutors import IO
+from lungSightAI.userStore import AsyncUserStore, UserStore
+
+
+class CountingStore(UserStore):
+    opened = 0
+
+    def _open(self):
+        self.opened += 1
+        return super()._open()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CountingStore(str(tmp_path / "users.db"))
+    yield store
+    store.close()
+
+
+def test_user_round_trip(store):
+    store.create_user("Ada", "F", 36, "ada", "hash-1", "uuid-1")
+    assert store.get_credentials("ada") == ("hash-1", "uuid-1")
+    assert store.get_by_uuid("uuid-1") == {
+        "full_name": "Ada", "gender": "F", "age": 36, "username": "ada", "user_uuid": "uuid-1",
+    }
+    store.update_password_hash("ada", "hash-2")
+    assert store.get_credentials("ada")[0] == "hash-2"
+    assert store.get_credentials("nobody") is None
+
+
+def test_duplicate_username_is_rejected(store):
+    store.create_user("Ada", "F", 36, "ada", "hash", "uuid-1")
+    with pytest.raises(sqlite3.IntegrityError):
+        store.create_user("Other", "M", 40, "ada", "hash", "uuid-2")
+
+
+def test_async_calls_reuse_the_io_threads_connections(store):
+    users = AsyncUserStore(store)
+
+    async def scenario():
+        await users.create_user("Ada", "F", 36, "ada", "hash", "uuid-1")
+        for _ in range(50):
+            assert await users.get_credentials("ada") == ("hash", "uuid-1")
+        await users.update_password_hash("ada", "hash-2")
+        return await users.get_by_uuid("uuid-1")
+
+    assert asyncio.run(scenario())["username"] == "ada"
+    # At most one connection per io thread, not one per call
+    assert 1 <= store.opened <= IO.workers
+    assert store.connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_async_duplicate_username_raises(store):
+    users = AsyncUserStore(store)
+
+    async def scenario():
+        await users.create_user("Ada", "F", 36, "ada", "hash", "uuid-1")
+        await users.create_user("Ada", "F", 36, "ada", "hash", "uuid-2")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        asyncio.run(scenario())